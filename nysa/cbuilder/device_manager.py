@@ -33,6 +33,59 @@ __author__ = "dave.mccoy@cospandesign.com (Dave McCoy)"
 LOCAL_DEVICE_LIST = os.path.join(os.path.dirname(__file__), os.pardir, "data", "local_devices", "devices.json")
 LOCAL_DEVICE_LIST = os.path.abspath(LOCAL_DEVICE_LIST)
 
+class _DeviceRegistry(object):
+    """
+    Contents of the device list file, the file is only read again when it
+    has been modified
+    """
+    def __init__(self):
+        self.path = None
+        self.mtime = None
+        self.dev_list = []
+        self.name_dict = {}
+        self.id_dict = {}
+
+    def update(self):
+        mtime = os.path.getmtime(LOCAL_DEVICE_LIST)
+        if mtime == self.mtime and LOCAL_DEVICE_LIST == self.path:
+            return
+        try:
+            f = open(LOCAL_DEVICE_LIST, "r")
+            sdb_tags = json.load(f, object_pairs_hook = odict)
+            f.close()
+        except (TypeError, ValueError) as err:
+            print "JSON Error: %s" % str(err)
+            raise SDBError("DRT Error: %s", str(err))
+
+        dev_tags = sdb_tags["devices"]
+        int_dict = {}
+        name_dict = {}
+        id_dict = {}
+        for key in dev_tags:
+            #change the hex number into a integer
+            id_val = dev_tags[key]["ID"]
+            if isinstance(id_val, str) or isinstance(id_val, unicode):
+                index = int(id_val, 16)
+            else:
+                index = id_val
+
+            dev_tags[key]["name"] = key
+            int_dict[index] = dev_tags[key]
+            name_dict.setdefault(key.lower().strip(), index)
+            id_dict.setdefault(index, key)
+
+        self.dev_list = [int_dict[key] for key in int_dict.keys()]
+        self.name_dict = name_dict
+        self.id_dict = id_dict
+        self.path = LOCAL_DEVICE_LIST
+        self.mtime = mtime
+
+_registry = _DeviceRegistry()
+
+def _get_registry():
+    _registry.update()
+    return _registry
+
 def get_device_list():
     """Return a list of device names where the index corresponds to the device
     identification number
@@ -47,41 +100,7 @@ def get_device_list():
     Raises:
       Nothing
     """
-    dev_tags = {}
-    dev_list = []
-    index = 0
-    length = 0
-    try:
-        f = open(LOCAL_DEVICE_LIST, "r")
-        sdb_tags = json.load(f, object_pairs_hook = odict)
-    except TypeError as err:
-        print "JSON Error: %s" % str(err)
-        raise SDBError("DRT Error: %s", str(err))
-
-    dev_tags = sdb_tags["devices"]
-
-    length = len(dev_tags.keys())
-
-    int_dict = {}
-    for key in dev_tags:
-        #change the hex number into a integer
-        index = None
-        id_val = dev_tags[key]["ID"]
-        if isinstance(id_val, str) or isinstance(id_val, unicode):
-            index = int(id_val[2:], 16)
-        else:
-            index = id_val
-
-        dev_tags[key]["name"] = key
-        #print "index: %d" % index
-        int_dict[index] = dev_tags[key]
-
-    ordered_keys = int_dict.keys()
-    dev_list = []
-    for key in ordered_keys:
-        dev_list.append(int_dict[key])
-
-    return dev_list
+    return [odict(d) for d in _get_registry().dev_list]
 
 def get_device_name_from_id(device_id):
     """return device name for the ID
@@ -96,27 +115,7 @@ def get_device_name_from_id(device_id):
         Nothing
     """
     #print "Index: 0x%04X" % device_id
-    dev_tags = {}
-    try:
-        f = open(LOCAL_DEVICE_LIST, "r")
-        sdb_tags = json.load(f)
-    except TypeError as err:
-        print "JSON Error: %s" % str(err)
-        raise SDBError("DRT Error: %s", str(err))
-
-    dev_tags = sdb_tags["devices"]
-    did = 0
-    for device in dev_tags:
-        #print "Looking at: %s" % device
-        did = None
-        if (type(dev_tags[device]["ID"]) == str) or (type(dev_tags[device]["ID"]) == unicode):
-            did = int(dev_tags[device]["ID"], 16)
-        else:
-            did = dev_tags[device]["ID"]
-
-        if did == device_id:
-            return device
-    return "Unknown Device"
+    return _get_registry().id_dict.get(device_id, "Unknown Device")
 
 def get_device_id_from_name(name):
     """return the index of the device speicified by name
@@ -133,23 +132,12 @@ def get_device_id_from_name(name):
       Nothing
 
     """
-    dev_tags = {}
-    try:
-        f = open(LOCAL_DEVICE_LIST, "r")
-        sdb_tags = json.load(f)
-    except TypeError as err:
-        print "JSON Error: %s" % str(err)
-        raise SDBError("DRT Error: %s", str(err))
-
-    dev_tags = sdb_tags["devices"]
-    for key in dev_tags:
-        if name.lower().strip() == key.lower().strip():
-            name = key
-
-    if name not in dev_tags.keys():
+    name_dict = _get_registry().name_dict
+    key = name.lower().strip()
+    if key not in name_dict:
         raise SDBError("Name: %s is not a known type of devices" % name)
 
-    return int(dev_tags[name]["ID"], 0)
+    return name_dict[key]
 
 
 def get_device_type(index):
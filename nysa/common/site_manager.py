@@ -29,6 +29,7 @@ COCOTB_URL = "https://github.com/potentialventures/cocotb.git"
 
 VERILOG_PACKAGE_PATH = os.path.join(SITE_PATH, "verilog")
 COCOTB_PATH = os.path.join(SITE_PATH, "cocotb")
+SDB_CACHE_PATH = os.path.join(SITE_PATH, "sdb_cache")
 DEFAULT_BOARD_BRANCH = "master"
 
 NYSA_MODULE_LOC = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, os.pardir))
@@ -71,6 +72,9 @@ def get_board_package_path():
 def get_verilog_package_path():
     return VERILOG_PACKAGE_PATH
 
+def get_sdb_cache_path():
+    return SDB_CACHE_PATH
+
 class LocalDefinition(Exception):
     pass
 
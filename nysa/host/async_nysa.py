@@ -0,0 +1,330 @@
+#Distributed under the MIT licesnse.
+#Copyright (c) 2015 Dave McCoy (dave.mccoy@cospandesign.com)
+
+#Permission is hereby granted, free of charge, to any person obtaining a copy of
+#this software and associated documentation files (the "Software"), to deal in
+#the Software without restriction, including without limitation the rights to
+#use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+#of the Software, and to permit persons to whom the Software is furnished to do
+#so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
+
+""" Async Nysa
+
+Non blocking front end for a Nysa board and its drivers
+
+Every transaction is run by one I/O thread that owns the link to the board,
+the caller gets a NysaRequest back right away and either waits for it or is
+called back when it is finished. A single thread can keep a camera capture,
+an audio stream and a GPIO monitor going at the same time without each of
+them needing a thread that fights for the link:
+
+    a = AsyncNysa(n)
+    a.start()
+    frame = a.call(camera.read_raw_image)
+    status = a.read_register(0x01000000)
+    button = a.wait_for_interrupt(gpio.peripheral_index, timeout = 1)
+    print "Status: 0x%08X" % status.get_result()
+
+    gpio = a.wrap(gpio)
+    gpio.get_port_raw(callback = lambda r: update(r.get_result()))
+"""
+
+__author__ = 'dave.mccoy@cospandesign.com (Dave McCoy)'
+
+import threading
+import time
+import Queue
+
+from nysa import NysaError
+from nysa import NysaInterruptDispatcher
+
+class NysaRequest(object):
+    """
+    A call that was handed to an AsyncNysa
+
+    Use wait to block until the call is finished or give a callback, the
+    callback is called with the request from the thread that finished it
+    """
+
+    def __init__(self, callback = None):
+        self.callback = callback
+        self.result = None
+        self.error = None
+        self.event = threading.Event()
+
+    def is_done(self):
+        return self.event.is_set()
+
+    def wait(self, timeout = None):
+        """
+        Wait for the call to finish
+
+        Args:
+            timeout (Float): seconds to wait, None waits forever
+
+        Returns (Boolean):
+            True: the call is finished
+            False: timeout
+        """
+        self.event.wait(timeout)
+        return self.event.is_set()
+
+    def get_result(self, timeout = None):
+        """
+        Wait for the call to finish and return what it returned
+
+        Args:
+            timeout (Float): seconds to wait, None waits forever
+
+        Returns (Object):
+            value returned by the call
+
+        Raises:
+            NysaError: timeout
+            Exception: the exception raised by the call
+        """
+        if not self.wait(timeout):
+            raise NysaError("Timeout while waiting for a request")
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    def _finish(self, result = None, error = None):
+        self.result = result
+        self.error = error
+        self.event.set()
+        if self.callback is not None:
+            self.callback(self)
+
+class AsyncNysa(object):
+    """
+    Runs the transactions of a board on one I/O thread
+
+    While a wait_for_interrupt is outstanding the I/O thread also reads the
+    interrupts of the board between transactions, every 'poll_time' seconds
+    when it is idle
+
+    Args:
+        n (Nysa): board, it must not be used directly while the I/O thread
+            is running (this includes the interrupt dispatcher thread of the
+            board)
+        poll_time (Float): seconds between interrupt reads when idle
+    """
+
+    def __init__(self, n, poll_time = 0.01):
+        self.n = n
+        self.poll_time = poll_time
+        self.queue = Queue.Queue()
+        self.thread = None
+        #Only used by the I/O thread, its own thread is never started
+        self.dispatcher = NysaInterruptDispatcher(n)
+        self.waiters = []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+        return False
+
+    def start(self):
+        """
+        Start the I/O thread
+
+        Args:
+            Nothing
+
+        Returns:
+            Nothing
+        """
+        if self.is_running():
+            return
+        self.thread = threading.Thread(target = self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        """
+        Finish the calls that were already handed in and stop the I/O thread
+
+        Args:
+            Nothing
+
+        Returns:
+            Nothing
+        """
+        if self.thread is None:
+            return
+        self.queue.put(None)
+        if self.thread is not threading.current_thread():
+            self.thread.join()
+        self.thread = None
+
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def _run(self):
+        while True:
+            if len(self.waiters) == 0:
+                item = self.queue.get()
+            else:
+                try:
+                    item = self.queue.get(True, self.poll_time)
+                except Queue.Empty:
+                    item = False
+                self._poll_interrupts()
+            if item is None:
+                break
+            if item is False:
+                continue
+            request, function, args, kwargs = item
+            try:
+                result = function(*args, **kwargs)
+            except Exception as ex:
+                request._finish(error = ex)
+            else:
+                request._finish(result)
+
+        #Nothing will read the interrupts anymore
+        for request, index, end in self.waiters:
+            request._finish(None)
+        self.waiters = []
+
+    def _add_waiter(self, request, index, timeout):
+        self.waiters.append((request, index, time.time() + timeout))
+        self._poll_interrupts()
+
+    def _poll_interrupts(self):
+        #Runs on the I/O thread between transactions
+        try:
+            self.dispatcher.poll()
+        except Exception as ex:
+            for request, index, end in self.waiters:
+                request._finish(error = ex)
+            self.waiters = []
+            return
+
+        now = time.time()
+        waiters = []
+        for request, index, end in self.waiters:
+            timestamp = self.dispatcher.wait(index, 0)
+            if timestamp is not None:
+                request._finish(timestamp)
+            elif now >= end:
+                request._finish(None)
+            else:
+                waiters.append((request, index, end))
+        self.waiters = waiters
+
+    def call(self, function, *args, **kwargs):
+        """
+        Run a function on the I/O thread, any driver method can be called
+
+        Example:
+            r = a.call(gpio.set_port_raw, 0x01)
+
+        Args:
+            function (Function): function to run
+            args: arguments of the function
+            callback (Function): keyword only, called with the request when
+                the function is finished
+
+        Returns:
+            (NysaRequest): request, get_result returns what the function
+                returned
+
+        Raises:
+            NysaError: the I/O thread is not running
+        """
+        callback = kwargs.pop("callback", None)
+        if not self.is_running():
+            raise NysaError("The I/O thread is not running, call start first")
+        request = NysaRequest(callback)
+        self.queue.put((request, function, args, kwargs))
+        return request
+
+    def wrap(self, driver):
+        """
+        Returns a copy of a driver where every method hands the call to the
+        I/O thread and returns a NysaRequest
+
+        Args:
+            driver (Driver): driver of a device on this board
+
+        Returns:
+            (AsyncDriver)
+        """
+        return AsyncDriver(self, driver)
+
+    def read(self, address, length = 1, disable_auto_inc = False, callback = None):
+        return self.call(self.n.read, address, length, disable_auto_inc, callback = callback)
+
+    def write(self, address, data, disable_auto_inc = False, callback = None):
+        return self.call(self.n.write, address, data, disable_auto_inc, callback = callback)
+
+    def read_register(self, address, callback = None):
+        return self.call(self.n.read_register, address, callback = callback)
+
+    def write_register(self, address, value, callback = None):
+        return self.call(self.n.write_register, address, value, callback = callback)
+
+    def read_memory(self, address, size, callback = None):
+        return self.call(self.n.read_memory, address, size, callback = callback)
+
+    def write_memory(self, address, data, callback = None):
+        return self.call(self.n.write_memory, address, data, callback = callback)
+
+    def wait_for_interrupt(self, index, timeout = 1, callback = None):
+        """
+        Wait for an interrupt from one device without holding up the I/O
+        thread, the I/O thread reads the interrupts of the board between the
+        other transactions until the interrupt arrives or the timeout expires
+
+        Args:
+            index (Integer): index of the device in the peripheral bus
+            timeout (Float): seconds to wait
+            callback (Function): called with the request when the interrupt
+                arrives or the timeout expires
+
+        Returns:
+            (NysaRequest): get_result returns the time of the interrupt, None
+                on a timeout
+
+        Raises:
+            NysaError: the I/O thread is not running
+        """
+        request = NysaRequest(callback)
+        self.call(self._add_waiter, request, index, timeout)
+        return request
+
+class AsyncDriver(object):
+    """
+    A driver whose methods return a NysaRequest instead of blocking, made
+    with AsyncNysa.wrap
+
+    Attributes that are not methods are read from the driver directly
+    """
+
+    def __init__(self, async_nysa, driver):
+        self._async_nysa = async_nysa
+        self._driver = driver
+
+    def __getattr__(self, name):
+        attribute = getattr(self._driver, name)
+        if not callable(attribute):
+            return attribute
+        def call(*args, **kwargs):
+            return self._async_nysa.call(attribute, *args, **kwargs)
+        return call
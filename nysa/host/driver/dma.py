@@ -141,6 +141,198 @@ class DMAError(Exception):
     pass
 
 
+class DMAProgram(object):
+    """
+    A list of DMA instructions that is compiled to register values and
+    uploaded to the DMA controller in one batch
+
+    Every transfer is placed in the next free instruction slot, transfers
+    refer to each other (next, ingress and egress bonds) by name or by the
+    index returned from add_transfer
+
+    Example (the double buffer of setup_double_buffer):
+
+        p = DMAProgram()
+        p.add_transfer(source_addr, mem_addr0, count, name = "in0", next = "in1", ingress = "out0")
+        p.add_transfer(source_addr, mem_addr1, count, name = "in1", next = "in0", ingress = "out1")
+        p.add_transfer(mem_addr0, sink_addr, count, name = "out0", next = "out1", egress = "in0")
+        p.add_transfer(mem_addr1, sink_addr, count, name = "out1", next = "out0", egress = "in1")
+        p.add_channel(source, "in0", mem_sink)
+        p.add_channel(mem_source, "out0", sink)
+        dma.load_program(p)
+
+    Args:
+        instruction_count (Integer): number of instruction slots available
+    """
+
+    def __init__(self, instruction_count = INSTRUCTION_COUNT):
+        self.instruction_count = instruction_count
+        self.transfers = []
+        self.names = {}
+        self.channels = {}
+        self.sinks = {}
+
+    def add_transfer(self,
+                     source_addr,
+                     dest_addr,
+                     count,
+                     name = None,
+                     next = None,
+                     ingress = None,
+                     egress = None,
+                     src_reset = False,
+                     dest_reset = False):
+        """
+        Add a transfer to the program
+
+        Args:
+            source_addr (64-bit unsigned): address to read the data from
+            dest_addr (64-bit unsigned): address to write the data to
+            count (32-bit unsigned): number of 32-bit values to move
+            name (String): name other transfers use to refer to this one
+            next (String or Integer): transfer to execute when this one is
+                finished, None to stop the channel
+            ingress (String or Integer): wait for this transfer to finish
+                before starting (ingress bond)
+            egress (String or Integer): the transfer that waits for this one
+                (egress bond)
+            src_reset (boolean): reset the source address on this instruction
+            dest_reset (boolean): reset the destination address on this
+                instruction
+
+        Returns:
+            (Integer): index of the transfer
+
+        Raises:
+            DMAError: the name is already used or the count is out of range
+        """
+        if name is not None and name in self.names:
+            raise DMAError("Transfer name is used twice: %s" % name)
+        if count < 0 or count > 0xFFFFFFFF:
+            raise DMAError("Transfer count is out of range: %d" % count)
+        index = len(self.transfers)
+        self.transfers.append({"source_addr": source_addr,
+                               "dest_addr": dest_addr,
+                               "count": count,
+                               "next": next,
+                               "ingress": ingress,
+                               "egress": egress,
+                               "src_reset": src_reset,
+                               "dest_reset": dest_reset})
+        if name is not None:
+            self.names[name] = index
+        return index
+
+    def add_channel(self, channel, transfer, sink, increment = True, decrement = False):
+        """
+        Point a channel (source) at the first transfer it executes
+
+        Args:
+            channel (Integer): channel to configure
+            transfer (String or Integer): first transfer of the channel
+            sink (Integer): sink the channel writes to
+            increment (boolean): increment the source address
+            decrement (boolean): decrement the source address
+
+        Returns:
+            Nothing
+        """
+        self.channels[channel] = {"transfer": transfer,
+                                  "sink": sink,
+                                  "increment": increment,
+                                  "decrement": decrement}
+
+    def add_sink(self, sink, increment = True, decrement = False, quantum = False):
+        """
+        Configure how a sink moves its address
+
+        Args:
+            sink (Integer): sink to configure
+            increment (boolean): increment the destination address
+            decrement (boolean): decrement the destination address
+            quantum (boolean): respect the data quantum of the sink
+
+        Returns:
+            Nothing
+        """
+        self.sinks[sink] = {"increment": increment,
+                            "decrement": decrement,
+                            "quantum": quantum}
+
+    def _resolve(self, reference, start):
+        if isinstance(reference, basestring):
+            if reference not in self.names:
+                raise DMAError("Unknown transfer: %s" % reference)
+            reference = self.names[reference]
+        if reference < 0 or reference >= len(self.transfers):
+            raise DMAError("Transfer index out of range: %d" % reference)
+        return start + reference
+
+    def compile(self, start = 0):
+        """
+        Convert the program to instruction register values
+
+        Args:
+            start (Integer): slot of the first transfer
+
+        Returns:
+            (Dictionary):
+                instructions: list of (slot, [source low, source high,
+                    dest low, dest high, count, control]) tuples
+                channels: channel -> (instruction pointer, sink, increment,
+                    decrement)
+                sinks: sink -> (increment, decrement, quantum)
+
+        Raises:
+            DMAError: the program does not fit in the instruction slots or
+                refers to a transfer that does not exist
+        """
+        if start < 0 or (start + len(self.transfers)) > self.instruction_count:
+            raise DMAError("Program uses instructions %d - %d, only %d are available" %
+                            (start, start + len(self.transfers) - 1, self.instruction_count))
+
+        instructions = []
+        for i in range(len(self.transfers)):
+            t = self.transfers[i]
+            control = 0
+            if t["src_reset"]:
+                control |= 1 << BIT_INST_SRC_RST_ON_INST
+            if t["dest_reset"]:
+                control |= 1 << BIT_INST_DEST_RST_ON_INST
+            if t["next"] is not None:
+                control |= 1 << BIT_INST_CMD_CONTINUE
+                control |= self._resolve(t["next"], start) << BIT_INST_CMD_NEXT_BOT
+            if t["ingress"] is not None:
+                control |= 1 << BIT_INST_CMD_BOND_INGRESS
+                control |= self._resolve(t["ingress"], start) << BIT_INST_CMD_BOND_ADDR_IN_BOT
+            if t["egress"] is not None:
+                control |= 1 << BIT_INST_CMD_BOND_EGRESS
+                control |= self._resolve(t["egress"], start) << BIT_INST_CMD_BOND_ADDR_OUT_BOT
+            instructions.append((start + i, [t["source_addr"] & 0xFFFFFFFF,
+                                             (t["source_addr"] >> 32) & 0xFFFFFFFF,
+                                             t["dest_addr"] & 0xFFFFFFFF,
+                                             (t["dest_addr"] >> 32) & 0xFFFFFFFF,
+                                             t["count"],
+                                             control]))
+
+        channels = {}
+        for channel in self.channels:
+            c = self.channels[channel]
+            channels[channel] = (self._resolve(c["transfer"], start),
+                                 c["sink"],
+                                 c["increment"],
+                                 c["decrement"])
+
+        sinks = {}
+        for sink in self.sinks:
+            s = self.sinks[sink]
+            sinks[sink] = (s["increment"], s["decrement"], s["quantum"])
+
+        return {"instructions": instructions,
+                "channels": channels,
+                "sinks": sinks}
+
+
 class DMA(driver.Driver):
     """
     DMA Controller
@@ -1171,3 +1363,178 @@ class DMA(driver.Driver):
         self.enable_egress_bond(                start_inst_addr + 3,    True)
 
 
+
+    def load_program(self, program, start = 0):
+        """
+        Upload a DMAProgram, every instruction is written with one burst and
+        all of the bursts and the channel and sink configuration are sent to
+        the board in a single batch
+
+        The slots of the program are marked as used, a program can not be
+        loaded over slots that are still in use, release them with
+        release_program first
+
+        Args:
+            program (DMAProgram): transfers, channels and sinks to set up
+            start (unsigned int): instruction slot of the first transfer
+
+        Returns:
+            (List of unsigned int): instruction slots used by the program
+
+        Raises:
+            NysaCommError
+            DMAError:
+                The program does not fit in the instructions of the core
+                An instruction slot of the program is already used
+                A channel or sink is out of range
+        """
+        if start < 0 or (start + len(program.transfers)) > self.get_instruction_count():
+            raise DMAError("Program uses instructions %d - %d, the core has %d" %
+                            (start, start + len(program.transfers) - 1, self.get_instruction_count()))
+        compiled = program.compile(start)
+
+        for slot, words in compiled["instructions"]:
+            if slot in self.instruction_used:
+                raise DMAError("Instruction slot %d is already used" % slot)
+
+        for channel in compiled["channels"]:
+            if channel > self.channel_count - 1:
+                raise DMAError("Illegal channel count: %d > %d" % (channel, self.channel_count - 1))
+            sink = compiled["channels"][channel][1]
+            if sink > self.sink_count - 1:
+                raise DMAError("Illegal sink count: %d > %d" % (sink, self.sink_count - 1))
+        for sink in compiled["sinks"]:
+            if sink > self.sink_count - 1:
+                raise DMAError("Illegal sink count: %d > %d" % (sink, self.sink_count - 1))
+
+        slots = []
+        with self.batch() as b:
+            for slot, words in compiled["instructions"]:
+                data = Array('B')
+                for word in words:
+                    data.extend([(word >> 24) & 0xFF,
+                                 (word >> 16) & 0xFF,
+                                 (word >> 8) & 0xFF,
+                                 word & 0xFF])
+                b.write(INST_BASE + (INST_OFFSET * slot), data)
+                slots.append(slot)
+
+            for sink in compiled["sinks"]:
+                increment, decrement, quantum = compiled["sinks"][sink]
+                b.enable_register_bit(SINK_ADDR_CONTROL_BASE + sink, BIT_CFG_DEST_ADDR_INC, increment)
+                b.enable_register_bit(SINK_ADDR_CONTROL_BASE + sink, BIT_CFG_DEST_ADDR_DEC, decrement)
+                b.enable_register_bit(SINK_ADDR_CONTROL_BASE + sink, BIT_CFG_DEST_DATA_QUANTUM, quantum)
+
+            for channel in compiled["channels"]:
+                ip_addr, sink, increment, decrement = compiled["channels"][channel]
+                b.write_register_bit_range(CHANNEL_ADDR_CONTROL_BASE + channel,
+                                           BIT_SINK_ADDR_TOP,
+                                           BIT_SINK_ADDR_BOT,
+                                           sink)
+                b.write_register_bit_range(CHANNEL_ADDR_CONTROL_BASE + channel,
+                                           BIT_INST_PTR_TOP,
+                                           BIT_INST_PTR_BOT,
+                                           ip_addr)
+                b.enable_register_bit(CHANNEL_ADDR_CONTROL_BASE + channel, BIT_CFG_SRC_ADDR_INC, increment)
+                b.enable_register_bit(CHANNEL_ADDR_CONTROL_BASE + channel, BIT_CFG_SRC_ADDR_DEC, decrement)
+
+        for slot in slots:
+            if slot in self.instructions_available:
+                self.instructions_available.remove(slot)
+            if slot not in self.instruction_used:
+                self.instruction_used.append(slot)
+        return slots
+
+    def release_program(self, slots):
+        """
+        Give back the instruction slots of a program loaded with load_program
+
+        Args:
+            slots (List of unsigned int): slots returned by load_program
+
+        Returns:
+            Nothing
+        """
+        for slot in slots:
+            if slot in self.instruction_used:
+                self.instruction_used.remove(slot)
+            if slot not in self.instructions_available:
+                self.instructions_available.append(slot)
+        self.instructions_available.sort()
+
+    def copy_memory(self, channel, sink, transfers, timeout = 3):
+        """
+        Move blocks of data with a channel that reads and a sink that writes
+        memory, the data does not go through the host
+
+        The transfers are chained into one program that is placed in the
+        free instruction slots of this driver (instructions_available), the
+        slots are given back when the copy is finished. When there are more
+        transfers than free slots the program is run more than once
+
+        The channel and the sink are reconfigured and the channel is disabled
+        when the copy is finished, they should not be used by anything else
+
+        Args:
+            channel (unsigned int): channel that reads the source
+            sink (unsigned int): sink that writes the destination
+            transfers (List of tuples): (source address, destination address,
+                count of 32-bit values) of each block
+            timeout (float): seconds to wait for each program to finish
+
+        Returns:
+            Nothing
+
+        Raises:
+            NysaCommError
+            DMAError:
+                A channel or sink is out of range
+                No instruction slots are free
+                Timeout while waiting for the channel to finish
+        """
+        transfers = [t for t in transfers if t[2] > 0]
+        i = 0
+        while i < len(transfers):
+            start, length = self._find_free_instructions()
+            if length == 0:
+                raise DMAError("No instruction slots are free for a copy")
+            p = DMAProgram(self.get_instruction_count())
+            chain = transfers[i:i + length]
+            i += len(chain)
+            for j in range(len(chain)):
+                source_addr, dest_addr, count = chain[j]
+                next_transfer = None
+                if j < len(chain) - 1:
+                    next_transfer = j + 1
+                p.add_transfer(source_addr, dest_addr, count, next = next_transfer)
+            p.add_channel(channel, 0, sink)
+            p.add_sink(sink)
+            slots = self.load_program(p, start)
+
+            try:
+                with self.batch() as b:
+                    b.set_register_bit(CONTROL, BIT_CONTROL_ENABLE)
+                    b.set_register_bit(CHANNEL_ADDR_CONTROL_BASE + channel, BIT_CFG_DMA_ENABLE)
+
+                end = time.time() + timeout
+                while not self.is_channel_finished(channel):
+                    if time.time() > end:
+                        raise DMAError("Timeout while waiting for channel %d to finish" % channel)
+                    time.sleep(0.001)
+            finally:
+                self.enable_channel(channel, False)
+                self.release_program(slots)
+
+    def _find_free_instructions(self):
+        #Longest run of free instruction slots, a program uses consecutive
+        #slots, returns (first slot, length)
+        best = (0, 0)
+        start = None
+        previous = None
+        for slot in sorted(self.instructions_available):
+            if start is None or slot != previous + 1:
+                start = slot
+            previous = slot
+            if (slot - start + 1) > best[1]:
+                best = (start, slot - start + 1)
+        return best
@@ -28,10 +28,17 @@ from array import array as Array
 import Queue
 import threading
 from threading import Lock
+from collections import deque
 
 from nysa.cbuilder.device_manager import get_device_id_from_name
 
 class Driver(object):
+    #Registers the bit helpers can modify from a local copy instead of reading
+    #them back from the board before every write. Maps the register offset to
+    #a mask of the bits the core changes on its own (status, self clearing
+    #'go' bits), these are never kept in the copy. Empty means no shadowing
+    SHADOW_REGISTERS = {}
+
     def __init__(self,
                  n,
                  urn,
@@ -47,6 +54,8 @@ class Driver(object):
         self.n.interrupts = (self.n.interrupts & ~(1 << self.peripheral_index))
         self.base_addr = self.n.get_device_address(self.urn)
         #print "interrupts: 0x%08X" % self.n.interrupts
+        self.shadow_enable = len(self.SHADOW_REGISTERS) > 0
+        self.shadow = {}
 
     def __del__(self):
         self.unregister_interrupt_callback()
@@ -275,8 +284,10 @@ class Driver(object):
         Raises:
           NysaCommError: Error in communication
         """
-        address = long(self.base_addr + address)
-        return self.n.read_register(address)
+        value = self.n.read_register(long(self.base_addr + address))
+        if self._is_shadowed(address):
+            self.shadow[address] = value & ~self.SHADOW_REGISTERS[address]
+        return value
 
     def read(self, address, length = 1, disable_auto_inc = False):
         """read
@@ -329,8 +340,9 @@ class Driver(object):
         Raises:
           NysaCommError: Error in communication
         """
-        address = long(self.base_addr + address)
-        self.n.write_register(address, value)
+        self.n.write_register(long(self.base_addr + address), value)
+        if self._is_shadowed(address):
+            self.shadow[address] = value & ~self.SHADOW_REGISTERS[address]
 
     def write(self, address, data, disable_auto_inc = False):
         """write
@@ -351,6 +363,7 @@ class Driver(object):
           AssertionError: This function must be overriden by a board specific
           implementation
         """
+        self._invalidate_shadow_range(address, len(data) / 4)
         address = long(self.base_addr + address)
         self.n.write(address, data, disable_auto_inc = disable_auto_inc)
 
@@ -388,8 +401,10 @@ class Driver(object):
         Raises:
           NysaCommError: Error in communication
         """
-        address = long(self.base_addr + address)
-        self.n.enable_register_bit(address, bit, enable)
+        if enable:
+            self.set_register_bit(address, bit)
+        else:
+            self.clear_register_bit(address, bit)
 
     def set_register_bit(self, address, bit):
         """set_register_bit
@@ -406,6 +421,9 @@ class Driver(object):
         Raises:
           NysaCommError: Error in communication
         """
+        if self._is_shadowed(address):
+            self.write_register(address, self._shadow_value(address) | (1 << bit))
+            return
         address = long(self.base_addr + address)
         self.n.set_register_bit(address, bit)
 
@@ -424,6 +442,9 @@ class Driver(object):
         Raises:
           NysaCommError: Error in communication
         """
+        if self._is_shadowed(address):
+            self.write_register(address, self._shadow_value(address) & ~(1 << bit))
+            return
         address = long(self.base_addr + address)
         self.n.clear_register_bit(address, bit)
 
@@ -468,6 +489,11 @@ class Driver(object):
             NysaCommError
         
         """
+        if self._is_shadowed(address):
+            bitmask = (((1 << (high_bit + 1))) - (1 << low_bit))
+            reg = self._shadow_value(address) & ~bitmask
+            self.write_register(address, reg | ((value << low_bit) & bitmask))
+            return
         address = long(self.base_addr + address)
         self.n.write_register_bit_range(address, high_bit, low_bit, value)
 
@@ -494,6 +520,82 @@ class Driver(object):
         address = long(self.base_addr + address)
         return self.n.read_register_bit_range(address, high_bit, low_bit)
 
+    def batch(self):
+        """
+        Create a batch of transactions that will be sent to the board together,
+        all addresses are relative to this device
+
+        Example:
+            with self.batch() as b:
+                b.write_register(TRANSMIT, data)
+                b.write_register(COMMAND, command)
+
+        Args:
+            Nothing
+
+        Returns:
+            (NysaBatch): an empty batch for this device
+
+        Raises:
+            Nothing
+        """
+        #Writes queued in the batch bypass the shadow registers
+        self.invalidate_shadow_registers()
+        b = self.n.batch()
+        b.base_address = long(self.base_addr)
+        return b
+
+    def enable_shadow_registers(self, enable):
+        """
+        Enable or disable the shadow copy of the registers declared in
+        SHADOW_REGISTERS, when enabled the bit helpers (set_register_bit,
+        clear_register_bit, enable_register_bit and write_register_bit_range)
+        only issue a write to the board
+
+        Args:
+            enable (boolean): use the shadow registers
+
+        Returns:
+            Nothing
+
+        Raises:
+            Nothing
+        """
+        self.shadow_enable = enable
+        self.invalidate_shadow_registers()
+
+    def invalidate_shadow_registers(self):
+        """
+        Forget all the shadowed register values, the next bit operation on a
+        shadowed register will read it from the board
+
+        Use this when the core is modified by something other than this driver
+        (a reset, or another host)
+
+        Args:
+            Nothing
+
+        Returns:
+            Nothing
+
+        Raises:
+            Nothing
+        """
+        self.shadow = {}
+
+    def _is_shadowed(self, address):
+        return self.shadow_enable and address in self.SHADOW_REGISTERS
+
+    def _shadow_value(self, address):
+        if address not in self.shadow:
+            self.read_register(address)
+        return self.shadow[address]
+
+    def _invalidate_shadow_range(self, address, length):
+        for a in self.shadow.keys():
+            if a >= address and a < address + length:
+                del self.shadow[a]
+
     def wait_for_interrupts(self, wait_time = 1):
         """wait_for_interrupts
 
@@ -510,6 +612,11 @@ class Driver(object):
 
         Raises:
         """
+        dispatcher = self.n.interrupt_dispatcher
+        if dispatcher is not None and dispatcher.is_running():
+            #The dispatcher already keeps every interrupt of this device
+            self.interrupt_detected = False
+            return dispatcher.wait(self.peripheral_index, wait_time) is not None
         if self.interrupt_detected:
             self.interrupt_detected = False
             return True
@@ -572,11 +679,248 @@ class NysaDMAException(Exception):
     pass
 
 
+#What to do with a block read from the core when the ring is full
+DMA_RING_DROP_OLDEST    = 0
+DMA_RING_DROP_NEWEST    = 1
+DMA_RING_BLOCK          = 2
+
 class DMAReaderData(object):
-    data = None
-    ready = None
+    ring = None
     callback = None
-    next = 0
+
+class DMAReadSlot(object):
+    data = None
+    sequence = 0
+
+class DMAReadRing(object):
+    """
+    Host side ring of blocks read from a DMA core
+
+    The slots are allocated once when the ring is created, the blocks are
+    stored as they are returned from read_memory (no copy) and handed out
+    oldest first. Every block is given a sequence number so a consumer can
+    tell when blocks were lost.
+
+    The data buffers are not preallocated: read_memory returns a new array
+    for every block no matter where it ends up, copying it into a fixed
+    buffer would only add a copy and the buffer would be refilled while a
+    consumer that fell 'depth' blocks behind is still using it. The array a
+    consumer gets from the ring is its own to keep.
+
+    When the ring is full the policy decides what happens to a new block:
+
+        DMA_RING_DROP_OLDEST: overwrite the oldest unread block
+        DMA_RING_DROP_NEWEST: throw away the new block
+        DMA_RING_BLOCK: wait until the consumer frees a slot, the core is not
+            given a new block of memory to fill until then so the hardware is
+            throttled instead of losing data
+
+    Every dropped block increments the overrun count
+    """
+    def __init__(self, depth = 2, policy = DMA_RING_DROP_OLDEST):
+        if depth < 1:
+            raise NysaDMAException("DMA Ring depth must be at least 1: %d" % depth)
+        self.depth = depth
+        self.policy = policy
+        self.slots = [DMAReadSlot() for i in range(depth)]
+        self.condition = threading.Condition()
+        self.closed = False
+        self.reset()
+
+    def reset(self):
+        """
+        Discard all unread blocks and clear the sequence and overrun counts
+        """
+        with self.condition:
+            self.head = 0
+            self.count = 0
+            self.sequence = 0
+            self.overruns = 0
+            for slot in self.slots:
+                slot.data = None
+            self.condition.notify_all()
+
+    def open(self):
+        with self.condition:
+            self.closed = False
+
+    def close(self):
+        """
+        Release a producer waiting for space, with the blocking policy new
+        blocks that do not fit are dropped until the ring is opened again
+        """
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def put(self, data):
+        """
+        Add a block to the ring
+
+        Args:
+            data (Array of bytes): block read from the core
+
+        Returns:
+            (int): sequence number of the block or None if it was dropped
+
+        Raises:
+            Nothing
+        """
+        with self.condition:
+            sequence = self.sequence
+            self.sequence += 1
+            if self.count == self.depth:
+                if self.policy == DMA_RING_BLOCK:
+                    while self.count == self.depth and not self.closed:
+                        self.condition.wait()
+                    if self.closed:
+                        self.overruns += 1
+                        return None
+                elif self.policy == DMA_RING_DROP_NEWEST:
+                    self.overruns += 1
+                    return None
+                else:
+                    self.slots[self.head].data = None
+                    self.head = (self.head + 1) % self.depth
+                    self.count -= 1
+                    self.overruns += 1
+
+            slot = self.slots[(self.head + self.count) % self.depth]
+            slot.data = data
+            slot.sequence = sequence
+            self.count += 1
+            self.condition.notify_all()
+            return sequence
+
+    def get(self, block = False, timeout = None):
+        """
+        Remove the oldest block from the ring
+
+        Args:
+            block (boolean): wait for a block if the ring is empty
+            timeout (float): maximum time to wait in seconds, None waits
+                forever
+
+        Returns:
+            (tuple): (sequence, data) or (None, None) if the ring is empty
+
+        Raises:
+            Nothing
+        """
+        with self.condition:
+            if block and self.count == 0:
+                if timeout is None:
+                    while self.count == 0:
+                        self.condition.wait()
+                else:
+                    end = time.time() + timeout
+                    while self.count == 0:
+                        remaining = end - time.time()
+                        if remaining <= 0:
+                            break
+                        self.condition.wait(remaining)
+
+            if self.count == 0:
+                return (None, None)
+
+            slot = self.slots[self.head]
+            data = slot.data
+            sequence = slot.sequence
+            slot.data = None
+            self.head = (self.head + 1) % self.depth
+            self.count -= 1
+            self.condition.notify_all()
+            return (sequence, data)
+
+    def get_count(self):
+        return self.count
+
+    def get_overrun_count(self):
+        return self.overruns
+
+class DMAReadStatistics(object):
+    """
+    Performance of a DMA reader
+
+    The time of the interrupt that announced a block is kept until the
+    block is read from memory, the difference is the latency of the block
+    (how long the block waited on the host). The latencies of the last
+    'history' blocks are kept for histograms
+    """
+    def __init__(self, history = 1024):
+        self.lock = Lock()
+        self.history = history
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.start_time = time.time()
+            self.first_block_time = None
+            self.last_block_time = None
+            self.blocks = 0
+            self.read_memory_time = 0.0
+            self.interrupt_time = None
+            self.latencies = deque(maxlen = self.history)
+
+    def interrupt(self):
+        """
+        Record the time a block was announced by an interrupt, only the
+        first interrupt for a block counts
+        """
+        with self.lock:
+            if self.interrupt_time is None:
+                self.interrupt_time = time.time()
+
+    def add_block(self, read_start, read_end):
+        """
+        Record a block that was read from memory between 'read_start' and
+        'read_end'
+        """
+        with self.lock:
+            ready_time = self.interrupt_time
+            if ready_time is None or ready_time > read_start:
+                ready_time = read_start
+            self.interrupt_time = None
+            self.latencies.append(read_end - ready_time)
+            self.read_memory_time += read_end - read_start
+            self.blocks += 1
+            if self.first_block_time is None:
+                self.first_block_time = read_end
+            self.last_block_time = read_end
+
+    def get(self):
+        """
+        Returns a dictionary of the statistics:
+            blocks: number of blocks read
+            elapsed: seconds since the statistics were reset
+            rate: blocks per second between the first and the last block
+            read_memory_time: total seconds spent in read_memory
+            read_memory_average: average seconds of read_memory per block
+            latency_min, latency_average, latency_max: seconds between the
+                interrupt of a block and the end of its read
+            latencies: latencies of the most recent blocks
+        """
+        with self.lock:
+            d = {}
+            d["blocks"] = self.blocks
+            d["elapsed"] = time.time() - self.start_time
+            d["rate"] = 0.0
+            if self.blocks > 1 and self.last_block_time > self.first_block_time:
+                d["rate"] = (self.blocks - 1) / (self.last_block_time - self.first_block_time)
+            d["read_memory_time"] = self.read_memory_time
+            d["read_memory_average"] = 0.0
+            if self.blocks > 0:
+                d["read_memory_average"] = self.read_memory_time / self.blocks
+            latencies = list(self.latencies)
+            d["latencies"] = latencies
+            d["latency_min"] = 0.0
+            d["latency_average"] = 0.0
+            d["latency_max"] = 0.0
+            if len(latencies) > 0:
+                d["latency_min"] = min(latencies)
+                d["latency_average"] = sum(latencies) / len(latencies)
+                d["latency_max"] = max(latencies)
+            return d
 
 class DMAReadWorker(threading.Thread):
     """
@@ -588,9 +932,9 @@ class DMAReadWorker(threading.Thread):
     if an interrupt is detected while the data is being processed for the
     first interrupt it can be executed immediately
 
-    Using the DMAReaderData object to pass the data so I don't need to pass
-    a large structure into the queue and it doesn't need to be copied more
-    than is required
+    The blocks are put into the DMAReadRing of the DMAReaderData object so I
+    don't need to pass a large structure into the queue and it doesn't need to
+    be copied more than is required
 
     Use the AttributeError to notify the thread when the main thread has
     exited
@@ -599,15 +943,13 @@ class DMAReadWorker(threading.Thread):
                     dev,
                     dmar,
                     dma_write_queue,
-                    dma_rdata,
-                    data_locks):
+                    dma_rdata):
 
         super(DMAReadWorker, self).__init__()
         self.dev = dev
         self.dmar = dmar
         self.dwq = dma_write_queue
         self.drd = dma_rdata
-        self.locks = data_locks
         #print "setup worker thread"
 
     def run(self):
@@ -706,33 +1048,26 @@ class DMAReadWorker(threading.Thread):
 
             #Now we know what channel we need to read
             #'read_channel' is the channel to use
-            with self.locks[read_channel]:
-                #print "Got a lock!"
-                #lock the channel so the reading device is not getting garbage data
-                #print "read channel: %d" % read_channel
-                self.drd.data[read_channel] = dev.read_memory(dmar.mem_base[read_channel], dmar.size)
-                #print "Got data"
-                self.drd.ready[read_channel] = True
-                if self.drd.ready[0] and self.drd.ready[1]:
-                    #if both are ready point to the previous one
-                    if read_channel == 0:
-                        self.drd.next = 1
-                    else:
-                        self.drd.next = 0
+            #print "read channel: %d" % read_channel
+            #With the blocking policy this waits for a free slot, the channel
+            #is not restarted until then
+            read_start = time.time()
+            data = dev.read_memory(dmar.mem_base[read_channel], dmar.size)
+            dmar.stats.add_block(read_start, time.time())
+            self.drd.ring.put(data)
+            #print "Got data"
+
+            if self.drd.callback is not None:
+                #print "Calling callback!"
+                self.drd.callback()
+
+            #initiate a new transfer before I leave so it will happen next
+            if enable:
+                if read_channel == 0:
+                    dev.write_register(dmar.reg_size0, dmar.size)
                 else:
-                    self.drd.next = read_channel
-
-                if self.drd.callback is not None:
-                    #print "Calling callback!"
-                    self.drd.callback()
-
-                #initiate a new transfer before I leave so it will happen next
-                if enable:
-                    if read_channel == 0:
-                        dev.write_register(dmar.reg_size0, dmar.size)
-                    else:
-                        dev.write_register(dmar.reg_size1, dmar.size)
-                #print "Done!"
+                    dev.write_register(dmar.reg_size1, dmar.size)
+            #print "Done!"
 
 
 class DMAReadController(object):
@@ -817,6 +1152,13 @@ class DMAReadController(object):
 
             example (second bit of the status flag): 3
 
+        ring_depth: number of blocks the host keeps for the asynchronous
+            reader before the ring policy is applied
+
+        ring_policy: what to do with a new block when the ring is full
+            DMA_RING_DROP_OLDEST, DMA_RING_DROP_NEWEST or DMA_RING_BLOCK
+            (see DMAReadRing)
+
     Exceptions:
         NysaDMAException:
             Thrown when:
@@ -837,7 +1179,9 @@ class DMAReadController(object):
                 finished0 = 0,
                 finished1 = 1,
                 empty0 = 2,
-                empty1 = 3):
+                empty1 = 3,
+                ring_depth = 2,
+                ring_policy = DMA_RING_DROP_OLDEST):
 
         self.device = device
         self.mem_base = [0, 1]
@@ -869,18 +1213,16 @@ class DMAReadController(object):
         self.next_finished = 0
 
 
+        self.stats = DMAReadStatistics()
         self.dma_read_data = DMAReaderData()
-        self.dma_read_data.data = [None, None]
-        self.dma_read_data.ready = [False, False]
+        self.dma_read_data.ring = DMAReadRing(ring_depth, ring_policy)
         self.dma_read_data.callback = None
         self.dma_write_queue = Queue.Queue(4)
-        self.locks = [Lock(), Lock()]
 
         self.worker = DMAReadWorker(device,
                                     self,
                                     self.dma_write_queue,
-                                    self.dma_read_data,
-                                    self.locks)
+                                    self.dma_read_data)
         self.worker.setDaemon(True)
         self.worker.start()
         self.debug = False
@@ -890,11 +1232,13 @@ class DMAReadController(object):
         #print "Entered DMA read callback"
         #send a message queue to the worker thread to start processing the
         #incomming data
+        self.stats.interrupt()
         if not self.dma_write_queue.full():
             self.dma_write_queue.put(None)
 
     def enable_asynchronous_read(self, callback):
         self.dma_read_data.callback = callback
+        self.dma_read_data.ring.open()
         self.device.register_interrupt_callback(self.dma_read_callback)
         if self.debug: print "Starting asynchronous reader"
         self.dma_write_queue.put(True)
@@ -904,16 +1248,80 @@ class DMAReadController(object):
         #Disable callback
         self.dma_write_queue.put(False)
         self.dma_read_data.callback = None
+        #Release the worker if it is waiting for space in the ring
+        self.dma_read_data.ring.close()
         self.device.unregister_interrupt_callback(self.dma_read_callback)
 
     def is_asynchronous_mode(self):
         return self.dma_read_data.callback is not None
 
+    def set_ring(self, depth, policy = DMA_RING_DROP_OLDEST):
+        """
+        Replace the ring used by the asynchronous reader, all unread blocks
+        are discarded
+
+        Args:
+            depth (int): number of blocks to keep
+            policy (int): DMA_RING_DROP_OLDEST, DMA_RING_DROP_NEWEST or
+                DMA_RING_BLOCK
+
+        Returns:
+            Nothing
+
+        Raises:
+            NysaDMAException: asynchronous reader is running or the depth is
+                not valid
+        """
+        if self.is_asynchronous_mode():
+            raise NysaDMAException("Cannot change the ring while the asynchronous reader is running")
+        self.dma_read_data.ring = DMAReadRing(depth, policy)
+
+    def get_ring(self):
+        return self.dma_read_data.ring
+
+    def get_overrun_count(self):
+        """
+        Returns the number of blocks the asynchronous reader had to drop
+        because the ring was full
+        """
+        return self.dma_read_data.ring.get_overrun_count()
+
+    def get_statistics(self):
+        """
+        Returns the performance of the reader (see DMAReadStatistics.get),
+        'overruns' is the number of blocks the asynchronous reader dropped
+        """
+        d = self.stats.get()
+        d["overruns"] = self.get_overrun_count()
+        return d
+
+    def reset_statistics(self):
+        self.stats.reset()
+
+    def async_read_block(self, block = False, timeout = None):
+        """
+        Returns the oldest block read by the asynchronous reader along with
+        its sequence number, a gap in the sequence numbers shows that blocks
+        were dropped
+
+        Args:
+            block (boolean): wait for a block if none are available
+            timeout (float): maximum time to wait in seconds
+
+        Returns:
+            (tuple): (sequence, Array of bytes), (None, None) when no block
+                is available
+
+        Raises:
+            Nothing
+        """
+        return self.dma_read_data.ring.get(block, timeout)
+
     def async_read(self):
-        pos = self.dma_read_data.next
-        with self.locks[pos]:
-            self.dma_read_data.ready[pos] = False
-            return self.dma_read_data.data[pos]
+        sequence, data = self.dma_read_data.ring.get()
+        if data is None:
+            return Array('B')
+        return data
 
     def _dangerous_async_read(self):
         """
@@ -921,9 +1329,7 @@ class DMAReadController(object):
         thread will not read at the same time, this is usually callled within
         the same context as the thread itself
         """
-        pos = self.dma_read_data.next
-        self.dma_read_data.ready[pos] = False
-        return self.dma_read_data.data[pos]
+        return self.async_read()
 
     def _get_finished_block(self):
         """
@@ -1038,7 +1444,8 @@ class DMAReadController(object):
 
         elif (finished_status == 0) and self.is_busy():
             #print "Waiting for interrupts",
-            self.device.wait_for_interrupts(self.timeout)
+            if self.device.wait_for_interrupts(self.timeout):
+                self.stats.interrupt()
             #print "Got interrupts"
             finished_status = self._get_finished_block()
 
@@ -1049,7 +1456,9 @@ class DMAReadController(object):
         if finished_status == 1:
             if self.debug: print "READ: buffer 0 is ready"
             if self.debug: print "self.mem_base: 0x%08X, size: 0x%08X" % (self.mem_base[0], self.size)
+            read_start = time.time()
             buf = self.device.read_memory(self.mem_base[0], self.size)
+            self.stats.add_block(read_start, time.time())
             if anticipate:
                 if self.debug: print "READ: Setting up an anticipate read for channel 1"
                 if self.debug: print "READ: Busy Status[1]: %s" % str(self.busy_status[1])
@@ -1061,7 +1470,9 @@ class DMAReadController(object):
         else:
             if self.debug: print "READ: buffer 1 is ready"
             if self.debug: print "self.mem_base: 0x%08X, size: 0x%08X" % (self.mem_base[1], self.size)
+            read_start = time.time()
             buf = self.device.read_memory(self.mem_base[1], self.size)
+            self.stats.add_block(read_start, time.time())
             if anticipate:
                 if self.debug: print "READ: Setting up an anticipate read for channel 0"
                 if self.debug: print "READ: Busy Status[0]: %s" % str(self.busy_status[0])
@@ -1241,51 +1652,27 @@ class DMAWriteController(object):
         """
         position = 0
         total_length = len(buf)
-        if (self.timeout > 0):
-            timeout = self.timeout
-        while (len(buf[position:]) > 0):
-            size = self.size
-            if len(buf[position:]) < size:
-                size = len(buf[position:])
-                if size < 4:
-                    size = 4
+        timeout = self.timeout
+        while position < total_length:
             available_blocks = self.get_available_memory_blocks()
             #print "Status: 0x%08X" % available_blocks
 
             if (available_blocks == 1):
                 #Mem 0 is available
                 #print "Block 1 is available"
-                #self.device.write_memory(self.mem_base[0], buf[position: position + size + 1])
-                self.device.write_memory(self.mem_base[0], buf[position: position + size])
-                self.device.write_register(self.reg_size0, size / 4)
-                position += size
+                position = self.write_block(0, buf, position, total_length)
 
             elif (available_blocks == 2):
                 #Mem 1 is available
                 #print "Block 2 is available"
-                #self.device.write_memory(self.mem_base[1], buf[position: position + size + 1])
-                self.device.write_memory(self.mem_base[1], buf[position: position + size])
-                self.device.write_register(self.reg_size1, size / 4)
-                position += size
+                position = self.write_block(1, buf, position, total_length)
 
             elif (available_blocks == 3):
                 #print "Both Blocks Are available"
-                #self.device.write_memory(self.mem_base[0], buf[position: position + size + 1])
-                self.device.write_memory(self.mem_base[0], buf[position: position + size])
-                self.device.write_register(self.reg_size0, size / 4)
-                position += size
-
-                if len(buf[position:]) > 0:
+                position = self.write_block(0, buf, position, total_length)
+                if position < total_length:
                     #print "writing second block!"
-                    size = self.size
-                    if len(buf[position:]) < size:
-                        size = len(buf[position:])
-                        if size < 4:
-                            size = 4
-                    #self.device.write_memory(self.mem_base[1], buf[position: position + size + 1])
-                    self.device.write_memory(self.mem_base[1], buf[position: position + size])
-                    self.device.write_register(self.reg_size1, size / 4)
-                    position += size
+                    position = self.write_block(1, buf, position, total_length)
 
             else:
                 if timeout == 0:
@@ -1299,15 +1686,39 @@ class DMAWriteController(object):
                 elif timeout is None:
                     self.device.wait_for_interrupts(10)
 
+            #print "Wrote: 0x%08X" % position
 
-            #print "Size: 0x%08X" % size
-            if len(buf[position:]) == 0:
-                #print "\tfinished"
-                return
+    def write_block(self, index, buf, position = 0, total_length = None):
+        """
+        Write the next block of 'buf' starting at 'position' into memory block
+        'index' and tell the core it is ready, only the bytes of this block are
+        sliced out of the buffer
 
-            if len(buf[position:]) < self.size:
-                size = len(buf[position:])
-                #print "\t0x%08X more to write!" % size
+        The caller must know the memory block is free (see
+        get_available_memory_blocks), at most 'size' bytes are written
 
-            #print "Wrote: 0x%08X" % position
+        Args:
+            index (int): memory block 0 or 1
+            buf (Array of bytes): data to send
+            position (int): first byte of 'buf' to send
+            total_length (int): end of the data in 'buf', None for all of it
+
+        Returns:
+            (int): position of the next byte to write
+
+        Raises:
+            NysaCommError
+                An error in communication
+        """
+        if total_length is None:
+            total_length = len(buf)
+        size = min(self.size, total_length - position)
+        self.device.write_memory(self.mem_base[index], buf[position: position + size])
+        if size < 4:
+            size = 4
+        if index == 0:
+            self.device.write_register(self.reg_size0, size / 4)
+        else:
+            self.device.write_register(self.reg_size1, size / 4)
+        return position + size
 
@@ -86,6 +86,10 @@ class I2CError (Exception):
 class I2C(driver.Driver):
     """I2C
     """
+    #The speed and reset bits of the control register clear themselves
+    SHADOW_REGISTERS = {CONTROL:    (1 << CONTROL_SET_100KHZ) |
+                                    (1 << CONTROL_SET_400KHZ) |
+                                    (1 << CONTROL_RESET)}
 
     @staticmethod
     def get_abi_class():
@@ -478,17 +482,23 @@ class I2C(driver.Driver):
         #self.debug = True
         #set up a write command
         write_command = i2c_id << 1
-        #set up interrupts
-        self.enable_interrupt(True)
-
-        #send the write command / i2c identification
-        self.write_register(TRANSMIT, write_command)
-
         command = COMMAND_START | COMMAND_WRITE
         #if self.debug:
         #    self.print_control(self.read_register(CONTROL))
         #    self.print_command(command)
 
+        #set up interrupts, when the control register is shadowed this is only
+        #a write and only when interrupts are not already enabled
+        if self._is_shadowed(CONTROL):
+            control = self._shadow_value(CONTROL)
+        else:
+            control = self.read_register(CONTROL)
+        if (control & (1 << CONTROL_INTERRUPT_EN)) == 0:
+            self.set_register_bit(CONTROL, CONTROL_INTERRUPT_EN)
+        #send the write command / i2c identification
+        #(the transmit register is above the command register so the two
+        #writes can not be merged into one)
+        self.write_register(TRANSMIT, write_command)
         #send the command to the I2C command register to initiate a transfer
         self.write_register(COMMAND, command)
 
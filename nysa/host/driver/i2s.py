@@ -35,8 +35,16 @@ __author__ = "dave.mccoy@cospandesign.com (Dave McCoy)"
 import sys
 import os
 import time
+import wave
+import threading
 from array import array as Array
 
+#NumPy is optional, it is used to pack audio samples
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 sys.path.append(os.path.join(os.path.dirname(__file__),
                              os.pardir))
 
@@ -72,6 +80,9 @@ AUDIO_BUF_SIZE = 1000000
 #Sub ID
 COSPAN_DESIGN_I2S_MODULE = 0x01
 
+I2S_RIGHT_CHANNEL = 0x80000000
+I2S_SAMPLE_MASK   = 0x00FFFFFF
+
 class I2SError(Exception):
     pass
 
@@ -335,3 +346,236 @@ class I2S(driver.Driver):
         self.wdma.write(audio_data)
 
 
+
+    def play(self, pcm_chunks, sample_width = 2, channels = 2):
+        """
+        Play PCM audio in the background, see I2SAudioPlayer
+
+        Args:
+            pcm_chunks (iterable of Strings): little endian interleaved PCM
+                data, chunks can be any length
+            sample_width (Integer): bytes per sample (1, 2, 3 or 4)
+            channels (Integer): 1 or 2
+
+        Returns:
+            (I2SAudioPlayer): player that has been started
+
+        Raises:
+            I2SError: sample format is not supported
+        """
+        player = I2SAudioPlayer(self, pcm_chunks, sample_width, channels)
+        player.start()
+        return player
+
+    def play_wav(self, filename, set_sample_rate = True):
+        """
+        Play a WAV file in the background, the file is read a block at a time
+
+        Args:
+            filename (String): path to the WAV file
+            set_sample_rate (Boolean): set the clock divisor for the sample
+                rate of the file
+
+        Returns:
+            (I2SAudioPlayer): player that has been started
+
+        Raises:
+            I2SError: sample format is not supported
+            NysaCommError: Error in communication
+        """
+        w = wave.open(filename, "rb")
+        if set_sample_rate:
+            self.set_custom_sample_rate(w.getframerate())
+        frames = self.get_mem_block_size() / 8
+        return self.play(read_wav_chunks(w, frames), w.getsampwidth(), w.getnchannels())
+
+def read_wav_chunks(w, frames):
+    """
+    Generator of the PCM data of an open WAV file, 'frames' at a time, the
+    file is closed at the end
+    """
+    try:
+        while True:
+            data = w.readframes(frames)
+            if len(data) == 0:
+                return
+            yield data
+    finally:
+        w.close()
+
+def pack_samples(pcm, sample_width = 2, channels = 2):
+    """
+    Convert little endian PCM data into the words of the I2S core:
+
+        31: left = 0, right = 1 channel
+        30 - 24: Reserved
+        23 - 0: Audio data
+
+    Samples are scaled to 24 bits, mono samples are sent to both channels
+
+    Args:
+        pcm (String): interleaved PCM data, a whole number of frames
+        sample_width (Integer): bytes per sample (1, 2, 3 or 4), 1 is unsigned
+        channels (Integer): 1 or 2
+
+    Returns:
+        (Array of bytes): big endian 32-bit words
+
+    Raises:
+        I2SError: sample format is not supported
+    """
+    if sample_width not in [1, 2, 3, 4]:
+        raise I2SError("Sample width of %d bytes is not supported" % sample_width)
+    if channels not in [1, 2]:
+        raise I2SError("%d channels are not supported" % channels)
+    if len(pcm) < sample_width * channels:
+        return Array('B')
+    if np is not None:
+        return _pack_samples_array(pcm, sample_width, channels)
+
+    samples = []
+    if sample_width == 1:
+        samples = [(b - 128) << 16 for b in bytearray(pcm)]
+    elif sample_width == 3:
+        b = bytearray(pcm)
+        for i in range(0, len(b) - 2, 3):
+            samples.append(b[i] | (b[i + 1] << 8) | (b[i + 2] << 16))
+    else:
+        a = Array({2: 'h', 4: 'i'}[sample_width])
+        a.fromstring(pcm[0:len(pcm) - (len(pcm) % sample_width)])
+        if sys.byteorder == "big":
+            a.byteswap()
+        if sample_width == 2:
+            samples = [v << 8 for v in a]
+        else:
+            samples = [v >> 8 for v in a]
+
+    words = Array('I')
+    if channels == 1:
+        for v in samples:
+            v &= I2S_SAMPLE_MASK
+            words.append(v)
+            words.append(v | I2S_RIGHT_CHANNEL)
+    else:
+        for i in range(0, len(samples) - 1, 2):
+            words.append(samples[i] & I2S_SAMPLE_MASK)
+            words.append((samples[i + 1] & I2S_SAMPLE_MASK) | I2S_RIGHT_CHANNEL)
+    if sys.byteorder == "little":
+        words.byteswap()
+    return Array('B', words.tostring())
+
+def _pack_samples_array(pcm, sample_width, channels):
+    #NumPy version of pack_samples
+    count = len(pcm) / sample_width
+    if sample_width == 1:
+        samples = (np.frombuffer(pcm, dtype = np.uint8, count = count).astype(np.int32) - 128) << 16
+    elif sample_width == 2:
+        samples = np.frombuffer(pcm, dtype = "<i2", count = count).astype(np.int32) << 8
+    elif sample_width == 3:
+        b = np.frombuffer(pcm, dtype = np.uint8, count = count * 3).reshape(-1, 3).astype(np.int32)
+        samples = b[:, 0] | (b[:, 1] << 8) | (b[:, 2] << 16)
+    else:
+        samples = np.frombuffer(pcm, dtype = "<i4", count = count) >> 8
+
+    if channels == 1:
+        samples = np.repeat(samples, 2)
+    else:
+        samples = samples[0:len(samples) - (len(samples) % 2)]
+    words = samples.astype(np.uint32) & I2S_SAMPLE_MASK
+    words[1::2] |= I2S_RIGHT_CHANNEL
+    return Array('B', words.astype(">u4").tostring())
+
+class I2SAudioPlayer(threading.Thread):
+    """
+    Plays PCM audio through the two DMA memory blocks of the I2S core
+
+    PCM data is taken from 'pcm_chunks' only as it is needed to fill a
+    memory block, so the memory used does not depend on the length of the
+    audio. The next block is packed while the core plays the current one,
+    the thread waits for the interrupt of the core when both blocks are
+    full.
+
+    Args:
+        i2s (I2S): driver of the core
+        pcm_chunks (iterable of Strings): little endian interleaved PCM data
+        sample_width (Integer): bytes per sample (1, 2, 3 or 4)
+        channels (Integer): 1 or 2
+        timeout (float): seconds to wait for a memory block before giving up
+    """
+
+    def __init__(self, i2s, pcm_chunks, sample_width = 2, channels = 2, timeout = 3):
+        super(I2SAudioPlayer, self).__init__()
+        if sample_width not in [1, 2, 3, 4]:
+            raise I2SError("Sample width of %d bytes is not supported" % sample_width)
+        if channels not in [1, 2]:
+            raise I2SError("%d channels are not supported" % channels)
+        self.setDaemon(True)
+        self.i2s = i2s
+        self.chunks = iter(pcm_chunks)
+        self.sample_width = sample_width
+        self.channels = channels
+        self.timeout = timeout
+        #Every frame becomes two words (left and right)
+        self.block_frames = i2s.get_mem_block_size() / 8
+        self.pending = ""
+        self.running = False
+        self.error = None
+        self.blocks = 0
+
+    def _read_pcm(self):
+        #Returns the PCM data of one memory block, less at the end
+        frame_size = self.sample_width * self.channels
+        length = self.block_frames * frame_size
+        pieces = [self.pending]
+        size = len(self.pending)
+        while size < length:
+            try:
+                chunk = self.chunks.next()
+            except StopIteration:
+                break
+            pieces.append(chunk)
+            size += len(chunk)
+        data = "".join(pieces)
+        self.pending = data[length:]
+        data = data[0:length]
+        return data[0:len(data) - (len(data) % frame_size)]
+
+    def start(self):
+        self.running = True
+        self.i2s.register_interrupt_callback()
+        self.i2s.enable_interrupt(True)
+        super(I2SAudioPlayer, self).start()
+
+    def stop(self):
+        """
+        Stop feeding the core, the blocks already in memory are still played
+        """
+        self.running = False
+        self.join()
+
+    def is_playing(self):
+        return self.running
+
+    def run(self):
+        wdma = self.i2s.wdma
+        try:
+            block = pack_samples(self._read_pcm(), self.sample_width, self.channels)
+            while self.running and len(block) > 0:
+                available = wdma.get_available_memory_blocks()
+                if available == 0:
+                    if not self.i2s.wait_for_interrupts(self.timeout):
+                        if wdma.get_available_memory_blocks() == 0:
+                            raise I2SError("Timeout waiting for a free audio memory block")
+                    continue
+                if available & 1:
+                    wdma.write_block(0, block)
+                else:
+                    wdma.write_block(1, block)
+                self.blocks += 1
+                #Pack the next block while the core plays this one
+                block = pack_samples(self._read_pcm(), self.sample_width, self.channels)
+        except Exception as ex:
+            self.error = ex
+        finally:
+            self.running = False
+            self.i2s.unregister_interrupt_callback(self.i2s.interrupt_callback)
@@ -323,6 +323,43 @@ class LCDSSD1963(driver.Driver):
     def enable_chipselect(self, enable):
         self.enable_register_bit(CONTROL, CONTROL_CHIP_SELECT, enable)
 
+    def set_window(self, x, y, width, height):
+        """
+        Restrict the pixels written to the LCD to a rectangle, the next
+        'width' * 'height' pixels sent through the DMA writer fill the
+        rectangle row by row
+
+        Use set_window(0, 0, LCD_WIDTH, LCD_HEIGHT) to go back to full frames
+
+        Args:
+            x (Integer): left column
+            y (Integer): top row (page)
+            width (Integer): number of columns
+            height (Integer): number of rows
+
+        Returns:
+            Nothing
+
+        Raises:
+            LCDSSD1963Error: Rectangle is not on the screen
+            NysaCommError: Error in communication
+        """
+        if (width <= 0) or (height <= 0) or (x < 0) or (y < 0) or \
+                (x + width > LCD_WIDTH) or (y + height > LCD_HEIGHT):
+            raise LCDSSD1963Error("Window (%d, %d) %d x %d is not on the screen" %
+                                    (x, y, width, height))
+        x_end = x + width - 1
+        y_end = y + height - 1
+        self.write_command(MEM_ADR_SET_COLUMN_ADR, Array('B', [(x >> 8) & 0xFF,
+                                                               x & 0xFF,
+                                                               (x_end >> 8) & 0xFF,
+                                                               x_end & 0xFF]))
+        self.write_command(MEM_ADR_SET_PAGE_ADR, Array('B', [(y >> 8) & 0xFF,
+                                                             y & 0xFF,
+                                                             (y_end >> 8) & 0xFF,
+                                                             y_end & 0xFF]))
+        self.write_register(PIXEL_COUNT, width * height)
+
     def write_command(self, address, parameters=Array('B')):
         """
         write data to the MCU register and, if specified, some parameters
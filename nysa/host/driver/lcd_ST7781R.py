@@ -101,7 +101,6 @@ class LCDST7781R(driver.Driver):
 
     def __init__(self, nysa, urn, debug = False):
         super(LCDST7781R, self).__init__(nysa, urn, debug)
-        print "LCDST7781R_ LCD Device ID: %d" % self.dev_id
         #self.write_register(PIXEL_COUNT, LCD_WIDTH * LCD_HEIGHT)
 
         self.status = 0
@@ -234,6 +233,46 @@ class LCDST7781R(driver.Driver):
     def enable_chipselect(self, enable):
         self.enable_register_bit(REG_CONTROL, CONTROL_CHIP_SELECT, enable)
 
+    def set_window(self, x, y, width, height):
+        """
+        Restrict the pixels written to the LCD to a rectangle, the next
+        'width' * 'height' pixels sent through the DMA writer fill the
+        rectangle row by row
+
+        Use set_window(0, 0, LCD_WIDTH, LCD_HEIGHT) to go back to full frames
+
+        Args:
+            x (Integer): left column
+            y (Integer): top row
+            width (Integer): number of columns
+            height (Integer): number of rows
+
+        Returns:
+            Nothing
+
+        Raises:
+            LCDST7781RError: Rectangle is not on the screen
+            NysaCommError: Error in communication
+        """
+        if (width <= 0) or (height <= 0) or (x < 0) or (y < 0) or \
+                (x + width > LCD_WIDTH) or (y + height > LCD_HEIGHT):
+            raise LCDST7781RError("Window (%d, %d) %d x %d is not on the screen" %
+                                    (x, y, width, height))
+        x_end = x + width - 1
+        y_end = y + height - 1
+        #The entry mode set up in reset_lcd (AM = 1) scans the 240 pixel
+        #horizontal GRAM axis down the rows and the 320 pixel vertical GRAM
+        #axis across the columns, so screen x is the vertical window address
+        #(0x52/0x53) and screen y is the horizontal window address (0x50/0x51)
+        self.write_command(0x50, Array('B', [(y >> 8) & 0xFF, y & 0xFF]))
+        self.write_command(0x51, Array('B', [(y_end >> 8) & 0xFF, y_end & 0xFF]))
+        self.write_command(0x52, Array('B', [(x >> 8) & 0xFF, x & 0xFF]))
+        self.write_command(0x53, Array('B', [(x_end >> 8) & 0xFF, x_end & 0xFF]))
+        #Move the GRAM address to the start of the window
+        self.write_command(0x20, Array('B', [(y >> 8) & 0xFF, y & 0xFF]))
+        self.write_command(0x21, Array('B', [(x >> 8) & 0xFF, x & 0xFF]))
+        self.write_register(REG_PIXEL_COUNT, width * height)
+
     def write_command(self, address, parameters=Array('B')):
         """
         write data to the MCU register and, if specified, some parameters
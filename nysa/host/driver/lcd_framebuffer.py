@@ -0,0 +1,311 @@
+# Copyright (c) 2014 Dave McCoy (dave.mccoy@cospandesign.com)
+
+# This file is part of Nysa (wiki.cospandesign.com/index.php?title=Nysa).
+#
+# Nysa is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# any later version.
+#
+# Nysa is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Nysa; If not, see <http://www.gnu.org/licenses/>.
+
+
+""" LCD Framebuffer
+
+Host side copy of the image on an LCD (LCDSSD1963 or LCDST7781R)
+
+Drawing into the framebuffer only changes the copy on the host and marks the
+area as dirty, flush sends the dirty rectangles to the LCD: the address window
+of the LCD is set to the rectangle and the pixels of the rectangle are written
+with the DMA writer of the LCD in one burst. Redrawing a button only sends the
+button instead of the whole frame.
+
+Pixels are stored as RGB565 (16-bit) values in a NumPy array, the LCD cores
+take one 32-bit word for each pixel (0x00RRGGBB), the conversion is done when
+the rectangle is sent
+"""
+
+__author__ = 'dave.mccoy@cospandesign.com (Dave McCoy)'
+
+import time
+
+from array import array as Array
+
+#NumPy is required for the framebuffer
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+class LCDFramebufferError(Exception):
+    pass
+
+def rgb565(red, green, blue):
+    """
+    Convert an 8-bit per channel color to RGB565
+
+    Args:
+        red (Integer): 0 - 255
+        green (Integer): 0 - 255
+        blue (Integer): 0 - 255
+
+    Returns:
+        (Integer): 16-bit RGB565 color
+    """
+    return ((red & 0xF8) << 8) | ((green & 0xFC) << 3) | (blue >> 3)
+
+_pixel_word_table = None
+
+def _get_pixel_word_table():
+    #One 32-bit LCD word (big endian 0x00RRGGBB) for each of the 65536
+    #RGB565 values
+    global _pixel_word_table
+    if _pixel_word_table is None:
+        values = np.arange(0x10000, dtype = np.uint32)
+        r = (values >> 11) & 0x1F
+        g = (values >> 5) & 0x3F
+        b = values & 0x1F
+        r = (r << 3) | (r >> 2)
+        g = (g << 2) | (g >> 4)
+        b = (b << 3) | (b >> 2)
+        _pixel_word_table = ((r << 16) | (g << 8) | b).astype(">u4")
+    return _pixel_word_table
+
+class LCDFramebuffer(object):
+    """
+    Framebuffer of an LCD that only sends the areas that have changed
+
+    Args:
+        lcd (LCDSSD1963 or LCDST7781R): LCD driver, it must be setup
+        merge_area (Integer): two dirty rectangles are sent as one if the
+            rectangle around both of them is at most this many pixels bigger
+            than the two rectangles, setting up an address window costs about
+            as much as sending a few hundred pixels
+        max_rects (Integer): when there are more dirty rectangles than this
+            they are replaced by the rectangle around all of them
+        timeout (Float): seconds to wait for the LCD to finish the previous
+            rectangle before the address window is moved
+
+    Raises:
+        LCDFramebufferError: NumPy is not installed
+    """
+
+    def __init__(self, lcd, merge_area = 1024, max_rects = 16, timeout = 3):
+        if np is None:
+            raise LCDFramebufferError("NumPy is required for the framebuffer")
+        self.lcd = lcd
+        self.width = lcd.get_image_width()
+        self.height = lcd.get_image_height()
+        self.merge_area = merge_area
+        self.max_rects = max_rects
+        self.timeout = timeout
+        self.pixels = np.zeros((self.height, self.width), dtype = np.uint16)
+        self._words = np.empty(self.width * self.height, dtype = ">u4")
+        self.dirty = []
+
+    def get_pixels(self):
+        """
+        Returns the height x width uint16 array of RGB565 pixels, call
+        invalidate after changing it directly
+
+        Args:
+            Nothing
+
+        Returns:
+            (NumPy array): pixels of the framebuffer
+        """
+        return self.pixels
+
+    def _clip(self, x, y, width, height):
+        if width is None:
+            width = self.width - x
+        if height is None:
+            height = self.height - y
+        x0 = max(x, 0)
+        y0 = max(y, 0)
+        x1 = min(x + width, self.width)
+        y1 = min(y + height, self.height)
+        if (x1 <= x0) or (y1 <= y0):
+            return None
+        return (x0, y0, x1, y1)
+
+    def invalidate(self, x = 0, y = 0, width = None, height = None):
+        """
+        Mark a rectangle as dirty, by default the whole screen is dirty
+
+        The rectangle is clipped to the screen
+
+        Args:
+            x (Integer): left column
+            y (Integer): top row
+            width (Integer): number of columns, None for the rest of the row
+            height (Integer): number of rows, None for the rest of the screen
+
+        Returns:
+            Nothing
+        """
+        rect = self._clip(x, y, width, height)
+        if rect is not None:
+            self._add_dirty(rect)
+
+    def _add_dirty(self, rect):
+        #Merge the new rectangle with every dirty rectangle that is cheaper to
+        #send together with it, a merged rectangle can make another merge
+        #worthwhile so go around until nothing changes
+        merged = True
+        while merged:
+            merged = False
+            for i in range(len(self.dirty)):
+                other = self.dirty[i]
+                union = (min(rect[0], other[0]),
+                         min(rect[1], other[1]),
+                         max(rect[2], other[2]),
+                         max(rect[3], other[3]))
+                if _area(union) <= _area(rect) + _area(other) + self.merge_area:
+                    del self.dirty[i]
+                    rect = union
+                    merged = True
+                    break
+        self.dirty.append(rect)
+
+        if len(self.dirty) > self.max_rects:
+            self.dirty = [(min([r[0] for r in self.dirty]),
+                           min([r[1] for r in self.dirty]),
+                           max([r[2] for r in self.dirty]),
+                           max([r[3] for r in self.dirty]))]
+
+    def get_dirty_rects(self):
+        """
+        Returns the rectangles the next flush sends
+
+        Args:
+            Nothing
+
+        Returns:
+            (List of tuples): (x, y, width, height) of each rectangle
+        """
+        return [(r[0], r[1], r[2] - r[0], r[3] - r[1]) for r in self.dirty]
+
+    def fill(self, color, x = 0, y = 0, width = None, height = None):
+        """
+        Fill a rectangle with one color, by default the whole screen
+
+        Args:
+            color (Integer): RGB565 color
+            x (Integer): left column
+            y (Integer): top row
+            width (Integer): number of columns, None for the rest of the row
+            height (Integer): number of rows, None for the rest of the screen
+
+        Returns:
+            Nothing
+        """
+        rect = self._clip(x, y, width, height)
+        if rect is None:
+            return
+        self.pixels[rect[1]:rect[3], rect[0]:rect[2]] = color
+        self._add_dirty(rect)
+
+    def set_pixel(self, x, y, color):
+        """
+        Set the color of one pixel
+
+        Args:
+            x (Integer): column
+            y (Integer): row
+            color (Integer): RGB565 color
+
+        Returns:
+            Nothing
+        """
+        self.fill(color, x, y, 1, 1)
+
+    def blit(self, image, x = 0, y = 0):
+        """
+        Copy an image into the framebuffer, the parts of the image that are
+        not on the screen are dropped
+
+        Args:
+            image (NumPy array): height x width RGB565 (uint16) image or
+                height x width x 3 RGB (uint8) image
+            x (Integer): column of the left edge of the image
+            y (Integer): row of the top edge of the image
+
+        Returns:
+            Nothing
+
+        Raises:
+            LCDFramebufferError: image is not an RGB565 or an RGB image
+        """
+        image = np.asarray(image)
+        if image.ndim == 3 and image.shape[2] == 3:
+            red = image[:, :, 0].astype(np.uint16)
+            green = image[:, :, 1].astype(np.uint16)
+            blue = image[:, :, 2].astype(np.uint16)
+            image = ((red & 0xF8) << 8) | ((green & 0xFC) << 3) | (blue >> 3)
+        elif image.ndim != 2:
+            raise LCDFramebufferError("Image must be height x width (RGB565) or height x width x 3 (RGB)")
+
+        rect = self._clip(x, y, image.shape[1], image.shape[0])
+        if rect is None:
+            return
+        self.pixels[rect[1]:rect[3], rect[0]:rect[2]] = \
+            image[rect[1] - y:rect[3] - y, rect[0] - x:rect[2] - x]
+        self._add_dirty(rect)
+
+    def _wait_for_lcd(self):
+        #Moving the address window while the LCD is still drawing the previous
+        #rectangle would put the end of that rectangle in the new window
+        dma_writer = self.lcd.dma_writer
+        timeout = time.time() + self.timeout
+        while dma_writer.get_available_memory_blocks() != 3:
+            if time.time() > timeout:
+                raise LCDFramebufferError("Timeout while waiting for the LCD to finish a rectangle")
+            self.lcd.wait_for_interrupts(0.1)
+
+    def flush(self):
+        """
+        Send the dirty rectangles to the LCD, when only part of the screen was
+        sent the address window is put back to the whole screen afterwards so
+        full frames written to the LCD go to the right place
+
+        Args:
+            Nothing
+
+        Returns:
+            (Integer): number of pixels sent
+
+        Raises:
+            LCDFramebufferError: Timeout while waiting for the LCD
+            NysaCommError: Error in communication
+        """
+        table = _get_pixel_word_table()
+        count = 0
+        full_screen = True
+        while len(self.dirty) > 0:
+            x0, y0, x1, y1 = self.dirty[0]
+            width = x1 - x0
+            height = y1 - y0
+            words = self._words[0:width * height].reshape(height, width)
+            np.take(table, self.pixels[y0:y1, x0:x1], out = words)
+
+            self._wait_for_lcd()
+            self.lcd.set_window(x0, y0, width, height)
+            self.lcd.dma_writer.write(Array('B', words.tostring()))
+            del self.dirty[0]
+            count += width * height
+            full_screen = (width == self.width) and (height == self.height)
+
+        if count > 0 and not full_screen:
+            self._wait_for_lcd()
+            self.lcd.set_window(0, 0, self.width, self.height)
+        return count
+
+def _area(rect):
+    return (rect[2] - rect[0]) * (rect[3] - rect[1])
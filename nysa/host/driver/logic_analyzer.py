@@ -1,10 +1,17 @@
 import sys
 import os
 import time
+import threading
 from array import array as Array
 from nysa.host.driver.utils import *
 from collections import OrderedDict
 
+#NumPy is optional, it is used to decode deep captures
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 sys.path.append(os.path.join(os.path.dirname(__file__),
                              os.pardir))
 
@@ -152,31 +159,259 @@ class LogicAnalyzer(driver.Driver):
         return self.read(READ_DATA, self.data_count, disable_auto_inc = True)
 
     def read_data(self):
+        """
+        Read the capture and put the samples in the order they were captured,
+        the first sample is the oldest one
+
+        Returns:
+            (Array of 32-bit values): one value per sample, bit 'n' is
+                channel 'n'
+
+        Raises:
+            NysaCommError: Error in communication
+        """
+        start_pos = self.read_register(START_POS)
+        raw_data = self.read(READ_DATA, self.data_count, disable_auto_inc = True)
+        if self.debug: print "Start Pos: 0x%04X" % start_pos
+        return decode_capture(raw_data, start_pos)
+
+    def read_data_array(self):
+        """
+        Read the capture into a NumPy array, samples are in the order they
+        were captured, use get_channel or get_channels to pull out the
+        channels
+
+        Returns:
+            (NumPy array of uint32): one value per sample
+
+        Raises:
+            LogicAnalyzerException: NumPy is not installed
+            NysaCommError: Error in communication
+        """
         start_pos = self.read_register(START_POS)
         raw_data = self.read(READ_DATA, self.data_count, disable_auto_inc = True)
-        #Need to reorder the data so it makes sense for the user
-        temp = Array('L')
-        for i in range (0, len(raw_data), 4):
-            temp.append(array_to_dword(raw_data[i: i + 4]))
+        if self.debug: print "Start Pos: 0x%04X" % start_pos
+        return decode_capture_array(raw_data, start_pos)
+
+    def get_clock_rate(self):
+        return self.read_register(CLOCK_RATE)
+
+    def acquire(self, count = None, depth = 4, policy = driver.DMA_RING_DROP_OLDEST, timeout = None, decode = None):
+        """
+        Capture continuously and yield the captures as they are read
+
+        The analyzer is re-armed as soon as a capture is read off the core so
+        the next capture is taken while the previous one is decoded on a
+        worker thread. Captures that are not consumed in time are kept in a
+        ring of 'depth' captures, what happens when it is full is decided by
+        'policy' (see DMAReadRing)
+
+        Example:
+
+            for capture in la.acquire(count = 10):
+                print "%d dropped: %d" % (capture.sequence, capture.dropped)
+
+        Args:
+            count (Integer): number of captures to yield, None to capture until
+                the generator is closed
+            depth (Integer): number of decoded captures to keep
+            policy (Integer): DMA_RING_DROP_OLDEST, DMA_RING_DROP_NEWEST or
+                DMA_RING_BLOCK
+            timeout (float): stop if no capture arrives in this many seconds,
+                None waits forever
+            decode (function): called with the raw data and the start position
+                the default is decode_capture, use decode_capture_array for
+                NumPy arrays
+
+        Yields:
+            (LogicAnalyzerCapture)
+
+        Raises:
+            NysaCommError: Error in communication
+        """
+        if decode is None:
+            decode = decode_capture
+        acquisition = LogicAnalyzerAcquisition(self, depth, policy, decode)
+        acquisition.start()
+        try:
+            captured = 0
+            while count is None or captured < count:
+                capture = acquisition.get(timeout)
+                if capture is None:
+                    return
+                captured += 1
+                yield capture
+        finally:
+            acquisition.stop()
+
+class LogicAnalyzerCapture(object):
+    """
+    A capture read by LogicAnalyzer.acquire
 
-        '''
-        for i in range (0, len(temp), 1):
-            print "\t[%04X] 0x%08X" % (i, temp[i])
-        '''
+    data: decoded samples
+    timestamp: time the capture was read off the core
+    start_pos: position of the oldest sample in the ring buffer of the core
+    sequence: number of the capture, a gap means captures were dropped
+    dropped: number of captures dropped since the acquisition started
+    """
+    def __init__(self, data, timestamp, start_pos):
+        self.data = data
+        self.timestamp = timestamp
+        self.start_pos = start_pos
+        self.sequence = 0
+        self.dropped = 0
+
+class LogicAnalyzerAcquisition(threading.Thread):
+    """
+    Worker thread of LogicAnalyzer.acquire, waits for the interrupt of the
+    core (or polls if interrupts do not arrive), reads the capture, re-arms
+    the core and decodes the capture into the ring
+    """
+    def __init__(self, la, depth, policy, decode, poll_time = 0.1):
+        super(LogicAnalyzerAcquisition, self).__init__()
+        self.setDaemon(True)
+        self.la = la
+        self.ring = driver.DMAReadRing(depth, policy)
+        self.decode = decode
+        self.poll_time = poll_time
+        self.running = False
+        self.error = None
+
+    def start(self):
+        self.running = True
+        self.la.register_interrupt_callback(self.la.interrupt_callback)
+        self.la.enable_interrupts(True)
+        if not self.la.is_enabled():
+            self.la.enable(True)
+        self.la.restart()
+        super(LogicAnalyzerAcquisition, self).start()
+
+    def stop(self):
+        self.running = False
+        self.ring.close()
+        self.join()
+        self.la.enable_interrupts(False)
+        self.la.unregister_interrupt_callback(self.la.interrupt_callback)
+
+    def run(self):
+        la = self.la
+        try:
+            while self.running:
+                if not la.is_finished():
+                    la.wait_for_interrupts(self.poll_time)
+                    if not la.is_finished():
+                        continue
+
+                timestamp = time.time()
+                start_pos = la.get_start_pos()
+                raw_data = la.read_raw_data()
+                #Re-arm before decoding so the core captures in the meantime
+                la.restart()
+                self.ring.put(LogicAnalyzerCapture(self.decode(raw_data, start_pos),
+                                                   timestamp,
+                                                   start_pos))
+        except Exception as ex:
+            self.error = ex
+        finally:
+            self.running = False
+
+    def get(self, timeout = None):
+        """
+        Returns the oldest capture or None if the timeout expired or the
+        acquisition stopped
+
+        Raises:
+            Errors of the worker thread
+        """
+        end = None
+        if timeout is not None:
+            end = time.time() + timeout
+        while True:
+            sequence, capture = self.ring.get(True, self.poll_time)
+            if capture is not None:
+                capture.sequence = sequence
+                capture.dropped = self.ring.get_overrun_count()
+                return capture
+            if self.error is not None:
+                raise self.error
+            if not self.running:
+                return None
+            if end is not None and time.time() >= end:
+                return None
+
+def decode_capture(raw_data, start_pos = 0):
+    """
+    Convert the raw bytes of a capture into 32-bit samples and rotate the
+    ring buffer of the core so the sample at 'start_pos' comes first
 
-        print "Start Pos: 0x%04X" % start_pos
+    Args:
+        raw_data (Array of bytes): big endian 32-bit samples
+        start_pos (Integer): position of the oldest sample
 
-        #Change data to 32-bit array
-        data = Array('L')
-        if start_pos  == 0:
-            data = temp
+    Returns:
+        (Array of 32-bit values)
+    """
+    temp = Array('I')
+    temp.fromstring(raw_data.tostring())
+    if sys.byteorder == "little":
+        temp.byteswap()
+    return Array('L', temp[start_pos:] + temp[0:start_pos])
 
-        data.extend(temp[start_pos:])
-        data.extend(temp[0:start_pos])
-        return data
+def decode_capture_array(raw_data, start_pos = 0):
+    """
+    NumPy version of decode_capture, the raw bytes are viewed as big endian
+    32-bit values without converting them one at a time
 
-    def get_clock_rate(self):
-        return self.read_register(CLOCK_RATE)
+    Args:
+        raw_data (Array of bytes, String): big endian 32-bit samples
+        start_pos (Integer): position of the oldest sample
+
+    Returns:
+        (NumPy array of uint32)
+
+    Raises:
+        LogicAnalyzerException: NumPy is not installed
+    """
+    if np is None:
+        raise LogicAnalyzerException("NumPy is required to decode a capture into an array")
+    temp = np.frombuffer(raw_data, dtype = ">u4")
+    return np.concatenate((temp[start_pos:], temp[0:start_pos])).astype(np.uint32)
+
+def get_channel(data, channel):
+    """
+    Extract the samples of one channel
+
+    Args:
+        data (Array or NumPy array): decoded capture
+        channel (Integer): channel (bit) to extract
+
+    Returns:
+        (Array of bytes or NumPy array of uint8): 0 or 1 for every sample,
+            a NumPy array is returned when a NumPy array is passed in
+    """
+    if np is not None and isinstance(data, np.ndarray):
+        return ((data >> channel) & 1).astype(np.uint8)
+    return Array('B', [(d >> channel) & 1 for d in data])
+
+def get_channels(data, count = 32):
+    """
+    Extract the samples of the first 'count' channels at once
+
+    Args:
+        data (NumPy array): decoded capture
+        count (Integer): number of channels
+
+    Returns:
+        (NumPy array of uint8): one row per channel, one column per sample
+
+    Raises:
+        LogicAnalyzerException: NumPy is not installed
+    """
+    if np is None:
+        raise LogicAnalyzerException("NumPy is required to extract the channels")
+    data = np.asarray(data, dtype = np.uint32)
+    shifts = np.arange(count, dtype = np.uint32).reshape(count, 1)
+    return ((data.reshape(1, -1) >> shifts) & 1).astype(np.uint8)
 
 def set_vcd_header():
     #set date
@@ -320,3 +555,140 @@ def create_vcd_buffer(data, signal_dict = OrderedDict(), count = 32, clock_count
     return buf
 
 
+class VCDWriter(object):
+    """
+    Writes captures to a VCD file as they are read instead of building the
+    whole file in memory
+
+    Only the channels that change are written for a sample, successive
+    captures (for example the captures of a repeat count) are appended to
+    the same timeline.
+
+    Example:
+
+        f = open("capture.vcd", "w")
+        vcd = VCDWriter(f, clock_count = la.get_clock_rate())
+        for i in range(repeat_count):
+            vcd.write_capture(la.read_data())
+        vcd.close()
+        f.close()
+
+    Args:
+        f (File): file object the VCD is written to
+        signal_dict (OrderedDict): signal name -> width, if None 'count'
+            signals named signal0... are used
+        count (Integer): number of channels
+        clock_count (Integer): sample clock rate in Hz
+        add_clock (Boolean): add a clock signal, this writes two lines for
+            every sample even if nothing changes
+        buffer_lines (Integer): number of lines to collect before they are
+            written to the file
+    """
+
+    def __init__(self, f, signal_dict = None, count = 32, clock_count = 100, add_clock = False, buffer_lines = 4096):
+        self.f = f
+        if signal_dict is None:
+            signal_dict = OrderedDict()
+            for i in range(count):
+                signal_dict["signal%d" % i] = 1
+        self.signal_dict = signal_dict
+        self.count = min(count, len(signal_dict))
+        self.add_clock = add_clock
+        ghertz_freq = 1000000000
+        if clock_count == 0:
+            clock_count = 100000000
+        self.cycles_per_clock = int(ghertz_freq / clock_count)
+        self.buffer_lines = buffer_lines
+
+        self.clock_character = chr(33)
+        index_offset = 33
+        if add_clock:
+            index_offset = 34
+        self.characters = [chr(index_offset + i) for i in range(self.count)]
+
+        self.lines = []
+        self.last = None
+        self.sample = 0
+        self.capture_count = 0
+        self.f.write(set_vcd_header())
+        self.f.write(set_signal_names(signal_dict, add_clock))
+
+    def _flush(self):
+        self.f.write("".join(self.lines))
+        self.lines = []
+
+    def _write_changes(self, sample, value, changed, dump = False):
+        lines = self.lines
+        t = sample * self.cycles_per_clock
+        lines.append("#%d\n" % t)
+        if dump:
+            lines.append("$dumpvars\n")
+        if self.add_clock:
+            lines.append("1%s\n" % self.clock_character)
+        for j in range(self.count):
+            if (changed >> j) & 0x01:
+                lines.append("%d%s\n" % ((value >> j) & 0x01, self.characters[j]))
+        if dump:
+            lines.append("$end\n")
+        if self.add_clock:
+            lines.append("#%d\n" % (t + (self.cycles_per_clock / 2)))
+            lines.append("0%s\n" % self.clock_character)
+
+    def write_capture(self, data, gap = 0):
+        """
+        Append a capture to the timeline
+
+        Args:
+            data (Array or NumPy array): decoded capture (see read_data)
+            gap (Integer): number of sample clocks between the end of the
+                previous capture and this one
+
+        Returns:
+            Nothing
+        """
+        if len(data) == 0:
+            return
+        if self.capture_count > 0:
+            self.sample += gap
+        self.lines.append("$comment capture %d $end\n" % self.capture_count)
+        self.capture_count += 1
+
+        mask = (1 << self.count) - 1
+        if self.last is None:
+            self._write_changes(self.sample, int(data[0]), mask, dump = True)
+            self.last = int(data[0])
+            start = 1
+            self.sample += 1
+        else:
+            start = 0
+
+        if self.add_clock or np is None or not isinstance(data, np.ndarray):
+            indexes = range(start, len(data))
+        else:
+            #Only visit the samples that are different from the one before
+            previous = np.concatenate((np.array([self.last], dtype = data.dtype), data[:-1]))
+            indexes = np.flatnonzero((data ^ previous) & mask)
+            indexes = indexes[indexes >= start]
+
+        base = self.sample - start
+        last = self.last
+        for i in indexes:
+            value = int(data[i])
+            changed = (last ^ value) & mask
+            if changed or self.add_clock:
+                self._write_changes(base + i, value, changed)
+            last = value
+            if len(self.lines) >= self.buffer_lines:
+                self._flush()
+
+        self.last = int(data[-1])
+        self.sample = base + len(data)
+        self._flush()
+
+    def close(self):
+        """
+        Write the time of the end of the last capture, the file object is
+        not closed
+        """
+        self.lines.append("#%d\n" % (self.sample * self.cycles_per_clock))
+        self._flush()
@@ -31,6 +31,7 @@ import i2c
 import random
 
 from array import array as Array
+from collections import OrderedDict
 
 import driver
 from driver import NysaDMAException
@@ -61,6 +62,12 @@ DEBUG_HD_COUNTS                 = 11
 SATA_BUFFER_OFFSET              = 0x100
 SATA_BUFFER_SIZE                = 2**9
 
+SECTOR_SIZE                     = 512
+#Largest sector count of a single ATA command (sent down as 0)
+MAX_COMMAND_SECTORS             = 0x10000
+#Sectors that fit in the local buffer
+LOCAL_BUFFER_SECTORS            = (SATA_BUFFER_SIZE * 4) / SECTOR_SIZE
+
 
 #Control
 BIT_HD_COMMAND_RESET            = 0
@@ -560,27 +567,127 @@ class SATADriver(driver.Driver):
             return
         if length == 0x10000:
             length = 0
-        self.send_hard_drive_features(0x00)
-        self.set_sector_count(length)
-        self.set_hard_drive_lba(address)
-        #self.send_hard_drive_command(0x24)
-        self.send_hard_drive_command(0x25)
+        self._send_hard_drive_lba_command(0x25, address, length)
 
     def hard_drive_write(self, address, length):
         if length == 0:
             return
         if length == 0x10000:
             length = 0
-        self.send_hard_drive_features(0x00)
-        self.set_sector_count(length)
-        self.set_hard_drive_lba(address)
-        self.send_hard_drive_command(0x35)
-        #self.send_hard_drive_command(0x34)
+        self._send_hard_drive_lba_command(0x35, address, length)
+
+    def wait_for_hard_drive(self, timeout = 1.0):
+        """
+        Wait for the hard drive to finish the current command
+
+        Args:
+            timeout (Float): seconds to wait
+
+        Returns:
+            Nothing
+
+        Raises:
+            SATAError: Timeout or the hard drive reported an error
+            NysaCommError: Error in communication
+        """
+        timeout_time = time.time() + timeout
+        while self.is_sata_busy():
+            if time.time() > timeout_time:
+                raise SATAError("Timeout while waiting for the hard drive")
+            time.sleep(0.001)
+        if self.is_hard_drive_error():
+            raise SATAError("Hard drive error, Status: 0x%02X Error: 0x%02X" %
+                            (self.get_d2h_status(), self.get_d2h_error()))
+
+    def read_sectors(self, address, count):
+        """
+        Read sectors from the hard drive through the local buffer
+
+        The local buffer only holds LOCAL_BUFFER_SECTORS sectors so a read
+        command is sent for every buffer load. This is a limit of the core:
+        with DMA control off the drive fills the single local buffer and the
+        host has no way to hold the drive off while it drains the buffer, so
+        a longer command would overwrite data that was not read yet. Commands
+        of up to MAX_COMMAND_SECTORS only go through the DMA data path
+        (enable_dma_control)
+
+        Args:
+            address (Long): LBA of the first sector
+            count (Integer): number of sectors (1 - MAX_COMMAND_SECTORS)
+
+        Returns (Array of bytes):
+            count * SECTOR_SIZE bytes
+
+        Raises:
+            SATAError: Invalid count or the hard drive reported an error
+            NysaCommError: Error in communication
+        """
+        if (count <= 0) or (count > MAX_COMMAND_SECTORS):
+            raise SATAError("Sector count must be between 1 and 0x%X: 0x%X" %
+                            (MAX_COMMAND_SECTORS, count))
+        data = Array('B')
+        while count > 0:
+            length = min(count, LOCAL_BUFFER_SECTORS)
+            self.hard_drive_read(address, length)
+            self.wait_for_hard_drive()
+            data.extend(self.read_local_buffer(0, length * SECTOR_SIZE / 4))
+            address += length
+            count -= length
+        return data
+
+    def write_sectors(self, address, data):
+        """
+        Write sectors to the hard drive through the local buffer
+
+        The local buffer only holds LOCAL_BUFFER_SECTORS sectors so a write
+        command is sent for every buffer load, see read_sectors
+
+        Args:
+            address (Long): LBA of the first sector
+            data (Array of bytes): a multiple of SECTOR_SIZE bytes, at most
+                MAX_COMMAND_SECTORS sectors
+
+        Returns:
+            Nothing
+
+        Raises:
+            SATAError: Invalid length or the hard drive reported an error
+            NysaCommError: Error in communication
+        """
+        count = len(data) / SECTOR_SIZE
+        if (len(data) % SECTOR_SIZE) or (count == 0) or (count > MAX_COMMAND_SECTORS):
+            raise SATAError("Data must be between 1 and 0x%X sectors: %d bytes" %
+                            (MAX_COMMAND_SECTORS, len(data)))
+        position = 0
+        while count > 0:
+            length = min(count, LOCAL_BUFFER_SECTORS)
+            size = length * SECTOR_SIZE
+            self.set_local_buffer_write_size(size / 4)
+            self.write_local_buffer(data[position:position + size])
+            self.load_local_buffer()
+            self.hard_drive_write(address, length)
+            self.wait_for_hard_drive()
+            address += length
+            position += size
+            count -= length
 
     def hard_drive_idle(self):
-        self.send_hard_drive_features(0x00)
-        self.set_sector_count(0x00)
-        self.send_hard_drive_command(0x97)
+        with self.batch() as b:
+            b.write_register(HARD_DRIVE_FEATURES, 0x00)
+            b.write_register(HARD_DRIVE_SECTOR_COUNT, 0x00)
+            b.write_register(HARD_DRIVE_COMMAND, 0x97)
+
+    def _send_hard_drive_lba_command(self, command, address, length):
+        #Send the entire command setup to the board in one batch, the sector
+        #count and the address are queued in register order so they go out as
+        #one auto incrementing write, the command starts the transfer so it
+        #has to be last
+        with self.batch() as b:
+            b.write_register(HARD_DRIVE_FEATURES, 0x00)
+            b.write_register(HARD_DRIVE_SECTOR_COUNT, length)
+            b.write_register(HARD_DRIVE_ADDRESS_HIGH, ((0xFFFF00000000 & address) >> 32))
+            b.write_register(HARD_DRIVE_ADDRESS_LOW, (0xFFFFFFFF & address))
+            b.write_register(HARD_DRIVE_COMMAND, command)
 
     def get_din_fifo_status(self):
         return self.read_register_bit_range(STATUS, BIT_DIN_FIFO_READY1, BIT_DIN_FIFO_READY0)
@@ -726,3 +833,289 @@ class SataConfig(object):
     def hard_drive_buffer_size(self):
         return self.raw_data[42]
 
+
+class SATABlockDevice(object):
+    """
+    Block device on top of a hard drive
+
+    Reads and writes go through an LRU cache of sectors:
+        * Reads that continue where the last read stopped also read the next
+            'readahead' sectors
+        * Writes stay in the cache until flush is called or the cache needs
+            the room, adjacent dirty sectors are then written with one command
+        * Transfers are split at 'max_command_sectors'
+
+    SATADriver.read_sectors and write_sectors still send a command for every
+    LOCAL_BUFFER_SECTORS sectors (a limit of the local buffer of the core), a
+    drive with a larger data path only sees commands of 'max_command_sectors'
+
+    Args:
+        drive (SATADriver): hard drive, anything with read_sectors and
+            write_sectors can be used
+        cache_sectors (Integer): number of sectors kept in the cache
+        readahead (Integer): sectors to read past a sequential read, 0
+            disables readahead
+        sector_count (Long): size of the hard drive in sectors, readahead
+            stops at the end of the drive, None if not known
+        max_command_sectors (Integer): largest transfer sent to the drive
+
+    Raises:
+        SATAError: The cache is smaller than the readahead
+    """
+
+    def __init__(self,
+                 drive,
+                 cache_sectors = 4096,
+                 readahead = 256,
+                 sector_count = None,
+                 max_command_sectors = MAX_COMMAND_SECTORS):
+        if cache_sectors < readahead + 1:
+            raise SATAError("Cache (%d sectors) must be larger than the readahead (%d sectors)" %
+                            (cache_sectors, readahead))
+        self.drive = drive
+        self.cache_sectors = cache_sectors
+        self.readahead = readahead
+        self.sector_count = sector_count
+        self.max_command_sectors = max_command_sectors
+        self.cache = OrderedDict()
+        self.dirty = set()
+        self.next_lba = None
+        self.reset_statistics()
+
+    def reset_statistics(self):
+        """
+        Clear the cache and command counters
+
+        Args:
+            Nothing
+
+        Returns:
+            Nothing
+        """
+        self.hits = 0
+        self.misses = 0
+        self.read_commands = 0
+        self.write_commands = 0
+        self.sectors_read = 0
+        self.sectors_written = 0
+
+    def get_statistics(self):
+        """
+        Returns the cache and command counters
+
+        Args:
+            Nothing
+
+        Returns (Dictionary):
+            hits: sectors read from the cache
+            misses: sectors that had to be read from the drive
+            read_commands: read transfers sent to the drive
+            write_commands: write transfers sent to the drive
+            sectors_read: sectors read from the drive (including readahead)
+            sectors_written: sectors written to the drive
+            cached: sectors in the cache
+            dirty: sectors in the cache that are not on the drive yet
+        """
+        return {"hits": self.hits,
+                "misses": self.misses,
+                "read_commands": self.read_commands,
+                "write_commands": self.write_commands,
+                "sectors_read": self.sectors_read,
+                "sectors_written": self.sectors_written,
+                "cached": len(self.cache),
+                "dirty": len(self.dirty)}
+
+    def _check_range(self, lba, count):
+        if (lba < 0) or (count < 0):
+            raise SATAError("Invalid sector range: LBA: 0x%X Count: %d" % (lba, count))
+        if (self.sector_count is not None) and (lba + count > self.sector_count):
+            raise SATAError("Sectors 0x%X - 0x%X are past the end of the drive (0x%X sectors)" %
+                            (lba, lba + count - 1, self.sector_count))
+
+    def _lookup(self, lba):
+        #Move the sector to the most recently used end
+        data = self.cache.pop(lba)
+        self.cache[lba] = data
+        return data
+
+    def _insert(self, lba, data, dirty = False):
+        if lba in self.cache:
+            del self.cache[lba]
+        self.cache[lba] = data
+        if dirty:
+            self.dirty.add(lba)
+        while len(self.cache) > self.cache_sectors:
+            oldest = next(iter(self.cache))
+            if oldest in self.dirty:
+                #Write every dirty sector while at it, they are probably
+                #adjacent to this one
+                self.flush()
+            del self.cache[oldest]
+
+    def _read_drive(self, lba, count):
+        data = Array('B')
+        while count > 0:
+            length = min(count, self.max_command_sectors)
+            data.extend(self.drive.read_sectors(lba, length))
+            self.read_commands += 1
+            self.sectors_read += length
+            lba += length
+            count -= length
+        return data
+
+    def _fetch(self, lba, count):
+        data = self._read_drive(lba, count)
+        for i in range(count):
+            if (lba + i) in self.dirty:
+                #The cache has a newer copy
+                continue
+            self._insert(lba + i, data[i * SECTOR_SIZE:(i + 1) * SECTOR_SIZE])
+
+    def read_blocks(self, lba, count):
+        """
+        Read sectors
+
+        Args:
+            lba (Long): first sector
+            count (Integer): number of sectors
+
+        Returns (Array of bytes):
+            count * SECTOR_SIZE bytes
+
+        Raises:
+            SATAError: Sectors are not on the drive or the drive reported an
+                error
+            NysaCommError: Error in communication
+        """
+        self._check_range(lba, count)
+        sequential = (lba == self.next_lba)
+        end = lba + count
+
+        #Read the runs of sectors that are not in the cache
+        missing = [l for l in range(lba, end) if l not in self.cache]
+        self.misses += len(missing)
+        self.hits += count - len(missing)
+        runs = []
+        for l in missing:
+            if runs and runs[-1][1] == l:
+                runs[-1][1] = l + 1
+            else:
+                runs.append([l, l + 1])
+
+        if sequential and self.readahead > 0:
+            #Read the next window once less than half of the sectors read
+            #ahead last time are left, reading a few sectors ahead on every
+            #request would cost a command each time
+            ahead = end
+            while (ahead < end + self.readahead) and (ahead in self.cache):
+                ahead += 1
+            ahead_end = ahead + self.readahead
+            if self.sector_count is not None:
+                ahead_end = min(ahead_end, self.sector_count)
+            if ((ahead - end) < (self.readahead / 2)) and (ahead < ahead_end):
+                if runs and runs[-1][1] == ahead:
+                    runs[-1][1] = ahead_end
+                else:
+                    runs.append([ahead, ahead_end])
+
+        #Only the requested sectors have to stay in the cache while this read
+        #is put together, larger requests are read from the drive directly
+        if count > self.cache_sectors - self.readahead:
+            data = Array('B')
+            for l in range(lba, end, self.max_command_sectors):
+                length = min(self.max_command_sectors, end - l)
+                data.extend(self._read_drive(l, length))
+            for i in range(count):
+                if (lba + i) in self.dirty:
+                    data[i * SECTOR_SIZE:(i + 1) * SECTOR_SIZE] = self.cache[lba + i]
+            self.next_lba = end
+            return data
+
+        #Keep the cached sectors of this read from being pushed out
+        for l in range(lba, end):
+            if l in self.cache:
+                self._lookup(l)
+        for start, stop in runs:
+            self._fetch(start, stop - start)
+
+        data = Array('B')
+        for l in range(lba, end):
+            data.extend(self._lookup(l))
+        self.next_lba = end
+        return data
+
+    def write_blocks(self, lba, data):
+        """
+        Write sectors, the data is kept in the cache until flush is called
+        or the cache needs the room
+
+        Args:
+            lba (Long): first sector
+            data (Array of bytes): a multiple of SECTOR_SIZE bytes
+
+        Returns:
+            Nothing
+
+        Raises:
+            SATAError: Sectors are not on the drive, the data is not a
+                multiple of SECTOR_SIZE or the drive reported an error
+            NysaCommError: Error in communication
+        """
+        if len(data) % SECTOR_SIZE:
+            raise SATAError("Data must be a multiple of %d bytes: %d" % (SECTOR_SIZE, len(data)))
+        count = len(data) / SECTOR_SIZE
+        self._check_range(lba, count)
+        for i in range(count):
+            self._insert(lba + i, Array('B', data[i * SECTOR_SIZE:(i + 1) * SECTOR_SIZE]), dirty = True)
+
+    def flush(self):
+        """
+        Write the dirty sectors to the drive, adjacent sectors are written
+        with one command
+
+        Args:
+            Nothing
+
+        Returns:
+            Nothing
+
+        Raises:
+            SATAError: The drive reported an error
+            NysaCommError: Error in communication
+        """
+        lbas = sorted(self.dirty)
+        while len(lbas) > 0:
+            start = lbas[0]
+            length = 1
+            while (length < len(lbas)) and \
+                    (length < self.max_command_sectors) and \
+                    (lbas[length] == start + length):
+                length += 1
+            data = Array('B')
+            for l in lbas[0:length]:
+                data.extend(self.cache[l])
+            self.drive.write_sectors(start, data)
+            self.write_commands += 1
+            self.sectors_written += length
+            for l in lbas[0:length]:
+                self.dirty.discard(l)
+            lbas = lbas[length:]
+
+    def invalidate(self):
+        """
+        Write the dirty sectors and empty the cache, use this when something
+        else has written to the drive
+
+        Args:
+            Nothing
+
+        Returns:
+            Nothing
+
+        Raises:
+            SATAError: The drive reported an error
+            NysaCommError: Error in communication
+        """
+        self.flush()
+        self.cache.clear()
+        self.next_lba = None
@@ -9,6 +9,9 @@ wb_sd_host Driver
 import sys
 import os
 import time
+import threading
+import Queue
+from collections import deque
 from array import array as Array
 
 
@@ -186,6 +189,8 @@ class SDHostDriver(driver.Driver):
 
         Communication with a DutDriver wb_sd_host Core
     """
+    SHADOW_REGISTERS = {CONTROL:        0,
+                        SD_CONFIGURE:   0}
 
     @staticmethod
     def get_abi_class():
@@ -837,12 +842,14 @@ class SDHostDriver(driver.Driver):
         if len(self.read_data) >= self.byte_count:
             #print "DONE!"
             self.dma_reader.disable_asynchronous_read()
-            self.async_read_callback(self.read_data)
             self.clear_register_bit(CONTROL, CONTROL_ENABLE_INTERRUPT)
             self.clear_register_bit(CONTROL, CONTROL_DATA_BIT_ACTIVATE)
             self.clear_register_bit(CONTROL, CONTROL_DATA_BLOCK_MODE)
             self.clear_register_bit(CONTROL, CONTROL_ENABLE_DMA_RD)
             self.read_register(STATUS)
+            #Tell the user only after the core is idle, the callback may start
+            #the next transfer right away
+            self.async_read_callback(self.read_data)
 
     def read_async_data(self):
         return self.read_data
@@ -970,4 +977,353 @@ class SDHostDriver(driver.Driver):
         print "\tSD Host Error Code: 0x%02X %s" % (sts_error, white)
 
 
+class SDRequest(object):
+    """
+    Block read or write submitted to an SDHostRequestQueue
+
+    Use wait to block until the request is finished or pass a callback to the
+    queue, the callback is called with the request from the thread that
+    finished it
+    """
+
+    def __init__(self, write_flag, function_id, address, block_count, data = None, callback = None):
+        self.write_flag = write_flag
+        self.function_id = function_id
+        self.address = address
+        self.block_count = block_count
+        self.data = data
+        self.callback = callback
+        self.error = None
+        self.remaining = block_count
+        self.event = threading.Event()
+
+    def is_done(self):
+        return self.event.is_set()
 
+    def wait(self, timeout = None):
+        """
+        Wait for the request to finish
+
+        Args:
+            timeout (Float): seconds to wait, None waits forever
+
+        Returns (Boolean):
+            True: the request is finished
+            False: timeout
+        """
+        self.event.wait(timeout)
+        return self.event.is_set()
+
+    def get_data(self):
+        """
+        Returns the data of a finished read
+
+        Returns (Array of bytes):
+            data read from the card
+
+        Raises:
+            SDHostException: the request failed
+        """
+        if self.error is not None:
+            raise SDHostException(str(self.error))
+        return self.data
+
+    def _finish(self, error = None):
+        if error is not None and self.error is None:
+            self.error = error
+        self.event.set()
+        if self.callback is not None:
+            self.callback(self)
+
+class SDHostRequestQueue(object):
+    """
+    Queue of block reads and writes for an SD host
+
+    Requests are moved by a worker thread, requests that follow each other
+    on the queue and are contiguous on the card (same direction, same
+    function and the next request starts where the last one stops) are sent
+    as one CMD53 block transfer of up to 'max_blocks' blocks, requests that
+    are larger than 'max_blocks' are split
+
+    Reads go through the asynchronous DMA reader, while the data of a read
+    is arriving the worker gathers the next transfer so the command can be
+    sent as soon as the data is in
+
+    The block size of a function is read from the core when the function is
+    first used, use set_block_size on the queue to change it
+
+    Args:
+        sd_host (SDHostDriver): SD host, the card must be ready
+        max_blocks (Integer): largest number of blocks in a transfer
+        timeout (Float): seconds to wait for the data of a read
+
+    Raises:
+        SDHostException: max_blocks is not between 1 and 511
+    """
+
+    def __init__(self, sd_host, max_blocks = DATA_RW_COUNT_BITMODE, timeout = 1.0):
+        if (max_blocks < 1) or (max_blocks > DATA_RW_COUNT_BITMODE):
+            raise SDHostException("Only between 1 and %d blocks allowed: %d not valid" %
+                                  (DATA_RW_COUNT_BITMODE, max_blocks))
+        self.sd_host = sd_host
+        self.max_blocks = max_blocks
+        self.timeout = timeout
+        self.block_sizes = {}
+        self.requests = Queue.Queue()
+        self.segments = deque()
+        self.read_finished = threading.Event()
+        #Each read gets a token, data that arrives for an older read (one
+        #that timed out) is ignored
+        self.read_lock = threading.Lock()
+        self.read_token = 0
+        self.idle = threading.Condition()
+        self.outstanding = 0
+        self.transfers = 0
+        self.request_count = 0
+        self.worker = None
+
+    def start(self):
+        """
+        Start the worker thread and switch the SD host to asynchronous reads
+        """
+        if self.worker is not None:
+            return
+        self.sd_host.enable_async_dma_reader(True)
+        self.worker = threading.Thread(target = self._run)
+        self.worker.setDaemon(True)
+        self.worker.start()
+
+    def stop(self):
+        """
+        Finish the requests on the queue and stop the worker thread
+        """
+        if self.worker is None:
+            return
+        self.requests.put(None)
+        self.worker.join()
+        self.worker = None
+        self.sd_host.enable_async_dma_reader(False)
+
+    def set_block_size(self, function_id, block_size):
+        """
+        Set the block size of a function on the core, requests that are
+        already on the queue may use the old value
+
+        Args:
+            function_id (Integer): function 0 - 7
+            block_size (Integer): bytes in a block
+
+        Returns:
+            Nothing
+        """
+        self.sd_host.set_block_size(function_id, block_size)
+        self.block_sizes[function_id] = block_size
+
+    def get_block_size(self, function_id):
+        if function_id not in self.block_sizes:
+            self.block_sizes[function_id] = self.sd_host.get_block_size(function_id)
+        return self.block_sizes[function_id]
+
+    def _submit(self, request):
+        with self.idle:
+            self.outstanding += 1
+            self.request_count += 1
+        self.requests.put(request)
+        return request
+
+    def read_blocks(self, function_id, address, block_count, callback = None):
+        """
+        Queue a read of blocks from the card
+
+        Args:
+            function_id (Integer): function 0 - 7
+            address (Integer): address of the first byte
+            block_count (Integer): number of blocks
+            callback (Function): called with the request when it is finished
+
+        Returns:
+            (SDRequest): the request, the data is available with get_data when
+                it is finished
+
+        Raises:
+            SDHostException: block count is 0
+        """
+        if block_count < 1:
+            raise SDHostException("At least one block must be read")
+        return self._submit(SDRequest(False, function_id, address, block_count, callback = callback))
+
+    def write_blocks(self, function_id, address, data, callback = None):
+        """
+        Queue a write of blocks to the card
+
+        Args:
+            function_id (Integer): function 0 - 7
+            address (Integer): address of the first byte
+            data (Array of bytes): a multiple of the block size of the
+                function
+            callback (Function): called with the request when it is finished
+
+        Returns:
+            (SDRequest): the request
+
+        Raises:
+            SDHostException: data is not a multiple of the block size
+        """
+        block_size = self.get_block_size(function_id)
+        if (len(data) == 0) or (len(data) % block_size):
+            raise SDHostException("Data must be a multiple of the block size (%d): %d bytes" %
+                                  (block_size, len(data)))
+        return self._submit(SDRequest(True, function_id, address, len(data) / block_size,
+                                      data = Array('B', data), callback = callback))
+
+    def wait_for_idle(self, timeout = None):
+        """
+        Wait until every request that was queued is finished
+
+        Args:
+            timeout (Float): seconds to wait, None waits forever
+
+        Returns (Boolean):
+            True: the queue is empty
+            False: timeout
+        """
+        end = None
+        if timeout is not None:
+            end = time.time() + timeout
+        with self.idle:
+            while self.outstanding > 0:
+                if end is None:
+                    self.idle.wait()
+                else:
+                    remaining = end - time.time()
+                    if remaining <= 0:
+                        return False
+                    self.idle.wait(remaining)
+        return True
+
+    def get_statistics(self):
+        """
+        Returns (Dictionary):
+            requests: number of requests queued
+            transfers: number of CMD53 block transfers sent
+            outstanding: requests that are not finished
+        """
+        return {"requests": self.request_count,
+                "transfers": self.transfers,
+                "outstanding": self.outstanding}
+
+    def _split(self, request):
+        #A request is sent as one or more segments of at most max_blocks
+        if not request.write_flag:
+            block_size = self.get_block_size(request.function_id)
+            request.data = Array('B', [0] * (request.block_count * block_size))
+        for offset in range(0, request.block_count, self.max_blocks):
+            self.segments.append((request, offset, min(self.max_blocks, request.block_count - offset)))
+
+    def _gather(self, block):
+        #Move the new requests into the segment list, returns False when the
+        #queue is stopping
+        running = True
+        while True:
+            try:
+                request = self.requests.get(block and len(self.segments) == 0)
+            except Queue.Empty:
+                return running
+            if request is None:
+                running = False
+                block = False
+                continue
+            self._split(request)
+
+    def _next_transfer(self):
+        #Take the segments at the front of the list that can go in one transfer
+        request, offset, count = self.segments.popleft()
+        block_size = self.get_block_size(request.function_id)
+        address = request.address + (offset * block_size)
+        transfer = [(request, offset, count)]
+        total = count
+        while len(self.segments) > 0:
+            r, o, c = self.segments[0]
+            if (r.write_flag != request.write_flag) or \
+                    (r.function_id != request.function_id) or \
+                    (r.address + (o * block_size) != address + (total * block_size)) or \
+                    (total + c > self.max_blocks):
+                break
+            self.segments.popleft()
+            transfer.append((r, o, c))
+            total += c
+        return request.write_flag, request.function_id, address, block_size, total, transfer
+
+    def _complete(self, transfer, block_size, data = None, error = None):
+        position = 0
+        for request, offset, count in transfer:
+            size = count * block_size
+            if data is not None:
+                request.data[offset * block_size: offset * block_size + size] = data[position: position + size]
+            position += size
+            request.remaining -= count
+            if error is not None or request.remaining == 0:
+                if not request.is_done():
+                    request._finish(error)
+                    with self.idle:
+                        self.outstanding -= 1
+                        self.idle.notify_all()
+
+    def _run(self):
+        running = True
+        pending_read = None
+        while running or len(self.segments) > 0 or pending_read is not None:
+            running = self._gather(pending_read is None) and running
+            if pending_read is not None:
+                #Gathering the next transfer overlapped with the data of the
+                #last read, now wait for the data
+                transfer, block_size, token = pending_read
+                pending_read = None
+                if self.read_finished.wait(self.timeout):
+                    continue
+                with self.read_lock:
+                    timed_out = (self.read_token == token)
+                    if timed_out:
+                        self.read_token += 1
+                if timed_out:
+                    self._complete(transfer, block_size,
+                                   error = SDHostException("Timeout while reading from the card"))
+                else:
+                    #The data arrived while the timeout was handled
+                    self.read_finished.wait()
+                continue
+
+            if len(self.segments) == 0:
+                continue
+
+            write_flag, function_id, address, block_size, total, transfer = self._next_transfer()
+            self.transfers += 1
+            try:
+                if write_flag:
+                    data = Array('B')
+                    for request, offset, count in transfer:
+                        data.extend(request.data[offset * block_size: (offset + count) * block_size])
+                    self.sd_host.rw_block(True, function_id, address, data,
+                                          byte_count = 0, fifo_mode = False)
+                    self._complete(transfer, block_size)
+                else:
+                    with self.read_lock:
+                        self.read_token += 1
+                        token = self.read_token
+                        self.read_finished.clear()
+                    byte_count = total * block_size
+                    def finished(data, transfer = transfer, block_size = block_size,
+                                 byte_count = byte_count, token = token):
+                        with self.read_lock:
+                            if token != self.read_token:
+                                #Stale, this read already timed out
+                                return
+                            self.read_token += 1
+                        self._complete(transfer, block_size, data = data[0:byte_count])
+                        self.read_finished.set()
+                    self.sd_host.set_async_dma_reader_callback(finished)
+                    self.sd_host.rw_block(False, function_id, address, [],
+                                          byte_count = byte_count, fifo_mode = False)
+                    pending_read = (transfer, block_size, token)
+            except Exception as ex:
+                self._complete(transfer, block_size, error = ex)
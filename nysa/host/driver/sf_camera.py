@@ -35,16 +35,25 @@ __author__ = 'Cospan Design: info@cospandesign.com'
 import sys
 import os
 import time
+import threading
+import Queue
 import i2c
 
 from array import array as Array
 
+#NumPy is optional, it is used to decode images
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 from nysa.host.nysa import Nysa
 from nysa.host.nysa import NysaCommError
 
 import driver
 from driver import NysaDMAException
 from driver import DMAReadController
+from driver import DMA_RING_DROP_OLDEST
 
 SPARKFUN_640_480_CAMERA_MODULE = 1
 
@@ -88,6 +97,9 @@ I2C_CONFIG_UTILS=   0x02
 I2C_IMG_CONFIG  =   0x03
 I2C_IMG_COUNTS  =   0x1A
 
+PIXEL_FORMAT_RGB565   = 0
+PIXEL_FORMAT_YCBCR422 = 1
+
 
 class SFCameraError(Exception):
     pass
@@ -157,9 +169,73 @@ class SFCamera(driver.Driver):
     def stop_async_reader(self):
         self.dma_reader.disable_asynchronous_read()
 
-    def start_async_reader(self, callback):
+    def start_async_reader(self, callback, ring_depth = None, ring_policy = DMA_RING_DROP_OLDEST):
+        """
+        Start reading images in the background, 'callback' is called every
+        time an image is available, use read_async_image to get it
+
+        Args:
+            callback (function): called with no arguments when an image has
+                been read
+            ring_depth (int): number of images to keep for a slow consumer,
+                None keeps the current ring
+            ring_policy (int): what to do with a new image when the ring is
+                full: DMA_RING_DROP_OLDEST, DMA_RING_DROP_NEWEST or
+                DMA_RING_BLOCK
+
+        Returns:
+            Nothing
+
+        Raises:
+            NysaDMAException: the reader is already running
+        """
+        if ring_depth is not None:
+            self.dma_reader.set_ring(ring_depth, ring_policy)
         self.dma_reader.enable_asynchronous_read(callback)
 
+    def read_async_image(self, block = False, timeout = None):
+        """
+        Returns the oldest image read by the asynchronous reader
+
+        Args:
+            block (boolean): wait for an image if none are available
+            timeout (float): maximum time to wait in seconds
+
+        Returns:
+            (tuple): (sequence, Array of bytes), (None, None) if no image is
+                available, a gap in the sequence numbers means images were
+                dropped
+
+        Raises:
+            Nothing
+        """
+        return self.dma_reader.async_read_block(block, timeout)
+
+    def get_dropped_image_count(self):
+        return self.dma_reader.get_overrun_count()
+
+    def get_statistics(self):
+        """
+        Returns the performance of the image reader
+
+        Returns (Dictionary):
+            frames: number of images read
+            fps: images per second
+            overruns: images dropped because the ring was full
+            read_memory_time, read_memory_average: seconds spent reading
+                images from memory
+            latency_min, latency_average, latency_max, latencies: seconds
+                between the core finishing an image and the host having it
+            (see DMAReadStatistics.get for the rest)
+        """
+        d = self.dma_reader.get_statistics()
+        d["frames"] = d["blocks"]
+        d["fps"] = d["rate"]
+        return d
+
+    def reset_statistics(self):
+        self.dma_reader.reset_statistics()
+
     def get_control(self):
         """get_control
 
@@ -411,3 +487,247 @@ class SFCamera(driver.Driver):
         """
         return self.dma_reader.read(anticipate = True)
 
+
+_rgb565_table = None
+
+def _get_rgb565_table():
+    #One RGB888 entry for each of the 65536 RGB565 values, decoding an image
+    #is then a single lookup
+    global _rgb565_table
+    if _rgb565_table is None:
+        values = np.arange(0x10000, dtype = np.uint32)
+        table = np.empty((0x10000, 3), dtype = np.uint8)
+        r = (values >> 11) & 0x1F
+        g = (values >> 5) & 0x3F
+        b = values & 0x1F
+        table[:, 0] = (r << 3) | (r >> 2)
+        table[:, 1] = (g << 2) | (g >> 4)
+        table[:, 2] = (b << 3) | (b >> 2)
+        _rgb565_table = table
+    return _rgb565_table
+
+def decode_rgb565(raw, width, height, out = None):
+    """
+    Decode an image of big endian RGB565 pixels
+
+    Args:
+        raw (Array of bytes): image read from the camera
+        width (Integer): pixels in a row
+        height (Integer): number of rows
+        out (NumPy array): height x width x 3 uint8 array to decode into, if
+            None a new array is allocated
+
+    Returns:
+        (NumPy array): height x width x 3 uint8 RGB image
+
+    Raises:
+        SFCameraError: NumPy is not installed
+    """
+    if np is None:
+        raise SFCameraError("NumPy is required to decode images")
+    if out is None:
+        out = np.empty((height, width, 3), dtype = np.uint8)
+    pixels = np.frombuffer(raw, dtype = ">u2", count = width * height)
+    np.take(_get_rgb565_table(), pixels, axis = 0, out = out.reshape(width * height, 3))
+    return out
+
+def decode_ycbcr422(raw, width, height, out = None):
+    """
+    Decode an image of YCbCr 4:2:2 pixels (Cb Y0 Cr Y1 for every two pixels)
+    using the ITU-R BT.601 conversion
+
+    Args:
+        raw (Array of bytes): image read from the camera
+        width (Integer): pixels in a row, must be even
+        height (Integer): number of rows
+        out (NumPy array): height x width x 3 uint8 array to decode into, if
+            None a new array is allocated
+
+    Returns:
+        (NumPy array): height x width x 3 uint8 RGB image
+
+    Raises:
+        SFCameraError: NumPy is not installed
+    """
+    if np is None:
+        raise SFCameraError("NumPy is required to decode images")
+    if out is None:
+        out = np.empty((height, width, 3), dtype = np.uint8)
+    data = np.frombuffer(raw, dtype = np.uint8, count = width * height * 2)
+    data = data.reshape(height, width / 2, 4).astype(np.float32)
+    cb = data[:, :, 0] - 128.0
+    cr = data[:, :, 2] - 128.0
+    y = np.empty((height, width), dtype = np.float32)
+    y[:, 0::2] = data[:, :, 1]
+    y[:, 1::2] = data[:, :, 3]
+    cb = np.repeat(cb, 2, axis = 1)
+    cr = np.repeat(cr, 2, axis = 1)
+    out[:, :, 0] = np.clip(y + (1.402 * cr), 0, 255)
+    out[:, :, 1] = np.clip(y - (0.344136 * cb) - (0.714136 * cr), 0, 255)
+    out[:, :, 2] = np.clip(y + (1.772 * cb), 0, 255)
+    return out
+
+class SFCameraFrame(object):
+    """
+    A decoded image from SFCameraPipeline, the image buffer belongs to the
+    pipeline and is reused once the frame is released
+
+    data: height x width x 3 uint8 RGB image
+    sequence: number of the image, a gap means images were dropped
+    timestamp: time the image was decoded
+    """
+    def __init__(self, pipeline, width, height):
+        self.pipeline = pipeline
+        self.data = np.zeros((height, width, 3), dtype = np.uint8)
+        self.sequence = 0
+        self.timestamp = 0
+
+    def release(self):
+        """
+        Give the image buffer back to the pipeline
+        """
+        self.pipeline.release_frame(self)
+
+class SFCameraPipeline(object):
+    """
+    Reads images with the asynchronous reader of the camera, decodes them
+    into a fixed set of preallocated image buffers on a worker thread and
+    hands them to the consumer through a bounded queue
+
+    The consumer must release every frame it gets, when all the buffers are
+    held by the consumer new images are dropped
+
+    Example:
+
+        pipeline = SFCameraPipeline(camera)
+        pipeline.start()
+        frame = pipeline.get_frame(timeout = 1.0)
+        show(frame.data)
+        frame.release()
+        pipeline.stop()
+
+    Args:
+        camera (SFCamera): camera to read from
+        depth (Integer): number of image buffers
+        pixel_format (Integer): PIXEL_FORMAT_RGB565 or PIXEL_FORMAT_YCBCR422
+        ring_depth (Integer): number of raw images the reader keeps for the
+            decoder
+        ring_policy (Integer): what the reader does with a new raw image when
+            its ring is full: DMA_RING_DROP_OLDEST, DMA_RING_DROP_NEWEST or
+            DMA_RING_BLOCK
+    """
+
+    def __init__(self,
+                 camera,
+                 depth = 3,
+                 pixel_format = PIXEL_FORMAT_RGB565,
+                 ring_depth = 2,
+                 ring_policy = DMA_RING_DROP_OLDEST):
+        if np is None:
+            raise SFCameraError("NumPy is required for the camera pipeline")
+        if pixel_format == PIXEL_FORMAT_RGB565:
+            self.decode = decode_rgb565
+        elif pixel_format == PIXEL_FORMAT_YCBCR422:
+            self.decode = decode_ycbcr422
+        else:
+            raise SFCameraError("Unknown pixel format: %d" % pixel_format)
+
+        self.camera = camera
+        self.ring_depth = ring_depth
+        self.ring_policy = ring_policy
+        self.width = camera.get_width()
+        self.height = camera.get_height()
+        self.pool = Queue.Queue(depth)
+        for i in range(depth):
+            self.pool.put(SFCameraFrame(self, self.width, self.height))
+        self.frames = Queue.Queue(depth)
+        self.dropped = 0
+        self.running = False
+        self.worker = None
+        self.error = None
+
+    def start(self):
+        """
+        Start the asynchronous reader of the camera and the decoder
+
+        Raises:
+            NysaDMAException: the asynchronous reader is already running
+        """
+        self.running = True
+        self.camera.start_async_reader(self._image_ready,
+                                       ring_depth = self.ring_depth,
+                                       ring_policy = self.ring_policy)
+        self.worker = threading.Thread(target = self._run)
+        self.worker.setDaemon(True)
+        self.worker.start()
+
+    def stop(self):
+        self.running = False
+        if self.worker is not None:
+            self.worker.join()
+            self.worker = None
+        self.camera.stop_async_reader()
+
+    def _image_ready(self):
+        #The worker waits on the ring of the reader
+        pass
+
+    def _run(self):
+        try:
+            while self.running:
+                sequence, raw = self.camera.read_async_image(block = True, timeout = 0.1)
+                if raw is None:
+                    continue
+                try:
+                    frame = self.pool.get(block = False)
+                except Queue.Empty:
+                    self.dropped += 1
+                    continue
+                self.decode(raw, self.width, self.height, out = frame.data)
+                frame.sequence = sequence
+                frame.timestamp = time.time()
+                self.frames.put(frame)
+        except Exception as ex:
+            self.error = ex
+            self.running = False
+
+    def get_frame(self, block = True, timeout = None):
+        """
+        Returns the oldest decoded frame
+
+        Args:
+            block (boolean): wait for a frame if none are available
+            timeout (float): maximum time to wait in seconds
+
+        Returns:
+            (SFCameraFrame): None if no frame is available
+
+        Raises:
+            Errors of the worker thread
+        """
+        if self.error is not None:
+            raise self.error
+        try:
+            return self.frames.get(block, timeout)
+        except Queue.Empty:
+            return None
+
+    def release_frame(self, frame):
+        self.pool.put(frame)
+
+    def get_statistics(self):
+        """
+        Returns the statistics of the camera (see SFCamera.get_statistics)
+        with 'dropped', the images dropped because every image buffer was
+        held by the consumer
+        """
+        d = self.camera.get_statistics()
+        d["dropped"] = self.dropped
+        return d
+
+    def get_dropped_frame_count(self):
+        """
+        Returns the number of images dropped because the reader ring was full
+        or because every image buffer was held by the consumer
+        """
+        return self.dropped + self.camera.get_dropped_image_count()
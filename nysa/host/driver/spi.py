@@ -79,6 +79,10 @@ class SPI(driver.Driver):
     SPI
         Communication with SPI Core
     """
+    #The go bit clears itself when the transaction is finished
+    SHADOW_REGISTERS = {CONTROL:        (1 << CONTROL_GO_BUSY),
+                        SLAVE_SELECT:   0}
+
     @staticmethod
     def get_abi_class():
         return 0
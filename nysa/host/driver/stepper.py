@@ -102,6 +102,9 @@ class Stepper(driver.Driver):
     """
     Stepper Motor Controller
     """
+    SHADOW_REGISTERS = {CONFIGURATION:  0,
+                        CONTROL:        0}
+
     @staticmethod
     def get_abi_class():
         return 0
@@ -35,7 +35,9 @@ import sys
 import os
 import string
 import json
+import threading
 from array import array as Array
+from collections import deque
 
 from nysa_sdb_manager import NysaSDBManager
 
@@ -56,6 +58,362 @@ class NysaError(Exception):
     """
     pass
 
+#Batch transaction types
+BATCH_READ          = 0
+BATCH_READ_REGISTER = 1
+BATCH_WRITE         = 2
+BATCH_MODIFY        = 3
+
+class NysaBatch(object):
+    """NysaBatch
+
+    A list of reads, writes and bit operations that are queued up on the host
+    and then submitted to the board all at once, either when 'submit' is
+    called or when the 'with' block the batch was created in is exited
+
+    Every queue function returns an index into the list of results, after the
+    batch is submitted the result of a read can be found at that index:
+
+        with n.batch() as b:
+            b.write_register(0x01, 0x1234)
+            b.set_register_bit(0x00, 2)
+            status = b.read_register(0x01)
+
+        print "Status: 0x%08X" % b.results[status]
+
+    Writes and bit operations have a result of None
+
+    A bit operation uses the last value read from or written to the register
+    earlier in the same batch, only when the register has not been touched
+    is it read from the board
+    """
+
+    def __init__(self, n, base_address = 0):
+        self.n = n
+        self.base_address = base_address
+        self.transactions = []
+        self.results = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.submit()
+        return False
+
+    def __len__(self):
+        return len(self.transactions)
+
+    def _add(self, transaction):
+        self.transactions.append(transaction)
+        return len(self.transactions) - 1
+
+    def read(self, address, length = 1, disable_auto_inc = False):
+        """
+        Queue a read of 'length' 32-bit words, the result is an array of bytes
+        """
+        return self._add((BATCH_READ, self.base_address + address, length, disable_auto_inc))
+
+    def read_register(self, address):
+        """
+        Queue a register read, the result is a 32-bit unsigned integer
+        """
+        return self._add((BATCH_READ_REGISTER, self.base_address + address, 1, False))
+
+    def write(self, address, data, disable_auto_inc = False):
+        """
+        Queue a write of an array of bytes
+        """
+        if len(data) == 0:
+            raise NysaCommError("Data length cannot be 0")
+        return self._add((BATCH_WRITE, self.base_address + address, Array('B', data), disable_auto_inc))
+
+    def write_register(self, address, value):
+        """
+        Queue a write of a single 32-bit register
+        """
+        return self._add((BATCH_WRITE, self.base_address + address, _dword_to_array(value), False))
+
+    def enable_register_bit(self, address, bit, enable):
+        """
+        Queue a set or clear of a single bit in a register
+        """
+        if enable:
+            return self.set_register_bit(address, bit)
+        return self.clear_register_bit(address, bit)
+
+    def set_register_bit(self, address, bit):
+        """
+        Queue a set of a single bit in a register
+        """
+        bit_mask = 1 << bit
+        return self._add((BATCH_MODIFY, self.base_address + address, bit_mask, bit_mask))
+
+    def clear_register_bit(self, address, bit):
+        """
+        Queue a clear of a single bit in a register
+        """
+        return self._add((BATCH_MODIFY, self.base_address + address, 1 << bit, 0))
+
+    def write_register_bit_range(self, address, high_bit, low_bit, value):
+        """
+        Queue a write to a range of bits within a register
+        """
+        bitmask = (((1 << (high_bit + 1))) - (1 << low_bit))
+        return self._add((BATCH_MODIFY, self.base_address + address, bitmask, (value << low_bit) & bitmask))
+
+    def submit(self):
+        """
+        Send all the queued transactions to the board
+
+        Args:
+            Nothing
+
+        Returns:
+            (List): one result per queued transaction, reads return an array
+                of bytes, register reads an integer and everything else None
+
+        Raises:
+            NysaCommError: Error in communication
+        """
+        self.results = self.n.process_batch(self.transactions)
+        self.transactions = []
+        return self.results
+
+class NysaInterruptDispatcher(object):
+    """NysaInterruptDispatcher
+
+    A thread that is the only reader of the interrupts of the board, every
+    interrupt is timestamped and handed to the device it belongs to so any
+    number of drivers can wait for their own interrupts at the same time
+
+    Each device has a queue of the times of its interrupts that have not been
+    waited for and an event that is set while the queue is not empty, an
+    interrupt that arrives before a driver starts waiting is not lost:
+
+        n.start_interrupt_dispatcher()
+        ...
+        timestamp = n.interrupt_dispatcher.wait(index, timeout = 1)
+
+    Interrupts from the same device that arrive faster than they are waited
+    for are coalesced once 'max_pending' are queued
+
+    Args:
+        n (Nysa): board to read the interrupts from
+        poll_time (float): longest time the thread waits for the board before
+            it checks whether it was stopped
+        max_pending (int): most interrupts queued for one device
+    """
+
+    def __init__(self, n, poll_time = 0.1, max_pending = 64):
+        self.n = n
+        self.poll_time = poll_time
+        self.max_pending = max_pending
+        self.condition = threading.Condition()
+        self.pending = {}
+        self.events = {}
+        self.last_time = {}
+        self.counts = {}
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        """
+        Start the thread that reads the interrupts
+
+        Args:
+            Nothing
+
+        Returns:
+            Nothing
+        """
+        if self.is_running():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target = self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        """
+        Stop the thread, waiting drivers fall back to polling the board
+
+        Args:
+            Nothing
+
+        Returns:
+            Nothing
+        """
+        self.stop_event.set()
+        if self.thread is not None:
+            if self.thread is not threading.current_thread():
+                self.thread.join()
+            self.thread = None
+        with self.condition:
+            self.condition.notify_all()
+
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            try:
+                self.poll(self.poll_time)
+            except NysaCommError:
+                self.stop_event.wait(self.poll_time)
+
+    def poll(self, wait_time = 0):
+        """
+        Read the interrupts of the board once and hand them to the devices,
+        the thread does this in a loop. Something that already owns the link
+        to the board (AsyncNysa) can call this instead of starting the thread
+
+        Args:
+            wait_time (float): seconds to wait for the board
+
+        Returns:
+            (boolean): True if there were interrupts
+
+        Raises:
+            NysaCommError: Error in communication
+        """
+        if not self.n.wait_for_interrupts(wait_time):
+            return False
+        timestamp = time.time()
+        self.dispatch(self.n.acknowledge_interrupts(), timestamp)
+        return True
+
+    def _get_event(self, index):
+        if index not in self.events:
+            self.events[index] = threading.Event()
+            self.pending[index] = deque()
+            self.counts[index] = 0
+        return self.events[index]
+
+    def dispatch(self, interrupts, timestamp = None):
+        """
+        Hand the interrupts to the devices they belong to
+
+        Args:
+            interrupts (int): bitmask of the devices with an interrupt
+            timestamp (float): time the interrupts were detected, now if None
+
+        Returns:
+            Nothing
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        with self.condition:
+            index = 0
+            while interrupts > 0:
+                if interrupts & 0x01:
+                    event = self._get_event(index)
+                    if len(self.pending[index]) < self.max_pending:
+                        self.pending[index].append(timestamp)
+                    self.last_time[index] = timestamp
+                    self.counts[index] += 1
+                    event.set()
+                interrupts >>= 1
+                index += 1
+            self.condition.notify_all()
+
+    def get_event(self, index):
+        """
+        Returns the event that is set while the device has interrupts that
+        were not waited for
+
+        Args:
+            index (int): index of the device in the peripheral bus
+
+        Returns:
+            (threading.Event)
+        """
+        with self.condition:
+            return self._get_event(index)
+
+    def wait(self, index, timeout = 1):
+        """
+        Wait for an interrupt from one device
+
+        Args:
+            index (int): index of the device in the peripheral bus
+            timeout (float): seconds to wait, 0 to only check
+
+        Returns:
+            (float): time of the oldest interrupt that was not waited for, None
+                if there was no interrupt before the timeout
+        """
+        end = time.time() + timeout
+        with self.condition:
+            event = self._get_event(index)
+            while len(self.pending[index]) == 0:
+                remaining = end - time.time()
+                if remaining <= 0 or self.stop_event.is_set():
+                    return None
+                self.condition.wait(remaining)
+            timestamp = self.pending[index].popleft()
+            if len(self.pending[index]) == 0:
+                event.clear()
+            return timestamp
+
+    def clear(self, index):
+        """
+        Drop the interrupts of a device that were not waited for
+
+        Args:
+            index (int): index of the device in the peripheral bus
+
+        Returns:
+            Nothing
+        """
+        with self.condition:
+            self._get_event(index).clear()
+            self.pending[index].clear()
+
+    def get_last_interrupt_time(self, index):
+        """
+        Returns the time of the last interrupt of a device, None if it never
+        had one
+        """
+        with self.condition:
+            return self.last_time.get(index, None)
+
+    def get_interrupt_count(self, index):
+        """
+        Returns the number of interrupts the device has had
+        """
+        with self.condition:
+            return self.counts.get(index, 0)
+
+def _dword_to_array(value):
+    return Array('B', [(value >> 24) & 0xFF,
+                       (value >> 16) & 0xFF,
+                       (value >> 8) & 0xFF,
+                       (value) & 0xFF])
+
+def _array_to_dword(data, offset = 0):
+    return data[offset] << 24 | \
+           data[offset + 1] << 16 | \
+           data[offset + 2] << 8  | \
+           data[offset + 3]
+
+def _batch_extends(prev, transaction):
+    """
+    Returns True if 'transaction' continues where 'prev' left off so both can
+    be sent to the board with a single auto incrementing read or write
+    """
+    if prev[3] or transaction[3]:
+        return False
+    if prev[0] == BATCH_WRITE:
+        if transaction[0] != BATCH_WRITE:
+            return False
+        if (len(prev[2]) % 4) != 0:
+            return False
+        return transaction[1] == prev[1] + (len(prev[2]) / 4)
+    if transaction[0] == BATCH_WRITE:
+        return False
+    return transaction[1] == prev[1] + prev[2]
 
 
 class Nysa(object):
@@ -92,11 +450,20 @@ class Nysa(object):
     interrupts = 0
     interrupt_address = 0
 
+    #DMA core used by copy and gather, None until selected with set_copy_dma
+    copy_dma = None
+    copy_dma_channel = 0
+    copy_dma_sink = 0
+
+    #Reads the interrupts for all drivers once it is started
+    interrupt_dispatcher = None
+
     def __init__(self, status = None):
         self.name = "Nysa"
         self.s = status
         self.nsm = NysaSDBManager(self, self.s)
         self.mem_addr = None
+        self.sdb_cache_id = None
         if status: status.Debug("nysa started")
 
     def __del__(self):
@@ -334,6 +701,66 @@ class Nysa(object):
         """
         raise AssertionError("%s not implemented" % sys._getframe().f_code.co_name)
 
+    def acknowledge_interrupts(self):
+        """acknowledge_interrupts
+
+        Returns the interrupts that were detected and clears them
+
+        Args:
+          Nothing
+
+        Returns:
+          (int): bitmask of the devices with an interrupt
+
+        Raises:
+          Nothing
+        """
+        interrupts = self.interrupts
+        self.interrupts &= ~interrupts
+        return interrupts
+
+    def start_interrupt_dispatcher(self, poll_time = 0.1):
+        """start_interrupt_dispatcher
+
+        Start a thread that reads the interrupts of the board and hands them
+        to the devices they belong to, once it is running the
+        wait_for_interrupts of the drivers wait on their own device instead
+        of the board
+
+        Args:
+          poll_time (float): longest time the thread waits for the board
+                             before it checks whether it was stopped
+
+        Returns:
+          (NysaInterruptDispatcher): the dispatcher
+
+        Raises:
+          Nothing
+        """
+        if self.interrupt_dispatcher is None:
+            self.interrupt_dispatcher = NysaInterruptDispatcher(self, poll_time)
+        self.interrupt_dispatcher.poll_time = poll_time
+        self.interrupt_dispatcher.start()
+        return self.interrupt_dispatcher
+
+    def stop_interrupt_dispatcher(self):
+        """stop_interrupt_dispatcher
+
+        Stop the interrupt dispatcher thread, drivers go back to waiting on
+        the board
+
+        Args:
+          Nothing
+
+        Returns:
+          Nothing
+
+        Raises:
+          Nothing
+        """
+        if self.interrupt_dispatcher is not None:
+            self.interrupt_dispatcher.stop()
+
     #Helpful Control Functions
     def read_register(self, address):
         """read_register
@@ -505,6 +932,113 @@ class Nysa(object):
         return self.read(address = address,
                          length = size)
 
+    def set_copy_dma(self, dma = None, channel = 0, sink = 0):
+        """set_copy_dma
+
+        Let copy and gather move memory with a DMA core, by default (or with
+        None) the data is copied through the host
+
+        The copy program is placed in the free instruction slots of the DMA
+        driver, pass the DMA driver the rest of the application uses so
+        programs it has loaded are not overwritten. The channel and the sink
+        are reconfigured on every copy and should not be used for anything else
+
+        Args:
+          dma (DMA or String): DMA driver that has been set up, or the URN of a
+                               DMA core only used for copies, None to copy
+                               through the host
+          channel (int): channel connected to the memory
+          sink (int): sink connected to the memory
+
+        Returns:
+          Nothing
+
+        Raises:
+          NysaCommError: Error in communication
+        """
+        if isinstance(dma, basestring):
+            from driver.dma import DMA
+            urn = dma
+            dma = DMA(self, urn)
+            dma.setup()
+        self.copy_dma = dma
+        self.copy_dma_channel = channel
+        self.copy_dma_sink = sink
+
+    def copy(self, src, dst, length):
+        """copy
+
+        Copy a block of memory to another location in memory, when a DMA
+        core is selected with set_copy_dma the data stays on the board,
+        otherwise it is read into the host and written back
+
+        Args:
+          src (int): memory address to copy from
+          dst (int): memory address to copy to
+          length (int): total number of 32-bit words to copy
+
+        Returns:
+          Nothing
+
+        Raises:
+          NysaCommError: Error in communication
+          DMAError: The DMA core did not finish the copy
+        """
+        self.gather([(src, length)], dst)
+
+    def gather(self, sources, dst):
+        """gather
+
+        Copy a list of blocks of memory one after the other into one block,
+        when a DMA core is selected with set_copy_dma every block is an
+        instruction of one DMA program, otherwise the blocks are read into the
+        host and written back
+
+        Args:
+          sources (list of tuples): (memory address, number of 32-bit words)
+                                    of each block
+          dst (int): memory address of the first word of the result
+
+        Returns:
+          Nothing
+
+        Raises:
+          NysaCommError: Error in communication
+          DMAError: The DMA core did not finish the copy
+        """
+        transfers = []
+        address = dst
+        for src, length in sources:
+            if length <= 0:
+                continue
+            if len(transfers) > 0 and \
+                    (transfers[-1][0] + transfers[-1][2]) == src:
+                #Blocks that follow each other are moved with one instruction
+                transfers[-1] = (transfers[-1][0], transfers[-1][1], transfers[-1][2] + length)
+            else:
+                transfers.append((src, address, length))
+            address += length
+
+        #The DMA core reads and writes at the same time, a destination that
+        #overlaps a source would overwrite data before it is read
+        overlap = False
+        for src, d, length in transfers:
+            if src < address and dst < src + length:
+                overlap = True
+
+        dma = self.copy_dma
+        if dma is not None and not overlap:
+            dma.copy_memory(self.copy_dma_channel, self.copy_dma_sink, transfers, self.timeout)
+            return
+
+        #Read every block before writing so overlapping blocks are copied
+        #as they were before the copy
+        data = Array('B')
+        for src, d, length in transfers:
+            data.extend(self.read_memory(src, length))
+        if len(data) > 0:
+            self.write_memory(dst, data)
+
     def ioctl(self, name, arg = None):
         """
         Platform specific functions to execute on a Nysa device implementation.
@@ -602,6 +1136,108 @@ class Nysa(object):
         value = value >> low_bit
         return value
 
+    #Batch Functions
+    def batch(self):
+        """batch
+
+        Create a batch of transactions that will be sent to the board together
+
+        Example:
+            with n.batch() as b:
+                b.write_register(0x04, 0x01)
+                b.write_register(0x05, 0x02)
+                index = b.read_register(0x01)
+            value = b.results[index]
+
+        Args:
+            Nothing
+
+        Returns:
+            (NysaBatch): an empty batch attached to this board
+
+        Raises:
+            Nothing
+        """
+        return NysaBatch(self)
+
+    def process_batch(self, transactions):
+        """process_batch
+
+        Execute a list of transactions queued in a NysaBatch
+
+        Consecutive transactions that access consecutive addresses are merged
+        into a single auto incrementing read or write and bit operations on
+        registers already read or written within the batch do not go back to
+        the board for the value.
+
+        A platform that can pipeline multiple transactions in one transfer
+        should override this function and send everything at once
+
+        Args:
+            transactions (List of tuples): transactions queued in a NysaBatch
+
+        Returns:
+            (List): one result for each transaction, an array of bytes for
+                reads, an integer for register reads and None for writes and
+                bit operations
+
+        Raises:
+            NysaCommError: Error in communication
+        """
+        results = [None] * len(transactions)
+        registers = {}
+        run = []
+
+        for i in range(len(transactions)):
+            transaction = transactions[i]
+            if transaction[0] == BATCH_MODIFY:
+                address, mask, value = transaction[1:]
+                if address not in registers:
+                    self._process_batch_run(run, results, registers)
+                    run = []
+                    registers[address] = self.read_register(address)
+                register = (registers[address] & ~mask) | value
+                transaction = (BATCH_WRITE, address, _dword_to_array(register), False)
+
+            if transaction[0] == BATCH_WRITE and len(transaction[2]) == 4:
+                registers[transaction[1]] = _array_to_dword(transaction[2])
+
+            if len(run) > 0 and not _batch_extends(run[-1][1], transaction):
+                self._process_batch_run(run, results, registers)
+                run = []
+            run.append((i, transaction))
+
+        self._process_batch_run(run, results, registers)
+        return results
+
+    def _process_batch_run(self, run, results, registers):
+        if len(run) == 0:
+            return
+
+        address = run[0][1][1]
+        disable_auto_inc = run[0][1][3]
+        if run[0][1][0] == BATCH_WRITE:
+            data = Array('B')
+            for index, transaction in run:
+                data.extend(transaction[2])
+            self.write(address, data, disable_auto_inc)
+            return
+
+        length = 0
+        for index, transaction in run:
+            length += transaction[2]
+        data = self.read(address, length, disable_auto_inc)
+
+        pos = 0
+        for index, transaction in run:
+            size = transaction[2] * 4
+            if transaction[0] == BATCH_READ_REGISTER:
+                results[index] = _array_to_dword(data, pos)
+                registers[transaction[1]] = results[index]
+            else:
+                results[index] = data[pos: pos + size]
+            pos += size
+
     #SDB Related
     def get_sdb_base_address(self):
         """
@@ -620,13 +1256,16 @@ class Nysa(object):
         """
         raise AssertionError("%s not implemented" % sys._getframe().f_code.co_name)
 
-    def read_sdb(self):
+    def read_sdb(self, use_cache = True):
         """read_sdb
 
         Read the contents of the SDB
 
+        If the board has an SDB cache ID (see set_sdb_cache_id) and the image
+        has not changed the SDB is loaded from the disk cache
+
         Args:
-            Nothing
+            use_cache (boolean): allow the SDB to be loaded from the cache
 
         Returns:
             Array of bytes of the SDB
@@ -634,7 +1273,52 @@ class Nysa(object):
         Raises:
             NysaCommError: When a failure of communication is detected
         """
-        return self.nsm.read_sdb(self)
+        cache_id = None
+        if use_cache:
+            cache_id = self.sdb_cache_id
+        return self.nsm.read_sdb(self, cache_id = cache_id)
+
+    def get_sdb_read_statistics(self):
+        """get_sdb_read_statistics
+
+        Returns statistics about the last time the SDB was read, this can be
+        used to see how long it takes to connect to an image
+
+        Args:
+            Nothing
+
+        Returns:
+            (Dictionary):
+                "time": seconds spent reading and parsing the SDB
+                "reads": number of read transactions sent to the board
+                "records": number of SDB records
+                "cached": True if the SDB was loaded from the cache
+
+        Raises:
+            Nothing
+        """
+        return self.nsm.get_read_statistics()
+
+    def set_sdb_cache_id(self, cache_id):
+        """set_sdb_cache_id
+
+        Set the name used to cache the SDB of this board on disk, this should
+        be unique to the board (platform and serial number), None disables
+        the cache
+
+        Args:
+            cache_id (String): unique name of the board
+
+        Returns:
+            Nothing
+
+        Raises:
+            Nothing
+        """
+        self.sdb_cache_id = cache_id
+
+    def get_sdb_cache_id(self):
+        return self.sdb_cache_id
 
     def pretty_print_sdb(self):
         """pretty_print_sdb
@@ -914,6 +1598,23 @@ class Nysa(object):
         """
         return self.nsm.find_urn_from_ids(vendor_id, product_id)
 
+    def find_urn_from_address(self, address, bus_urn = "/top/peripheral"):
+        """
+        Returns the URN of the device that decodes an address
+
+        Args:
+            address (Integer): an address within a device
+            bus_urn (String): the bus the address is on, addresses of the
+                devices are relative to the bus
+
+        Returns (String):
+            URN of the device or None if no device uses the address
+
+        Raises:
+            None
+        """
+        return self.nsm.find_urn_from_address(address, bus_urn)
+
     def get_peripheral_device_index(self, urn):
         """
         Return the index of the device in the peripheral
@@ -49,6 +49,9 @@ class Platform(object):
 
     def add_device_dict(self, unique_id, device):
         self.dev_dict[unique_id] = device
+        #Allow the SDB of this board to be cached between connections
+        if device is not None and hasattr(device, "set_sdb_cache_id"):
+            device.set_sdb_cache_id("%s_%s" % (self.get_type(), unique_id))
 
     def get_type(self):
         raise AssertionError("%s not implemented" % sys._getframe().f_code.co_name)
@@ -23,6 +23,8 @@ __author__ = 'dave.mccoy@cospandesign.com (Dave McCoy)'
 
 import sys
 import os
+import time
+import bisect
 
 sys.path.append(os.path.join(os.path.dirname(__file__),
                              os.pardir))
@@ -42,6 +44,80 @@ from cbuilder import sdb_component as sdbc
 from cbuilder import som_rom_parser as srp
 from cbuilder import device_manager
 from host.driver.driver import Driver
+from host.sdb_cache import SDBCache
+
+class SDBIndex(object):
+    """
+    Lookup tables of a SOM, built once after the SDB is read so finding a
+    device does not need to walk the SOM
+
+    components: (URN, SOM component) of everything in the SOM in the order
+        the SOM is walked (a bus before its children)
+    urns: URN -> SOM component
+    first_ids: (vendor id, product id) -> URN of the first component
+    first_abi: (abi class, abi major, abi minor) -> URN of the first component
+    addresses: start address -> URN of the first component
+    ids: (vendor id, product id) -> list of device URNs
+    abi: (abi class, abi major, abi minor) -> list of device URNs
+    intervals: bus URN -> (start address, end address, URN) of the devices
+        in the bus sorted by start address, device addresses are relative to
+        their bus
+    starts: bus URN -> start addresses of the devices in the bus
+    """
+    def __init__(self, nsm, som):
+        self.som = som
+        self.components = []
+        self.urns = {}
+        self.first_ids = {}
+        self.first_abi = {}
+        self.addresses = {}
+        self.ids = {}
+        self.abi = {}
+        self.intervals = {}
+        self.starts = {}
+        self.component_urns = []
+        self.device_urns = []
+        self._add_bus(nsm, som.get_root())
+        for bus_urn in self.intervals:
+            self.intervals[bus_urn].sort()
+            self.starts[bus_urn] = [i[0] for i in self.intervals[bus_urn]]
+
+    def _add(self, urn, component, bus_urn = None):
+        c = component.get_component()
+        ids = (c.get_vendor_id_as_int(), c.get_device_id_as_int())
+        abi = (c.get_abi_class_as_int(),
+               c.get_abi_version_major_as_int(),
+               c.get_abi_version_minor_as_int())
+        self.components.append((urn, component))
+        self.urns.setdefault(urn, component)
+        self.first_ids.setdefault(ids, urn)
+        self.first_abi.setdefault(abi, urn)
+        self.addresses.setdefault(c.get_start_address_as_int(), urn)
+        if isinstance(component, SOMBus):
+            self.component_urns.append(urn)
+            return
+
+        if c.is_synthesis_record() or c.is_integration_record() or c.is_url_record():
+            return
+        if urn in self.ids.get(ids, []):
+            #Same name twice in a bus
+            return
+        self.component_urns.append(urn)
+        self.device_urns.append(urn)
+        self.ids.setdefault(ids, []).append(urn)
+        self.abi.setdefault(abi, []).append(urn)
+        self.intervals.setdefault(bus_urn, []).append((c.get_start_address_as_int(),
+                                                       c.get_end_address_as_int(),
+                                                       urn))
+
+    def _add_bus(self, nsm, bus):
+        bus_urn = nsm._get_urn_from_component(bus)
+        self._add(bus_urn, bus)
+        for child in bus:
+            if isinstance(child, SOMBus):
+                self._add_bus(nsm, child)
+            else:
+                self._add(nsm._get_urn_from_component(child), child, bus_urn)
 
 class NysaSDBManager(object):
 
@@ -49,29 +125,54 @@ class NysaSDBManager(object):
         self.n = n
         self.s = status
         self.som = None
+        self.cache = None
+        self.read_stats = {}
+        self.index = None
 
         if self.s is None:
             self.s = Status()
             self.s.Important("Generating a new Status")
 
     #SOM Functions
-    def get_all_components_as_urns(self):
-        component_list = []
-        root = self.som.get_root()
-        component_list.extend(self._get_bus_list(root))
+    def get_index(self):
+        """
+        Returns the lookup tables of the SOM, they are built the first time
+        they are needed after the SDB is read
 
-        return list(set(component_list))
+        Args:
+            Nothing
 
-    def get_all_devices_as_urns(self):
-        c_urns = self.get_all_components_as_urns()
-        d_urns = []
-        for c_urn in c_urns:
-            c = self.get_component_from_urn(c_urn)
-            if isinstance(c, SOMBus):
-                continue
-            d_urns.append(c_urn)
+        Returns:
+            (SDBIndex): lookup tables
+
+        Raises:
+            Nothing
+        """
+        if self.index is None or self.index.som is not self.som:
+            self.index = SDBIndex(self, self.som)
+        return self.index
+
+    def invalidate_index(self):
+        """
+        Throw away the lookup tables, this must be called if the SOM is
+        modified after the SDB is read
+
+        Args:
+            Nothing
+
+        Returns:
+            Nothing
+
+        Raises:
+            Nothing
+        """
+        self.index = None
 
-        return d_urns
+    def get_all_components_as_urns(self):
+        return list(self.get_index().component_urns)
+
+    def get_all_devices_as_urns(self):
+        return list(self.get_index().device_urns)
 
     def _get_component_index(self, component):
         parent = component.get_parent()
@@ -92,25 +193,6 @@ class NysaSDBManager(object):
             p = p.get_parent()
         return urn
 
-    def _get_bus_list(self, bus):
-        #print "bus: %s" % bus.get_name()
-        bus_list = []
-        bus_list.append(self._get_urn_from_component(bus))
-        for i in range(bus.get_child_count()):
-            component = bus.get_child_from_index(i)
-            #print "component: %s" % component.get_name()
-            if isinstance(component, SOMBus):
-                #print "Found bus!"
-                bus_list.extend(self._get_bus_list(component))
-            if component.get_component().is_synthesis_record():
-                continue
-            if component.get_component().is_integration_record():
-                continue
-            if component.get_component().is_url_record():
-                continue
-            bus_list.append(self._get_urn_from_component(component))
-        return bus_list
-
     def get_component_from_urn(self, urn):
         ls = urn.split("/")
         name_list = []
@@ -129,21 +211,8 @@ class NysaSDBManager(object):
         if (len(name_list) == 1) and (name_list[0] != root.get_name()):
             raise SDBError("Could not find Component from URN: %s" % urn)
 
-        return self._get_component_from_bus_urn(root, name_list[1:])
-
-    def _get_component_from_bus_urn(self, bus, name_list):
-        #User has asked for a bus
-        if len(name_list) == 0:
-            return bus
-
-        #Go through all the sub components.
-        for child in bus:
-            if child.get_name() == name_list[0]:
-                #If the name is bus then go deeper
-                if isinstance(child, SOMBus):
-                    return self._get_component_from_bus_urn(child, name_list[1:])
-                #else the device is a component
-                return child
+        name_list[0] = root.get_name()
+        return self.get_index().urns.get("/" + "/".join(name_list))
 
     def get_number_of_devices(self):
         """
@@ -178,19 +247,10 @@ class NysaSDBManager(object):
         return len(urns)
 
     def _find_component_from_func(self, bus, func, args):
-        #Check Bus First
-
-        if func(bus.get_component(), args):
-            return self._get_urn_from_component(bus)
-
-        #Check Each of the children
-        for child in bus:
-            if isinstance(child, SOMBus):
-                #This child is a bus, go to the next recursive level
-                return self._find_component_from_func(child, func, args)
-            #this is a child
-            elif func(child.get_component(), args):
-                return self._get_urn_from_component(child)
+        #Check every component in the order the SOM is walked
+        for urn, component in self.get_index().components:
+            if func(component.get_component(), args):
+                return urn
 
     def _find_device_from_ids(self, c, args):
         """Private function called with all devices"""
@@ -221,6 +281,8 @@ class NysaSDBManager(object):
         Raises:
             SDBError: device isn't found
         """
+        if vendor_id is not None and product_id is not None:
+            return self.get_index().first_ids.get((vendor_id, product_id))
         return self._find_component_from_func(self.som.get_root(), self._find_device_from_ids, (vendor_id, product_id))
 
     def _find_device_from_address(self, c, args):
@@ -245,7 +307,7 @@ class NysaSDBManager(object):
         Raises:
             SDBError: device isn't found
         """
-        return self._find_component_from_func(self.som.get_root(), self._find_device_from_address, (address,))
+        return self.get_index().addresses.get(address)
 
     def _find_device_from_abi(self, c, args):
         clazz = args[0]
@@ -286,6 +348,8 @@ class NysaSDBManager(object):
         Raises:
             SDBError: device isn't found
         """
+        if abi_class is not None and abi_major is not None and abi_minor is not None:
+            return self.get_index().first_abi.get((abi_class, abi_major, abi_minor))
         return self._find_component_from_func(self.som.get_root(), self._find_device_from_abi, (abi_class, abi_major, abi_minor,))
 
     def find_device_from_driver(self, driver):
@@ -306,7 +370,6 @@ class NysaSDBManager(object):
         l = []
         if self.som is None:
             self.read_sdb()
-        urns = self.get_all_components_as_urns()
         driver_abi_class = driver.get_abi_class()
         driver_abi_major = driver.get_abi_major()
         driver_abi_minor = driver.get_abi_minor()
@@ -317,10 +380,8 @@ class NysaSDBManager(object):
 
         if isinstance(driver_abi_major, str):
             driver_abi_major= device_manager.get_device_id_from_name(driver_abi_major)
+        urns = self.find_urn_from_abi(driver_abi_class, driver_abi_major, driver_abi_minor)
         for urn in urns:
-            if self.is_bus(urn):
-                continue
-
             device_abi_class = self.get_device_abi_class(urn)
             device_abi_major = self.get_device_abi_major(urn)
             device_abi_minor = self.get_device_abi_minor(urn)
@@ -370,14 +431,20 @@ class NysaSDBManager(object):
         component = self.get_component_from_urn(urn)
         return self._get_component_index(component)
 
-    def read_sdb(self, n = None):
+    def read_sdb(self, n = None, cache_id = None):
         """
         Reads the SDB of the device, this is used to initialize the SDB Object
         Model with the content of the SDB on the host
 
+        If a cache ID is specified and the image on the board has not changed
+        since the last time the SDB was read the SDB is loaded from the disk
+        cache
+
         Args:
             n (Nysa Instance): A reference to nysa that the controller will
                 use to extrapolate the SDB from the device
+            cache_id (String): unique name of the board (platform and serial
+                number), None will always read the SDB from the board
 
         Returns:
             Array of bytes consisting of SDB
@@ -387,18 +454,69 @@ class NysaSDBManager(object):
         """
         if n is None:
             n = self.n
-        sdb_data = Array('B')
-        #self.s.Important("Parsing Top Interconnect Buffer")
+        start = time.time()
+        self.index = None
+        self.read_stats = {"reads": 0, "records": 0, "cached": False}
         #Because Nysa works with many different platforms we need to get the
         #platform specific location of where the SDB actually is
         sdb_base_address = n.get_sdb_base_address()
+        if cache_id is not None:
+            if self.cache is None:
+                self.cache = SDBCache(status = self.s)
+            sdb_data = self.cache.load(n, cache_id, sdb_base_address)
+            self.read_stats["reads"] += 1
+            if sdb_data is not None:
+                self.som = srp.parse_rom_image(sdb_data)
+                self.read_stats["cached"] = True
+                self.read_stats["records"] = len(sdb_data) / SDB_ROM_RECORD_LENGTH
+                self.read_stats["time"] = time.time() - start
+                return sdb_data
+
+        #self.s.Important("Parsing Top Interconnect Buffer")
         self.som = som.SOM()
         self.som.initialize_root()
         bus = self.som.get_root()
-        sdb_data.extend(_parse_bus(n, self.som, bus, sdb_base_address, sdb_base_address, self.s))
-        sdb_data = n.read(sdb_base_address, len(sdb_data) / 4)
+        tables = {}
+        _parse_bus(n, self.som, bus, sdb_base_address, sdb_base_address, self.s, tables, self.read_stats)
+
+        #Put the bus tables back together in the order they are in the ROM
+        sdb_data = Array('B')
+        for addr in sorted(tables.keys()):
+            if addr != sdb_base_address + len(sdb_data) / 4:
+                #There is a gap between the tables, read the ROM as it is
+                sdb_data = n.read(sdb_base_address, sum([len(t) for t in tables.values()]) / 4)
+                self.read_stats["reads"] += 1
+                break
+            sdb_data.extend(tables[addr])
+
+        self.read_stats["records"] = len(sdb_data) / SDB_ROM_RECORD_LENGTH
+        if cache_id is not None:
+            self.cache.store(cache_id, sdb_data)
+        self.read_stats["time"] = time.time() - start
+        self.s.Debug("Read SDB: %d records, %d reads in %f seconds" % (self.read_stats["records"],
+                                                                        self.read_stats["reads"],
+                                                                        self.read_stats["time"]))
         return sdb_data
 
+    def get_read_statistics(self):
+        """
+        Returns statistics about the last time the SDB was read
+
+        Args:
+            Nothing
+
+        Returns:
+            (Dictionary):
+                "time": seconds spent reading and parsing the SDB
+                "reads": number of read transactions sent to the board
+                "records": number of SDB records
+                "cached": True if the SDB was loaded from the cache
+
+        Raises:
+            Nothing
+        """
+        return self.read_stats
+
     def is_wishbone_bus(self, urn = None):
         """
         Returns true if the SDB bus is a wishbone bus
@@ -754,27 +872,24 @@ class NysaSDBManager(object):
         Raises:
             None
         """
-        l = []
-        urns = self.get_all_components_as_urns()
         if isinstance(abi_major, str):
             abi_major = device_manager.get_device_id_from_name(abi_major)
-        for urn in urns:
-            if self.is_bus(urn):
-                continue
-            abi_class_test = self.get_device_abi_class(urn)
-            abi_major_test = self.get_device_abi_major(urn)
-            abi_minor_test = self.get_device_abi_minor(urn)
+        index = self.get_index()
+        if abi_class is not None and abi_major is not None and abi_minor is not None:
+            return list(index.abi.get((abi_class, abi_major, abi_minor), []))
+
+        l = []
+        for key in index.abi:
             if abi_class is not None:
-                if abi_class_test != abi_class:
+                if key[0] != abi_class:
                     continue
             if abi_major is not None:
-                if abi_major_test != abi_major:
+                if key[1] != abi_major:
                     continue
             if abi_minor is not None:
-                if abi_minor_test != abi_minor:
+                if key[2] != abi_minor:
                     continue
-            #l.append(self.get_component_from_urn(urn).get_component())
-            l.append(urn)
+            l.extend(index.abi[key])
         return l
 
     def find_urn_from_ids(self, vendor_id = None, product_id = None):
@@ -792,23 +907,47 @@ class NysaSDBManager(object):
         Raises:
             None
         """
+        index = self.get_index()
+        if vendor_id is not None and product_id is not None:
+            return list(index.ids.get((vendor_id, product_id), []))
+
         l = []
-        urns = self.get_all_components_as_urns()
-        for urn in urns:
-            if self.is_bus(urn):
-                continue
-            vendor_id_test = self.get_device_vendor_id(urn)
-            product_id_test = self.get_device_product_id(urn)
+        for key in index.ids:
             if vendor_id is not None:
-                if vendor_id_test != vendor_id:
+                if key[0] != vendor_id:
                     continue
             if product_id is not None:
-                if product_id_test != product_id:
+                if key[1] != product_id:
                     continue
-            #l.append(self.get_component_from_urn(urn).get_component())
-            l.append(urn)
+            l.extend(index.ids[key])
         return l
 
+    def find_urn_from_address(self, address, bus_urn = "/top/peripheral"):
+        """
+        Returns the URN of the device that decodes the address
+
+        Args:
+            address (Integer): an address within a device
+            bus_urn (String): the bus the address is on, addresses of the
+                devices are relative to the bus
+
+        Returns (String):
+            URN of the device or None if no device uses the address
+
+        Raises:
+            None
+        """
+        index = self.get_index()
+        if bus_urn not in index.intervals:
+            return None
+        pos = bisect.bisect_right(index.starts[bus_urn], address) - 1
+        if pos < 0:
+            return None
+        start, end, urn = index.intervals[bus_urn][pos]
+        if address > end:
+            return None
+        return urn
+
     def get_integration_references(self, urn):
         """
         Given a URN return a list of URNs that the integration record is
@@ -952,10 +1091,19 @@ class NysaSDBManager(object):
                 self.s.PrintLine(s, "green")
                 self.s.PrintLine("")
 
-def _parse_bus(n, som, bus, addr, base_addr, status):
+def _parse_bus(n, som, bus, addr, base_addr, status, tables, stats):
+    """
+    Read the table of a bus (interconnect, records and the empty record) and
+    recursively the tables of the buses behind each bridge.
+
+    The interconnect is read first to find out how many records are in the
+    table, the rest of the table is read with one auto incrementing read.
+    The raw tables are put in 'tables' with the address as the key
+    """
     #The first element at this address is the interconnect
     sdb_data = Array('B')
     entity_rom = n.read(addr, SDB_ROM_RECORD_LENGTH / 4)
+    stats["reads"] += 1
     sdb_data.extend(entity_rom)
     status.Verbose("Bus @ 0x%08X: Name: %s" % (addr, bus.get_name()))
     #print_sdb_rom(sdbc.convert_rom_to_32bit_buffer(entity_rom))
@@ -972,13 +1120,17 @@ def _parse_bus(n, som, bus, addr, base_addr, status):
     som.set_bus_component(bus, bus_entity)
     #print "Found bus: %s" % bus_entity.get_name()
 
+    #All the records and the empty record at the end of the bus
+    sdb_data.extend(n.read(addr + SDB_ROM_RECORD_LENGTH / 4,
+                           (num_devices + 1) * SDB_ROM_RECORD_LENGTH / 4))
+    stats["reads"] += 1
+    tables[addr] = sdb_data
+
     entity_size = []
     entity_addr_start = []
 
     for i in range(1, (num_devices + 2)):
-        I = (i * (SDB_ROM_RECORD_LENGTH / 4)) + addr
-        entity_rom = n.read(I, SDB_ROM_RECORD_LENGTH / 4)
-        sdb_data.extend(entity_rom)
+        entity_rom = sdb_data[i * SDB_ROM_RECORD_LENGTH: (i + 1) * SDB_ROM_RECORD_LENGTH]
         entity = srp.parse_rom_element(entity_rom)
         #print_sdb_rom(sdbc.convert_rom_to_32bit_buffer(entity_rom))
         end = long(entity.get_end_address_as_int())
@@ -992,7 +1144,7 @@ def _parse_bus(n, som, bus, addr, base_addr, status):
             sub_bus = som.insert_bus(root = bus,
                                      name = entity.get_name())
             sub_bus_addr = entity.get_bridge_address_as_int() * 2 + base_addr
-            sdb_data.extend(_parse_bus(n, som, sub_bus, sub_bus_addr, base_addr, status))
+            _parse_bus(n, som, sub_bus, sub_bus_addr, base_addr, status, tables, stats)
         else:
             if entity.is_empty_record():
                 continue
@@ -0,0 +1,328 @@
+#Distributed under the MIT licesnse.
+#Copyright (c) 2015 Dave McCoy (dave.mccoy@cospandesign.com)
+
+#Permission is hereby granted, free of charge, to any person obtaining a copy of
+#this software and associated documentation files (the "Software"), to deal in
+#the Software without restriction, including without limitation the rights to
+#use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+#of the Software, and to permit persons to whom the Software is furnished to do
+#so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
+
+""" Nysa Trace
+
+Records every read and write that goes to a board
+
+The tracer sits in front of the read and write of the board so everything
+built on them (registers, memory, batches and all of the drivers) is recorded.
+Each transaction only appends a tuple to a ring buffer, the device a
+transaction belongs to is looked up when the records are summarized:
+
+    t = NysaTracer(n)
+    t.start()
+    ...
+    t.stop()
+    for urn, stats in t.get_device_statistics().items():
+        print "%s: %d transactions %f seconds" % (urn, stats["count"], stats["time"])
+    t.export_chrome_trace("trace.json")
+
+The trace can be opened with chrome://tracing
+"""
+
+__author__ = 'dave.mccoy@cospandesign.com (Dave McCoy)'
+
+import time
+import json
+import threading
+
+from nysa import NysaError
+
+PERIPHERAL_BUS = "/top/peripheral"
+MEMORY_BUS = "/top/memory"
+
+READ = "read"
+WRITE = "write"
+
+#Latency histogram buckets: bucket n counts the transactions that took less
+#than 2^n microseconds
+HISTOGRAM_BUCKETS = 32
+
+class NysaTracer(object):
+    """
+    Ring buffer of the transactions of a board
+
+    Args:
+        n (Nysa): board to trace
+        capacity (Integer): number of transactions kept, the oldest are
+            dropped when the ring is full
+    """
+
+    def __init__(self, n, capacity = 65536):
+        self.n = n
+        self.capacity = capacity
+        self.lock = threading.Lock()
+        self.records = [None] * capacity
+        self.position = 0
+        self.total = 0
+        self.urns = {}
+        self.board_read = None
+        self.board_write = None
+        self.trace_read = None
+        self.trace_write = None
+
+    def start(self):
+        """
+        Start recording the transactions of the board
+
+        Args:
+            Nothing
+
+        Returns:
+            Nothing
+
+        Raises:
+            NysaError: the board is already traced by another tracer
+        """
+        if self.board_read is not None:
+            return
+        if getattr(self.n.read, "nysa_tracer", None) is not None:
+            raise NysaError("The board is already traced")
+        board_read = self.n.read
+        board_write = self.n.write
+
+        def read(address, length = 1, disable_auto_inc = False):
+            if self.board_read is not board_read:
+                return board_read(address, length, disable_auto_inc)
+            start = time.time()
+            try:
+                return board_read(address, length, disable_auto_inc)
+            finally:
+                self._record(start, READ, address, length)
+
+        def write(address, data, disable_auto_inc = False):
+            if self.board_write is not board_write:
+                return board_write(address, data, disable_auto_inc)
+            start = time.time()
+            try:
+                return board_write(address, data, disable_auto_inc)
+            finally:
+                self._record(start, WRITE, address, (len(data) + 3) / 4)
+
+        read.nysa_tracer = self
+        write.nysa_tracer = self
+        self.board_read = board_read
+        self.board_write = board_write
+        self.trace_read = read
+        self.trace_write = write
+        self.n.read = read
+        self.n.write = write
+
+    def stop(self):
+        """
+        Stop recording, the records are kept
+
+        The read and write the board had when the tracer started are put
+        back. If something wrapped the board after the tracer started, that
+        wrapper is left in place and the tracer only passes the transactions
+        through
+
+        Args:
+            Nothing
+
+        Returns:
+            Nothing
+        """
+        if self.board_read is None:
+            return
+        if self.n.read is self.trace_read:
+            self.n.read = self.board_read
+        if self.n.write is self.trace_write:
+            self.n.write = self.board_write
+        self.board_read = None
+        self.board_write = None
+        self.trace_read = None
+        self.trace_write = None
+
+    def is_running(self):
+        return self.board_read is not None
+
+    def _record(self, start, direction, address, length):
+        end = time.time()
+        record = (start, end - start, direction, address, length,
+                  threading.current_thread().ident)
+        with self.lock:
+            self.records[self.position] = record
+            self.position = (self.position + 1) % self.capacity
+            self.total += 1
+
+    def clear(self):
+        """
+        Drop all of the records
+
+        Args:
+            Nothing
+
+        Returns:
+            Nothing
+        """
+        with self.lock:
+            self.records = [None] * self.capacity
+            self.position = 0
+            self.total = 0
+
+    def get_dropped_count(self):
+        """
+        Returns the number of transactions that fell out of the ring
+        """
+        return max(0, self.total - self.capacity)
+
+    def get_records(self):
+        """
+        Returns the transactions in the ring, oldest first
+
+        Args:
+            Nothing
+
+        Returns:
+            (List of tuples): (start time, duration, "read" or "write",
+                address, length in 32-bit words, thread id)
+        """
+        with self.lock:
+            records = self.records[self.position:] + self.records[:self.position]
+        return [r for r in records if r is not None]
+
+    def find_device(self, address):
+        """
+        Returns the device that decodes an address and the offset of the
+        address within the device
+
+        Args:
+            address (Long): address on the board
+
+        Returns:
+            (Tuple): (URN, offset), the URN is None when no device decodes
+                the address
+        """
+        if address in self.urns:
+            return self.urns[address]
+        bus_urn = PERIPHERAL_BUS
+        bus_address = address
+        mem_addr = self.n.nsm.get_address_of_memory_bus()
+        if address >= mem_addr:
+            bus_urn = MEMORY_BUS
+            bus_address = address - mem_addr
+        urn = self.n.find_urn_from_address(bus_address, bus_urn)
+        offset = address
+        if urn is not None:
+            offset = bus_address - self.n.get_device_address(urn)
+        self.urns[address] = (urn, offset)
+        return self.urns[address]
+
+    def _add(self, stats, record):
+        duration = record[1]
+        stats["count"] += 1
+        stats["words"] += record[4]
+        stats["time"] += duration
+        stats["max"] = max(stats["max"], duration)
+        bucket = min(int(duration * 1000000).bit_length(), HISTOGRAM_BUCKETS - 1)
+        stats["histogram"][bucket] += 1
+
+    def _new_stats(self):
+        return {"count": 0,
+                "words": 0,
+                "time": 0.0,
+                "max": 0.0,
+                "histogram": [0] * HISTOGRAM_BUCKETS}
+
+    def get_device_statistics(self):
+        """
+        Summarize the transactions of each device
+
+        Args:
+            Nothing
+
+        Returns:
+            (Dictionary): URN (None for addresses no device decodes) ->
+                count: number of transactions
+                words: 32-bit words moved
+                time: seconds spent in the transactions
+                max: longest transaction in seconds
+                histogram: list of HISTOGRAM_BUCKETS counts, bucket n holds
+                    the transactions that took less than 2^n microseconds
+                registers: offset -> the same statistics for each register
+        """
+        devices = {}
+        for record in self.get_records():
+            urn, offset = self.find_device(record[3])
+            if urn not in devices:
+                devices[urn] = self._new_stats()
+                devices[urn]["registers"] = {}
+            device = devices[urn]
+            self._add(device, record)
+            if offset not in device["registers"]:
+                device["registers"][offset] = self._new_stats()
+            self._add(device["registers"][offset], record)
+        return devices
+
+    def get_chrome_trace(self):
+        """
+        Returns the transactions in the Chrome trace event format
+
+        Args:
+            Nothing
+
+        Returns:
+            (Dictionary): the trace, json.dump writes a file chrome://tracing
+                can open
+        """
+        records = self.get_records()
+        events = []
+        base = 0
+        if len(records) > 0:
+            base = records[0][0]
+        for start, duration, direction, address, length, thread in records:
+            urn, offset = self.find_device(address)
+            name = urn
+            if name is None:
+                name = "0x%08X" % address
+            events.append({"name": "%s %s" % (direction, name),
+                           "cat": direction,
+                           "ph": "X",
+                           "ts": (start - base) * 1000000,
+                           "dur": duration * 1000000,
+                           "pid": 0,
+                           "tid": thread,
+                           "args": {"urn": urn,
+                                    "address": "0x%08X" % address,
+                                    "offset": offset,
+                                    "length": length}})
+        return {"traceEvents": events,
+                "displayTimeUnit": "ms",
+                "otherData": {"board": self.n.name,
+                              "dropped": self.get_dropped_count()}}
+
+    def export_chrome_trace(self, filename):
+        """
+        Write the transactions to a Chrome trace file
+
+        Args:
+            filename (String): path of the file to write
+
+        Returns:
+            Nothing
+        """
+        f = open(filename, "w")
+        try:
+            json.dump(self.get_chrome_trace(), f)
+        finally:
+            f.close()
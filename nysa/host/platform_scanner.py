@@ -23,6 +23,7 @@ __author__ = 'dave.mccoy@cospandesign.com (Dave McCoy)'
 
 import sys
 import os
+import threading
 from inspect import isclass
 from inspect import ismodule
 
@@ -33,6 +34,9 @@ from nysa import NysaCommError
 from nysa_platform import Platform
 from status import Status
 
+#Seconds to wait for a platform to finish scanning for boards
+SCAN_TIMEOUT = 10
+
 class PlatformScannerException(Exception):
     pass
 
@@ -99,24 +103,40 @@ class PlatformScanner(object):
 
         return plat_class_dict
 
-def get_platforms(status = None):
+class _PlatformScanThread(threading.Thread):
+    def __init__(self, platform):
+        super(_PlatformScanThread, self).__init__()
+        self.setDaemon(True)
+        self.platform = platform
+        self.boards = {}
+        self.error = None
+
+    def run(self):
+        try:
+            self.boards = self.platform.scan()
+        except Exception:
+            self.error = sys.exc_info()
+
+def scan_platforms(platform_dict, status = None, timeout = SCAN_TIMEOUT):
     """
-    Return all platforms in the system
+    Scan all the platforms at the same time
+
+    Each platform is scanned in its own thread, a platform that has not
+    finished within 'timeout' seconds is reported as having no boards
 
     Args:
+        platform_dict (Dictionary): platform classes with the platform name as
+            the key (from PlatformScanner.get_platforms)
         status (Status): a debug status object
+        timeout (float): seconds to wait for each platform
 
     Return:
-        (list of platforms)
+        (List of tuples): (platform name, platform instance, dictionary of
+            boards) in the order the platforms should be used, sim is last
 
     Raises:
-        Nothing
+        Any exception raised by a platform scan
     """
-    if status is None:
-        status = Status()
-    platforms = []
-    pscanner = PlatformScanner()
-    platform_dict = pscanner.get_platforms()
     platform_names = platform_dict.keys()
 
     if "sim" in platform_names:
@@ -124,14 +144,49 @@ def get_platforms(status = None):
         platform_names.remove("sim")
         platform_names.append("sim")
 
+    threads = []
     for platform_name in platform_names:
         if status: status.Debug("Platform: %s" % str(platform_name))
         #Get a reference to a platform object (like sim, or dionysus)
-        platform_instance = platform_dict[platform_name](status)
+        t = _PlatformScanThread(platform_dict[platform_name](status))
+        t.start()
+        threads.append((platform_name, t))
+
+    scans = []
+    for platform_name, t in threads:
+        t.join(timeout)
+        if t.is_alive():
+            if status: status.Warning("Timeout while scanning for %s boards" % platform_name)
+            scans.append((platform_name, t.platform, {}))
+            continue
+        if t.error is not None:
+            raise t.error[0], t.error[1], t.error[2]
+        scans.append((platform_name, t.platform, t.boards))
+
+    return scans
+
+def get_platforms(status = None, timeout = SCAN_TIMEOUT):
+    """
+    Return all platforms in the system
+
+    Args:
+        status (Status): a debug status object
+        timeout (float): seconds to wait for each platform to scan
+
+    Return:
+        (list of platforms)
 
-        #Scan for instances of that particular platform
-        instances_dict = platform_instance.scan()
+    Raises:
+        Nothing
+    """
+    if status is None:
+        status = Status()
+    platforms = []
+    pscanner = PlatformScanner()
+    platform_dict = pscanner.get_platforms()
 
+    #Scan for instances of every platform
+    for platform_name, platform_instance, instances_dict in scan_platforms(platform_dict, status, timeout):
         for name in instances_dict:
             n = instances_dict[name]
             if n is not None:
@@ -140,13 +195,14 @@ def get_platforms(status = None):
 
     return platforms
 
-def get_platforms_with_device(driver, status = None):
+def get_platforms_with_device(driver, status = None, timeout = SCAN_TIMEOUT):
     """
     From a driver return a list of platforms that have a reference to a
     device that can be controller through this driver
 
     Args:
         driver (Driver Object): a driver to find a reference to
+        timeout (float): seconds to wait for each platform to scan
 
     Return:
         (List of platforms that support the driver)
@@ -158,21 +214,9 @@ def get_platforms_with_device(driver, status = None):
     platforms = []
     pscanner = PlatformScanner()
     platform_dict = pscanner.get_platforms()
-    platform_names = platform_dict.keys()
-
-    if "sim" in platform_names:
-        #If sim is in the platform names move it to the back
-        platform_names.remove("sim")
-        platform_names.append("sim")
-
-    for platform_name in platform_names:
-        if status: status.Debug("Platform: %s" % str(platform_name))
-        #Get a reference to a platform object (like sim, or dionysus)
-        platform_instance = platform_dict[platform_name](status)
-
-        #Scan for instances of that particular platform
-        instances_dict = platform_instance.scan()
 
+    #Scan for instances of every platform
+    for platform_name, platform_instance, instances_dict in scan_platforms(platform_dict, status, timeout):
         for name in instances_dict:
             try:
                 n = instances_dict[name]
@@ -186,25 +230,24 @@ def get_platforms_with_device(driver, status = None):
 
     return platforms
 
-def find_board(name, serial = None, status = None):
+def find_board(name, serial = None, status = None, timeout = SCAN_TIMEOUT):
     s = status
     pc = PlatformScanner(s)
-    pc.get_board_path_dict()
     platform_class_dict = pc.get_platforms()
     board = None
 
     if name is None:
-        pc = PlatformScanner(s)
-        platforms = pc.get_platforms()
+        #Scan every platform once, the result is reused for the chosen board
         names = []
+        boards_dict = {}
 
-        for platform_name in platforms:
-            platform = platforms[platform_name](s)
-            boards = platform.scan()
+        for platform_name, platform, boards in scan_platforms(platform_class_dict, s, timeout):
             #print "boards for %s: % s" % (platform_name, str(boards))
             if len(boards) > 0:
                 #print "Found %d board for %s" % (len(boards), platform_name)
-                names.append(platforms[platform_name]().get_type())
+                platform_type = platform.get_type()
+                names.append(platform_type)
+                boards_dict[platform_type.lower()] = boards
 
 
         if len(names) == 1:
@@ -224,15 +267,19 @@ def find_board(name, serial = None, status = None):
                 raise PlatformScannerException("more than one option for attached board: %s" % str(names))
                 sys.exit(1)
 
-    name = name.lower()
+        name = name.lower()
+        dev_dict = boards_dict[name]
+
+    else:
+        name = name.lower()
 
-    #print "platforms: %s" % str(platform_class_dict.keys())
-    #print "name: %s" % str(name)
-    if name not in platform_class_dict:
-        raise PlatformScannerException("%s is not currently installed, please install more platforms" % name)
+        #print "platforms: %s" % str(platform_class_dict.keys())
+        #print "name: %s" % str(name)
+        if name not in platform_class_dict:
+            raise PlatformScannerException("%s is not currently installed, please install more platforms" % name)
 
-    p = platform_class_dict[name](s)
-    dev_dict = p.scan()
+        p = platform_class_dict[name](s)
+        dev_dict = p.scan()
 
     if len(dev_dict) == 0:
         raise PlatformScannerException("No boards found for %s" % name)
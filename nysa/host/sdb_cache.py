@@ -0,0 +1,168 @@
+# Copyright (c) 2014 Dave McCoy (dave.mccoy@cospandesign.com)
+
+# This file is part of Nysa (wiki.cospandesign.com/index.php?title=Nysa).
+#
+# Nysa is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# any later version.
+#
+# Nysa is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Nysa; If not, see <http://www.gnu.org/licenses/>.
+
+
+""" SDB Cache
+
+Keeps a copy of the SDB ROM read from a board on disk so the next connection
+to the same image does not need to walk the SDB over the wire.
+
+Each board is identified by a cache ID (platform name and serial number), the
+image on the board is identified by the table of the top bus (the interconnect
+record, every record of the top bus including the synthesis record and the
+terminating empty record). The top bus table is read in one transaction and
+compared against the cached copy, if anything is different the image has
+changed and the SDB must be read from the board.
+"""
+
+__author__ = 'dave.mccoy@cospandesign.com (Dave McCoy)'
+
+import sys
+import os
+import json
+import re
+from array import array as Array
+
+sys.path.append(os.path.join(os.path.dirname(__file__),
+                             os.pardir))
+
+from common.site_manager import get_sdb_cache_path
+from cbuilder.sdb import SDBError
+from cbuilder.sdb_component import SDB_ROM_RECORD_LENGTH
+from cbuilder import som_rom_parser as srp
+
+SDB_CACHE_VERSION = 1
+
+def get_identity_length(rom):
+    """
+    Returns the number of bytes at the start of the ROM that identifies the
+    image (the table of the top bus)
+
+    Args:
+        rom (Array of bytes): SDB ROM
+
+    Returns:
+        (Integer): number of bytes, this is always a multiple of 4
+
+    Raises:
+        SDBError: the ROM does not start with an interconnect
+    """
+    entity = srp.parse_rom_element(rom[0:SDB_ROM_RECORD_LENGTH])
+    if not entity.is_interconnect():
+        raise SDBError("Rom data does not point to an interconnect")
+    #The interconnect, the records and the empty record at the end
+    return (entity.get_number_of_records_as_int() + 2) * SDB_ROM_RECORD_LENGTH
+
+class SDBCache(object):
+
+    def __init__(self, path = None, status = None):
+        if path is None:
+            path = get_sdb_cache_path()
+        self.path = path
+        self.s = status
+
+    def _get_filename(self, cache_id):
+        name = re.sub(r"[^A-Za-z0-9_.-]", "_", str(cache_id))
+        return os.path.join(self.path, "%s.json" % name)
+
+    def load(self, n, cache_id, base_address):
+        """
+        Returns the cached SDB ROM of a board if the image on the board has
+        not changed
+
+        Args:
+            n (Nysa Instance): board used to read the identity of the image
+            cache_id (String): unique name of the board
+            base_address (Integer): address of the SDB on the board
+
+        Returns:
+            (Array of bytes): SDB ROM or None if the SDB must be read from
+                the board
+
+        Raises:
+            NysaCommError: Errors associated with communication
+        """
+        filename = self._get_filename(cache_id)
+        if not os.path.exists(filename):
+            return None
+
+        try:
+            f = open(filename, "r")
+            cache = json.load(f)
+            f.close()
+            if cache["version"] != SDB_CACHE_VERSION:
+                return None
+            rom = Array('B', bytearray.fromhex(cache["rom"]))
+            identity_length = cache["identity_length"]
+        except (IOError, ValueError, KeyError, TypeError):
+            if self.s: self.s.Warning("Ignoring damaged SDB cache: %s" % filename)
+            return None
+
+        if identity_length > len(rom):
+            return None
+
+        if n.read(base_address, identity_length / 4) != rom[0:identity_length]:
+            if self.s: self.s.Debug("Image on %s has changed, SDB cache is stale" % cache_id)
+            return None
+
+        if self.s: self.s.Debug("Using SDB cache for %s" % cache_id)
+        return rom
+
+    def store(self, cache_id, rom):
+        """
+        Save the SDB ROM of a board
+
+        Args:
+            cache_id (String): unique name of the board
+            rom (Array of bytes): SDB ROM read from the board
+
+        Returns:
+            Nothing
+
+        Raises:
+            SDBError: the ROM does not start with an interconnect
+        """
+        cache = {}
+        cache["version"] = SDB_CACHE_VERSION
+        cache["identity_length"] = get_identity_length(rom)
+        cache["rom"] = "".join(["%02X" % b for b in rom])
+
+        try:
+            if not os.path.exists(self.path):
+                os.makedirs(self.path)
+            f = open(self._get_filename(cache_id), "w")
+            json.dump(cache, f)
+            f.close()
+        except (IOError, OSError) as ex:
+            if self.s: self.s.Warning("Failed to write SDB cache: %s" % str(ex))
+
+    def remove(self, cache_id):
+        """
+        Remove the cached SDB ROM of a board
+
+        Args:
+            cache_id (String): unique name of the board
+
+        Returns:
+            Nothing
+
+        Raises:
+            Nothing
+        """
+        filename = self._get_filename(cache_id)
+        if os.path.exists(filename):
+            os.remove(filename)
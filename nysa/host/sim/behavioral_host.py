@@ -0,0 +1,919 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Nysa (wiki.cospandesign.com/index.php?title=Nysa).
+#
+# Nysa is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# any later version.
+#
+# Nysa is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Nysa; If not, see <http://www.gnu.org/licenses/>.
+
+""" Behavioral Nysa
+
+A Nysa board that runs entirely in Python: the SDB ROM is served from memory
+and every read/write is routed to a register model of the device that decodes
+the address. No HDL simulator (or cocotb) is needed, so host drivers and the
+DMA controllers can be exercised as fast as Python can call them.
+
+The peripheral bus is routed the way the interconnect does it, a device owns
+the addresses from its base to the base of the next device. The memory bus is
+routed by the address range of each memory device.
+
+Devices that are not given a model get a RegisterModel (a block of scratch
+registers), memory devices get a MemoryModel.
+
+Example:
+
+    n = BehavioralNysa(som = som, models = {"gpio1": GPIOModel()})
+    gpio = GPIO(n, n.find_device(GPIO)[0])
+"""
+
+__author__ = 'dave.mccoy@cospandesign.com (Dave McCoy)'
+
+import json
+import threading
+from bisect import bisect_right
+from array import array as Array
+from collections import OrderedDict
+
+from nysa.host.nysa import Nysa
+from nysa.host.nysa import NysaCommError
+from nysa.host.nysa import NysaError
+from nysa.cbuilder.som_rom_generator import generate_rom_image
+from nysa.cbuilder import sdb_component as sdbc
+from nysa.cbuilder import sdb_object_model as som
+from nysa.cbuilder.device_manager import get_device_id_from_name
+from nysa.common.status import Status
+
+from nysa.host.driver import gpio as gpio_driver
+from nysa.host.driver import uart as uart_driver
+from nysa.host.driver import sata_driver
+from nysa.host.driver import dma as dma_driver
+
+PERIPHERAL_BUS = "/top/peripheral"
+MEMORY_BUS = "/top/memory"
+
+BEHAVIORAL_BOARD_NAME = "behavioral"
+
+def _to_words(data):
+    words = []
+    for i in range(0, len(data), 4):
+        words.append((data[i] << 24) | (data[i + 1] << 16) | (data[i + 2] << 8) | data[i + 3])
+    return words
+
+def _to_bytes(words):
+    data = Array('B')
+    for w in words:
+        data.extend([(w >> 24) & 0xFF, (w >> 16) & 0xFF, (w >> 8) & 0xFF, w & 0xFF])
+    return data
+
+def create_som(peripherals = [], memories = []):
+    """
+    Create the SDB object model of a board laid out the way GenSDB does it:
+    the SDB ROM first, peripherals 0x01000000 apart and the memory bus above
+    the peripheral bus
+
+    Args:
+        peripherals (List of Tuples): (name, device type, size) or
+            (name, device type, size, version minor) of each peripheral, the
+            device type is a name from the device list or None
+        memories (List of Tuples): (name, size) of each memory
+
+    Returns:
+        (SOM): SDB object model to give to BehavioralNysa
+
+    Example:
+
+        s = create_som([("gpio1", "gpio", 8)], [("mem1", 0x1000)])
+        n = BehavioralNysa(som = s, models = {"gpio1": GPIOModel()})
+    """
+    s = som.SOM()
+    s.initialize_root()
+    root = s.get_root()
+    peripheral = s.insert_bus(root, name = "peripheral")
+    memory = s.insert_bus(root, name = "memory")
+    s.insert_component(peripheral, sdbc.create_device_record(name = "SDB",
+                        version_major = get_device_id_from_name("SDB"), size = 0x400))
+    for p in peripherals:
+        name, device_type, size = p[0:3]
+        version_major = None
+        version_minor = None
+        if device_type is not None:
+            version_major = get_device_id_from_name(device_type)
+        if len(p) > 3:
+            version_minor = p[3]
+        s.insert_component(peripheral, sdbc.create_device_record(name = name,
+                            version_major = version_major,
+                            version_minor = version_minor,
+                            size = size))
+    for name, size in memories:
+        s.insert_component(memory, sdbc.create_device_record(name = name,
+                            version_major = get_device_id_from_name("memory"),
+                            size = size))
+    s.set_child_spacing(root, 0x0100000000)
+    s.set_child_spacing(peripheral, 0x0001000000)
+    return s
+
+class RegisterModel(object):
+    """
+    Behavioral model of a device, by default a block of 32-bit registers
+    that read back what was written
+
+    Subclasses override read_register/write_register to give registers a
+    behavior, models that move blocks of data (memories, FIFOs) override
+    read/write directly
+    """
+
+    def __init__(self):
+        self.registers = {}
+        self.host = None
+        self.urn = None
+        self.index = None
+
+    def attach(self, host, urn, index):
+        """
+        Called by the host when the model is placed on the bus
+
+        Args:
+            host (BehavioralNysa): the board
+            urn (String): URN of the device
+            index (Integer): index of the device in the bus, this is the
+                interrupt bit of the device
+
+        Returns:
+            Nothing
+        """
+        self.host = host
+        self.urn = urn
+        self.index = index
+
+    def reset(self):
+        self.registers = {}
+
+    def read_register(self, offset):
+        return self.registers.get(offset, 0)
+
+    def write_register(self, offset, value):
+        self.registers[offset] = value
+
+    def read(self, offset, length, disable_auto_inc = False):
+        """
+        Read 'length' 32-bit words starting at 'offset'
+
+        Returns:
+            (Array of bytes)
+        """
+        if disable_auto_inc:
+            return _to_bytes([self.read_register(offset) for i in range(length)])
+        return _to_bytes([self.read_register(offset + i) for i in range(length)])
+
+    def write(self, offset, data, disable_auto_inc = False):
+        """
+        Write an array of bytes (a multiple of 4) starting at 'offset'
+        """
+        words = _to_words(data)
+        for i in range(len(words)):
+            if disable_auto_inc:
+                self.write_register(offset, words[i])
+            else:
+                self.write_register(offset + i, words[i])
+
+    def interrupt(self):
+        """
+        Raise the interrupt of this device
+        """
+        if self.host is not None:
+            self.host.raise_interrupt(self.index)
+
+class MemoryModel(RegisterModel):
+    """
+    Word addressed memory, the storage grows as it is written, locations that
+    were never written read back as 0
+    """
+
+    def __init__(self):
+        super(MemoryModel, self).__init__()
+        self.data = bytearray()
+
+    def reset(self):
+        #The contents of a memory survive a reset
+        pass
+
+    def read_register(self, offset):
+        return _to_words(self.read(offset, 1))[0]
+
+    def write_register(self, offset, value):
+        self.write(offset, _to_bytes([value]))
+
+    def read(self, offset, length, disable_auto_inc = False):
+        start = offset * 4
+        end = start + (length * 4)
+        data = Array('B', self.data[start:end])
+        if len(data) < (length * 4):
+            data.extend([0] * ((length * 4) - len(data)))
+        return data
+
+    def write(self, offset, data, disable_auto_inc = False):
+        start = offset * 4
+        end = start + len(data)
+        if end > len(self.data):
+            self.data.extend(bytearray(end - len(self.data)))
+        self.data[start:end] = bytearray(data)
+
+class GPIOModel(RegisterModel):
+    """
+    GPIO core
+
+    Pins that are outputs read back the port register, pins that are inputs
+    read back the value set with 'set_inputs'. A change on an input that has
+    its interrupt enabled sets the bit in the interrupt register (cleared
+    when it is read) and raises the interrupt of the device
+    """
+
+    def __init__(self, clock_rate = 100000000):
+        super(GPIOModel, self).__init__()
+        self.clock_rate = clock_rate
+        self.inputs = 0
+
+    def reset(self):
+        super(GPIOModel, self).reset()
+        self.inputs = 0
+
+    def set_inputs(self, value):
+        """
+        Drive the input pins of the port
+        """
+        previous = self.inputs
+        self.inputs = value
+        changed = previous ^ value
+        edge = self.registers.get(gpio_driver.INTERRUPT_EDGE, 0)
+        both = self.registers.get(gpio_driver.INTERRUPT_BOTH_EDGE, 0)
+        enable = self.registers.get(gpio_driver.INTERRUPT_ENABLE, 0)
+        enable &= ~self.registers.get(gpio_driver.GPIO_OUTPUT_ENABLE, 0)
+        #Rising edges where 'edge' is set, falling edges where it is not
+        triggered = changed & (both | ~(value ^ edge)) & enable
+        if triggered:
+            self.registers[gpio_driver.INTERRUPTS] = self.registers.get(gpio_driver.INTERRUPTS, 0) | triggered
+            self.interrupt()
+
+    def get_outputs(self):
+        """
+        Returns the value the core drives onto the output pins
+        """
+        return self.registers.get(gpio_driver.GPIO_PORT, 0) & \
+               self.registers.get(gpio_driver.GPIO_OUTPUT_ENABLE, 0)
+
+    def read_register(self, offset):
+        if offset == gpio_driver.GPIO_PORT:
+            direction = self.registers.get(gpio_driver.GPIO_OUTPUT_ENABLE, 0)
+            return (self.get_outputs() | (self.inputs & ~direction)) & 0xFFFFFFFF
+        if offset == gpio_driver.INTERRUPTS:
+            return self.registers.pop(gpio_driver.INTERRUPTS, 0)
+        if offset == gpio_driver.READ_CLOCK_RATE:
+            return self.clock_rate
+        return self.registers.get(offset, 0)
+
+class UARTModel(RegisterModel):
+    """
+    UART core with a read and a write FIFO
+
+    Bytes the host writes are collected in 'transmitted', bytes for the host
+    to read are added with 'receive'
+    """
+
+    def __init__(self, fifo_depth = 2048):
+        super(UARTModel, self).__init__()
+        self.fifo_depth = fifo_depth
+        self.rx = bytearray()
+        self.transmitted = bytearray()
+        self.read_count = 0
+
+    def reset(self):
+        super(UARTModel, self).reset()
+        self.rx = bytearray()
+        self.transmitted = bytearray()
+        self.read_count = 0
+
+    def receive(self, data):
+        """
+        Add data to the read FIFO as if it arrived on the serial line
+
+        Args:
+            data (String or Array of bytes): data received
+        """
+        self.rx.extend(bytearray(data))
+        if len(self.rx) > self.fifo_depth:
+            self.rx = self.rx[len(self.rx) - self.fifo_depth:]
+            self._set_status(uart_driver.STATUS_OVFL_RX)
+        if self.registers.get(uart_driver.CONTROL, 0) & (1 << uart_driver.CONTROL_INT_READ):
+            self._set_status(uart_driver.STATUS_INT_READ)
+            self.interrupt()
+
+    def _set_status(self, bit):
+        self.registers[uart_driver.STATUS] = self.registers.get(uart_driver.STATUS, 0) | (1 << bit)
+
+    def read_register(self, offset):
+        if offset == uart_driver.STATUS:
+            return self.registers.pop(uart_driver.STATUS, 0)
+        if offset == uart_driver.READ_COUNT:
+            return len(self.rx)
+        if offset == uart_driver.WRITE_AVAILABLE:
+            #The line drains the write FIFO immediately
+            return self.fifo_depth
+        return self.registers.get(offset, 0)
+
+    def write_register(self, offset, value):
+        if offset == uart_driver.CONTROL and (value & (1 << uart_driver.CONTROL_RESET)):
+            self.reset()
+            value &= ~(1 << uart_driver.CONTROL_RESET)
+        if offset == uart_driver.READ_COUNT:
+            self.read_count = value
+            return
+        self.registers[offset] = value
+
+    def read(self, offset, length, disable_auto_inc = False):
+        if offset != uart_driver.READ_DATA:
+            return super(UARTModel, self).read(offset, length, disable_auto_inc)
+
+        count = min(self.read_count, len(self.rx), length * 4)
+        if count < self.read_count:
+            self._set_status(uart_driver.STATUS_UFL_RX)
+        data = Array('B', self.rx[0:count])
+        self.rx = self.rx[count:]
+        self.read_count = 0
+        data.extend([0] * ((length * 4) - len(data)))
+        return data
+
+    def write(self, offset, data, disable_auto_inc = False):
+        if offset != uart_driver.WRITE_DATA:
+            return super(UARTModel, self).write(offset, data, disable_auto_inc)
+
+        #The first two bytes are the number of bytes that follow
+        length = (data[0] << 8) | data[1]
+        self.transmitted.extend(bytearray(data[2:2 + length]))
+
+class DMAReaderModel(RegisterModel):
+    """
+    Core that sends data to the host through two memory blocks, the register
+    layout matches the arguments of DMAReadController
+
+    Writing the size register of a block requests data from 'source', a
+    function that is called with the number of bytes and returns the bytes or
+    None if no data is available yet. The data is written to the memory bus,
+    the block is flagged as finished and the interrupt is raised. Blocks
+    waiting on 'source' are retried with 'fill'
+    """
+
+    def __init__(self,
+                 source = None,
+                 reg_status = 1,
+                 reg_base0 = 2,
+                 reg_size0 = 3,
+                 reg_base1 = 4,
+                 reg_size1 = 5,
+                 finished0 = 0,
+                 finished1 = 1,
+                 empty0 = 2,
+                 empty1 = 3):
+        super(DMAReaderModel, self).__init__()
+        self.source = source
+        self.reg_status = reg_status
+        self.reg_base = [reg_base0, reg_base1]
+        self.reg_size = [reg_size0, reg_size1]
+        self.finished = [1 << finished0, 1 << finished1]
+        self.empty = [1 << empty0, 1 << empty1]
+        self.reset()
+
+    def reset(self):
+        super(DMAReaderModel, self).reset()
+        self.status = self.empty[0] | self.empty[1]
+        self.pending = [None, None]
+
+    def fill(self):
+        """
+        Give the blocks that are waiting for data another chance to get it
+        from the source
+
+        Returns:
+            (Integer): number of blocks that were filled
+        """
+        filled = 0
+        for i in range(2):
+            if self.pending[i] is None:
+                continue
+            data = None
+            if self.source is not None:
+                data = self.source(self.pending[i] * 4)
+            if data is None:
+                continue
+            self.host.write_memory(self.registers.get(self.reg_base[i], 0), Array('B', data))
+            self.pending[i] = None
+            self.status |= self.finished[i] | self.empty[i]
+            filled += 1
+        if filled > 0:
+            self.interrupt()
+        return filled
+
+    def read_register(self, offset):
+        if offset == self.reg_status:
+            status = self.status
+            #The finished flags are reset when they are read
+            self.status &= ~(self.finished[0] | self.finished[1])
+            return status
+        return self.registers.get(offset, 0)
+
+    def write_register(self, offset, value):
+        self.registers[offset] = value
+        if offset in self.reg_size:
+            i = self.reg_size.index(offset)
+            self.pending[i] = value
+            self.status &= ~(self.finished[i] | self.empty[i])
+            self.fill()
+
+class DMAWriterModel(RegisterModel):
+    """
+    Core that receives data from the host through two memory blocks, the
+    register layout matches the arguments of DMAWriteController
+
+    Writing the size register of a block hands the data in the block to
+    'sink' (by default it is appended to 'received'), the block is empty again
+    right away and the interrupt is raised
+    """
+
+    def __init__(self,
+                 sink = None,
+                 reg_status = 1,
+                 reg_base0 = 2,
+                 reg_size0 = 3,
+                 reg_base1 = 4,
+                 reg_size1 = 5,
+                 empty0 = 1,
+                 empty1 = 2):
+        super(DMAWriterModel, self).__init__()
+        self.sink = sink
+        self.reg_status = reg_status
+        self.reg_base = [reg_base0, reg_base1]
+        self.reg_size = [reg_size0, reg_size1]
+        self.empty = [1 << empty0, 1 << empty1]
+        self.reset()
+
+    def reset(self):
+        super(DMAWriterModel, self).reset()
+        self.received = Array('B')
+
+    def read_register(self, offset):
+        if offset == self.reg_status:
+            return self.empty[0] | self.empty[1]
+        return self.registers.get(offset, 0)
+
+    def write_register(self, offset, value):
+        self.registers[offset] = value
+        if offset in self.reg_size:
+            i = self.reg_size.index(offset)
+            data = self.host.read_memory(self.registers.get(self.reg_base[i], 0), value)
+            if self.sink is not None:
+                self.sink(data)
+            else:
+                self.received.extend(data)
+            self.interrupt()
+
+class DMAModel(RegisterModel):
+    """
+    DMA core with channels that read from and sinks that write to the memory
+    bus of the board
+
+    Enabling a channel while the core is enabled runs the instructions of the
+    channel right away, following the next instruction until an instruction
+    does not continue (or the chain comes back to an instruction it already
+    ran). Addresses always increment and bonds are not modeled. The status of
+    the channel reads finished once the instructions have run
+
+    Args:
+        channel_count (Integer): number of channels
+        sink_count (Integer): number of sinks
+    """
+
+    def __init__(self, channel_count = 2, sink_count = 3):
+        super(DMAModel, self).__init__()
+        self.channel_count = channel_count
+        self.sink_count = sink_count
+        self.transfers = 0
+        self.reset()
+
+    def reset(self):
+        super(DMAModel, self).reset()
+        self.registers[dma_driver.CHANNEL_COUNT] = self.channel_count
+        self.registers[dma_driver.SINK_COUNT] = self.sink_count
+
+    def _is_channel_enabled(self, channel):
+        control = self.registers.get(dma_driver.CHANNEL_ADDR_CONTROL_BASE + channel, 0)
+        return (control & (1 << dma_driver.BIT_CFG_DMA_ENABLE)) > 0
+
+    def _run(self, channel):
+        control = self.registers.get(dma_driver.CHANNEL_ADDR_CONTROL_BASE + channel, 0)
+        ip = (control >> dma_driver.BIT_INST_PTR_BOT) & 0xF
+        executed = []
+        while ip not in executed:
+            executed.append(ip)
+            base = dma_driver.INST_BASE + (dma_driver.INST_OFFSET * ip)
+            source = (self.registers.get(base + dma_driver.INST_SRC_ADDR_HIGH, 0) << 32) | \
+                      self.registers.get(base + dma_driver.INST_SRC_ADDR_LOW, 0)
+            dest = (self.registers.get(base + dma_driver.INST_DEST_ADDR_HIGH, 0) << 32) | \
+                    self.registers.get(base + dma_driver.INST_DEST_ADDR_LOW, 0)
+            count = self.registers.get(base + dma_driver.INST_COUNT, 0)
+            cntrl = self.registers.get(base + dma_driver.INST_CNTRL, 0)
+            if count > 0:
+                data = self.host.read_memory(source, count)
+                self.host.write_memory(dest, data)
+                self.transfers += 1
+            if (cntrl & (1 << dma_driver.BIT_INST_CMD_CONTINUE)) == 0:
+                break
+            ip = (cntrl >> dma_driver.BIT_INST_CMD_NEXT_BOT) & 0xF
+        self.registers[dma_driver.CHANNEL_ADDR_STATUS_BASE + channel] = 1 << dma_driver.BIT_CHNL_STS_FIN
+
+    def write_register(self, offset, value):
+        was_enabled = [self._is_channel_enabled(c) for c in range(self.channel_count)]
+        dma_enabled = (self.registers.get(dma_driver.CONTROL, 0) & (1 << dma_driver.BIT_CONTROL_ENABLE)) > 0
+        self.registers[offset] = value
+        for channel in range(self.channel_count):
+            if not self._is_channel_enabled(channel):
+                self.registers[dma_driver.CHANNEL_ADDR_STATUS_BASE + channel] = 0
+        if (self.registers.get(dma_driver.CONTROL, 0) & (1 << dma_driver.BIT_CONTROL_ENABLE)) == 0:
+            return
+        for channel in range(self.channel_count):
+            if self._is_channel_enabled(channel) and \
+                    (not was_enabled[channel] or not dma_enabled):
+                self._run(channel)
+
+class SATAModel(RegisterModel):
+    """
+    SATA core with a hard drive that keeps its sectors in memory, sectors that
+    were never written read back as 0
+
+    READ DMA EXT copies the sectors into the local buffer, WRITE DMA EXT
+    writes the sectors in the local buffer to the drive and IDENTIFY DEVICE
+    puts the identify data in the local buffer. Commands finish right away,
+    a command that is past the end of the drive or does not fit in the local
+    buffer sets the hard drive error bit
+
+    Args:
+        sector_count (Long): size of the drive in sectors
+    """
+
+    READ_DMA_EXT = 0x25
+    WRITE_DMA_EXT = 0x35
+    READ_NATIVE_MAX_ADDRESS_EXT = 0x27
+    IDENTIFY_DEVICE = 0xEC
+
+    def __init__(self, sector_count = 0x100000):
+        super(SATAModel, self).__init__()
+        self.sector_count = sector_count
+        self.sectors = {}
+        self.buffer = Array('B', [0] * (sata_driver.SATA_BUFFER_SIZE * 4))
+        self.commands = 0
+        self.error = False
+
+    def reset(self):
+        #The sectors on the drive survive a reset
+        super(SATAModel, self).reset()
+        self.error = False
+
+    def _get_address(self):
+        return (self.registers.get(sata_driver.HARD_DRIVE_ADDRESS_HIGH, 0) << 32) | \
+                self.registers.get(sata_driver.HARD_DRIVE_ADDRESS_LOW, 0)
+
+    def _command(self, command):
+        self.commands += 1
+        self.error = False
+        address = self._get_address()
+        count = self.registers.get(sata_driver.HARD_DRIVE_SECTOR_COUNT, 0)
+        if count == 0:
+            count = sata_driver.MAX_COMMAND_SECTORS
+
+        if command in (self.READ_DMA_EXT, self.WRITE_DMA_EXT):
+            if (address + count > self.sector_count) or \
+                    (count > sata_driver.LOCAL_BUFFER_SECTORS):
+                self.error = True
+                return
+            for i in range(count):
+                start = i * sata_driver.SECTOR_SIZE
+                end = start + sata_driver.SECTOR_SIZE
+                if command == self.READ_DMA_EXT:
+                    self.buffer[start:end] = self.sectors.get(address + i,
+                                                Array('B', [0] * sata_driver.SECTOR_SIZE))
+                else:
+                    self.sectors[address + i] = self.buffer[start:end]
+
+        elif command == self.READ_NATIVE_MAX_ADDRESS_EXT:
+            self.registers[sata_driver.HARD_DRIVE_ADDRESS_LOW] = (self.sector_count - 1) & 0xFFFFFFFF
+            self.registers[sata_driver.HARD_DRIVE_ADDRESS_HIGH] = (self.sector_count - 1) >> 32
+
+        elif command == self.IDENTIFY_DEVICE:
+            self.buffer[0:sata_driver.SECTOR_SIZE] = Array('B', [0] * sata_driver.SECTOR_SIZE)
+            #Laid out the way SataConfig reads it
+            for i in range(4):
+                self.buffer[100 + i] = (self.sector_count >> (24 - (i * 8))) & 0xFF
+                self.buffer[114 + i] = (self.sector_count >> (24 - (i * 8))) & 0xFF
+
+    def read_register(self, offset):
+        if offset == sata_driver.STATUS:
+            status = (1 << sata_driver.BIT_PLATFORM_READY) | \
+                     (1 << sata_driver.BIT_LINKUP) | \
+                     (1 << sata_driver.BIT_COMMAND_LAYER_READY) | \
+                     (1 << sata_driver.BIT_PHY_READY) | \
+                     (1 << sata_driver.BIT_LINK_LAYER_READY) | \
+                     (1 << sata_driver.BIT_TRANSPORT_LAYER_READY)
+            if self.error:
+                status |= 1 << sata_driver.BIT_HARD_DRIVE_ERROR
+            return status
+        if offset == sata_driver.HARD_DRIVE_STATUS:
+            #Drive ready, the error bit and ABRT in the error register
+            if self.error:
+                return (0x04 << sata_driver.BIT_D2H_ERROR_LOW) | (0x41 << sata_driver.BIT_D2H_STATUS_LOW)
+            return 0x40 << sata_driver.BIT_D2H_STATUS_LOW
+        return self.registers.get(offset, 0)
+
+    def write_register(self, offset, value):
+        if offset == sata_driver.CONTROL:
+            #The local buffer is the buffer the drive uses, loading it is
+            #a strobe that clears itself
+            value &= ~(1 << sata_driver.BIT_STB_WRITE_LOCAL_BUFFER)
+        self.registers[offset] = value
+        if offset == sata_driver.HARD_DRIVE_COMMAND:
+            self._command(value)
+
+    def read(self, offset, length, disable_auto_inc = False):
+        if offset < sata_driver.SATA_BUFFER_OFFSET:
+            return super(SATAModel, self).read(offset, length, disable_auto_inc)
+        start = (offset - sata_driver.SATA_BUFFER_OFFSET) * 4
+        data = self.buffer[start:start + (length * 4)]
+        data.extend([0] * ((length * 4) - len(data)))
+        return data
+
+    def write(self, offset, data, disable_auto_inc = False):
+        if offset < sata_driver.SATA_BUFFER_OFFSET:
+            return super(SATAModel, self).write(offset, data, disable_auto_inc)
+        start = (offset - sata_driver.SATA_BUFFER_OFFSET) * 4
+        end = min(start + len(data), len(self.buffer))
+        self.buffer[start:end] = Array('B', data[0:end - start])
+
+class BehavioralNysa(Nysa):
+    """
+    Nysa board simulated in Python
+
+    Args:
+        config (Dictionary or String): device configuration (or the name of
+            the JSON file) the SDB is generated from with GenSDB, this needs
+            the board package and the verilog of every core
+        som (SOM): use this SDB object model instead of a configuration
+        rom (Array of bytes): use this SDB ROM instead of a configuration
+        models (Dictionary): URN or device name -> RegisterModel
+        status (Status): status object for debug messages
+        user_paths (List of Strings): paths GenSDB searches for cores
+    """
+
+    def __init__(self,
+                 config = None,
+                 som = None,
+                 rom = None,
+                 models = {},
+                 status = None,
+                 user_paths = []):
+        if status is None:
+            status = Status()
+            status.set_level("fatal")
+        super(BehavioralNysa, self).__init__(status)
+        self.name = BEHAVIORAL_BOARD_NAME
+        if rom is None:
+            if som is None:
+                if config is None:
+                    raise NysaError("A configuration, SOM or ROM is required")
+                if not isinstance(config, dict):
+                    config = json.load(open(config), object_pairs_hook = OrderedDict)
+                from nysa.ibuilder.lib.gen_scripts.gen_sdb import GenSDB
+                som = GenSDB().gen_som(config, user_paths = user_paths, debug = False)
+            rom = generate_rom_image(som)
+
+        self.rom = rom
+        self.rom_words = len(rom) / 4
+        self.lock = threading.RLock()
+        self.interrupt_event = threading.Event()
+        self.callbacks = {}
+        self.pending_interrupts = []
+        self.models = {}
+        self.routes = {}
+        self.read_sdb()
+
+        for key in models:
+            self.set_model(key, models[key])
+
+    #SDB
+    def read_sdb(self, use_cache = False):
+        data = super(BehavioralNysa, self).read_sdb(use_cache)
+        self.mem_addr = self.nsm.get_address_of_memory_bus()
+        self._build_routes()
+        return data
+
+    def get_sdb_base_address(self):
+        return 0
+
+    def _build_routes(self):
+        index = self.nsm.get_index()
+        for urn in index.device_urns:
+            if urn in self.models:
+                continue
+            if urn.startswith(MEMORY_BUS + "/"):
+                self._attach(urn, MemoryModel())
+            else:
+                self._attach(urn, RegisterModel())
+
+        self.routes = {}
+        for bus_urn in [PERIPHERAL_BUS, MEMORY_BUS]:
+            entries = []
+            for start, end, urn in index.intervals.get(bus_urn, []):
+                if bus_urn == PERIPHERAL_BUS:
+                    #The interconnect only decodes the upper address bits
+                    end = None
+                else:
+                    end = start + self.nsm.get_device_size(urn) - 1
+                entries.append((start, end, urn))
+            self.routes[bus_urn] = ([e[0] for e in entries], entries)
+
+    def _attach(self, urn, model):
+        model.attach(self, urn, self.nsm.get_device_index_in_bus(urn))
+        self.models[urn] = model
+
+    def _find_urn(self, key):
+        index = self.nsm.get_index()
+        if key in index.device_urns:
+            return key
+        for urn in index.device_urns:
+            if self.nsm.get_device_name(urn) == key:
+                return urn
+        raise NysaError("Device %s not found in the SDB" % key)
+
+    #Models
+    def set_model(self, key, model):
+        """
+        Put a model on the bus in place of the device
+
+        Args:
+            key (String): URN or name of the device
+            model (RegisterModel): behavioral model of the device
+
+        Returns:
+            Nothing
+
+        Raises:
+            NysaError: the device is not in the SDB
+        """
+        with self.lock:
+            self._attach(self._find_urn(key), model)
+
+    def get_model(self, key):
+        """
+        Returns the model of a device
+
+        Args:
+            key (String): URN or name of the device
+
+        Returns:
+            (RegisterModel)
+
+        Raises:
+            NysaError: the device is not in the SDB
+        """
+        return self.models[self._find_urn(key)]
+
+    def _route(self, address):
+        bus_urn = PERIPHERAL_BUS
+        if address >= self.mem_addr:
+            bus_urn = MEMORY_BUS
+            address -= self.mem_addr
+
+        starts, entries = self.routes[bus_urn]
+        pos = bisect_right(starts, address) - 1
+        if pos < 0:
+            raise NysaCommError("No device at address 0x%08X on %s" % (address, bus_urn))
+        start, end, urn = entries[pos]
+        if end is not None and address > end:
+            raise NysaCommError("No device at address 0x%08X on %s" % (address, bus_urn))
+        return self.models[urn], address - start
+
+    #Communication
+    def read(self, address, length = 1, disable_auto_inc = False):
+        if (address + length) <= self.rom_words:
+            return self.rom[address * 4: (address + length) * 4]
+
+        with self.lock:
+            model, offset = self._route(address)
+            data = model.read(offset, length, disable_auto_inc)
+        self._dispatch_interrupts()
+        return data
+
+    def write(self, address, data, disable_auto_inc = False):
+        if len(data) == 0:
+            raise NysaCommError("Length of data to write is 0!")
+        data = Array('B', data)
+        while (len(data) % 4) > 0:
+            data.append(0)
+
+        with self.lock:
+            model, offset = self._route(address)
+            model.write(offset, data, disable_auto_inc)
+        self._dispatch_interrupts()
+
+    def ping(self):
+        return
+
+    def reset(self):
+        with self.lock:
+            for urn in self.models:
+                self.models[urn].reset()
+            self.interrupts = 0
+
+    def is_programmed(self):
+        return True
+
+    def get_board_name(self):
+        return BEHAVIORAL_BOARD_NAME
+
+    def upload(self, filepath):
+        return
+
+    def program(self):
+        return
+
+    def ioctl(self, name, arg = None):
+        raise NysaError("%s does not have an ioctl named %s" % (BEHAVIORAL_BOARD_NAME, name))
+
+    def list_ioctl(self):
+        return []
+
+    #Interrupts
+    def raise_interrupt(self, index):
+        """
+        Flag an interrupt from the device at 'index' of the peripheral bus,
+        the callbacks are called once the current transaction is finished
+
+        Args:
+            index (Integer): index of the device in the peripheral bus
+
+        Returns:
+            Nothing
+        """
+        with self.lock:
+            self.interrupts |= (1 << index)
+            self.pending_interrupts.append(index)
+        self.interrupt_event.set()
+
+    def _dispatch_interrupts(self):
+        if len(self.pending_interrupts) == 0:
+            return
+        with self.lock:
+            pending = self.pending_interrupts
+            self.pending_interrupts = []
+            callbacks = []
+            for index in pending:
+                for c in self.callbacks.get(index, []):
+                    if c not in callbacks:
+                        callbacks.append(c)
+        for c in callbacks:
+            c()
+
+    def acknowledge_interrupts(self):
+        with self.lock:
+            interrupts = self.interrupts
+            self.interrupts = 0
+        return interrupts
+
+    def wait_for_interrupts(self, wait_time = 1):
+        with self.lock:
+            if self.interrupts:
+                return True
+            self.interrupt_event.clear()
+        self.interrupt_event.wait(wait_time)
+        return self.interrupts != 0
+
+    def register_interrupt_callback(self, index, callback):
+        with self.lock:
+            if index not in self.callbacks:
+                self.callbacks[index] = []
+            if callback not in self.callbacks[index]:
+                self.callbacks[index].append(callback)
+
+    def unregister_interrupt_callback(self, index, callback = None):
+        with self.lock:
+            if index not in self.callbacks:
+                return
+            if callback is None:
+                del self.callbacks[index]
+            elif callback in self.callbacks[index]:
+                self.callbacks[index].remove(callback)
@@ -0,0 +1,165 @@
+# Distributed under the MIT licesnse.
+#Copyright (c) 2014 Dave McCoy (dave.mccoy@cospandesign.com)
+
+#Permission is hereby granted, free of charge, to any person obtaining a copy of
+#this software and associated documentation files (the "Software"), to deal in
+#the Software without restriction, including without limitation the rights to
+#use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+#of the Software, and to permit persons to whom the Software is furnished to do
+#so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
+
+
+import sys
+import time
+
+from nysa.host.platform_scanner import find_board
+from nysa.host.platform_scanner import PlatformScannerException
+from nysa.host.nysa import NysaCommError
+from nysa.host.driver.sf_camera import SFCamera
+
+NAME = "camera-stats"
+SCRIPT_NAME = "nysa %s" % NAME
+
+__author__ = "dave.mccoy@cospandesign.com (Dave McCoy)"
+
+DESCRIPTION = "run the camera of a board for a number of seconds and print " \
+              "the frame rate, the time spent reading frames and a histogram " \
+              "of the frame latency"
+
+EPILOG = "\n"
+
+HISTOGRAM_WIDTH = 50
+
+def setup_parser(parser):
+    parser.description = DESCRIPTION
+    parser.add_argument("name",
+                        type=str,
+                        nargs='?',
+                        default="any",
+                        help="Specify a board to use, if there is only one board attached leave blank (ignoring SIM)")
+
+    parser.add_argument("-s", "--serial",
+                        type=str,
+                        nargs=1,
+                        help="Specify the serial number or unique ID of the board")
+
+    parser.add_argument("-t", "--time",
+                        type=float,
+                        default=5.0,
+                        help="Number of seconds to run the camera (default 5)")
+
+    parser.add_argument("-b", "--bins",
+                        type=int,
+                        default=10,
+                        help="Number of bins in the latency histogram (default 10)")
+
+    parser.add_argument("-u", "--urn",
+                        type=str,
+                        nargs=1,
+                        help="URN of the camera if the board has more than one")
+
+    return parser
+
+def format_histogram(values, bins = 10, width = HISTOGRAM_WIDTH, scale = 1000.0, unit = "ms"):
+    """
+    Returns the lines of a text histogram of 'values'
+
+    Args:
+        values (List of floats): values to put into bins
+        bins (Integer): number of bins
+        width (Integer): number of characters of the longest bar
+        scale (float): values are multiplied by this before they are printed
+        unit (String): unit of the scaled values
+
+    Returns:
+        (List of Strings)
+    """
+    if len(values) == 0:
+        return ["No values"]
+    low = min(values)
+    high = max(values)
+    step = (high - low) / bins
+    if step == 0:
+        step = 1.0
+    counts = [0] * bins
+    for v in values:
+        i = int((v - low) / step)
+        if i >= bins:
+            i = bins - 1
+        counts[i] += 1
+
+    lines = []
+    most = max(counts)
+    for i in range(bins):
+        bar = "#" * int(round(float(counts[i]) * width / most))
+        lines.append("%8.3f - %8.3f %s: %6d %s" % ((low + (i * step)) * scale,
+                                                   (low + ((i + 1) * step)) * scale,
+                                                   unit,
+                                                   counts[i],
+                                                   bar))
+    return lines
+
+def camera_stats(args, status):
+    s = status
+    name = args.name
+    if name == "any":
+        name = None
+    serial = None
+    if args.serial is not None:
+        serial = args.serial[0]
+
+    try:
+        board = find_board(name, serial, status)
+    except PlatformScannerException as ex:
+        if s: s.Error("%s" % str(ex))
+        sys.exit(1)
+
+    try:
+        board.read_sdb()
+        if args.urn is not None:
+            urn = args.urn[0]
+        else:
+            urns = board.find_device(SFCamera)
+            if len(urns) == 0:
+                if s: s.Error("Board does not have a camera")
+                sys.exit(1)
+            urn = urns[0]
+
+        camera = SFCamera(board, urn)
+        camera.enable_camera(True)
+        camera.reset_statistics()
+        camera.start_async_reader(lambda: None)
+        end = time.time() + args.time
+        while time.time() < end:
+            camera.read_async_image(block = True, timeout = end - time.time())
+        camera.stop_async_reader()
+        camera.enable_camera(False)
+    except NysaCommError as e:
+        print "Communication Error: %s" % str(e)
+        sys.exit(1)
+
+    stats = camera.get_statistics()
+    print "Camera: %s (%d x %d)" % (urn, camera.get_width(), camera.get_height())
+    print "Frames:              %d" % stats["frames"]
+    print "Frames per second:   %.2f" % stats["fps"]
+    print "Overrun frames:      %d" % stats["overruns"]
+    print "Time in read_memory: %.3f s (%.3f ms per frame)" % (stats["read_memory_time"],
+                                                                stats["read_memory_average"] * 1000)
+    print "Latency:             min %.3f ms, average %.3f ms, max %.3f ms" % (stats["latency_min"] * 1000,
+                                                                                stats["latency_average"] * 1000,
+                                                                                stats["latency_max"] * 1000)
+    print ""
+    print "Latency histogram:"
+    for line in format_histogram(stats["latencies"], args.bins):
+        print line
@@ -24,6 +24,7 @@
 import os
 
 from nysa.host.platform_scanner import PlatformScanner
+from nysa.host.platform_scanner import scan_platforms
 
 NAME = "boards"
 SCRIPT_NAME = "nysa %s" % NAME
@@ -65,11 +66,9 @@ def list_boards(args, status):
     pc = PlatformScanner(s)
     pc.get_board_path_dict()
     platform_class_dict = pc.get_platforms()
-    for platform in platform_class_dict:
+    for platform, p, dev_dict in scan_platforms(platform_class_dict, s):
         if s: s.Debug("%s, class: %s" % (platform, str(platform_class_dict[platform])))
         print "Scanning %s%s%s..." % (blue, platform, white),
-        p = platform_class_dict[platform](s)
-        dev_dict = p.scan()
         if len(dev_dict) > 0:
             print "Found %d board(s)" % len(dev_dict)
             for plat in dev_dict:
@@ -38,6 +38,8 @@ import program_board
 import upload_board
 import list_platforms
 import sdb_viewer
+import camera_stats
+import sata_bench
 import init
 import install_platform
 import install_verilog_modules
@@ -113,6 +115,16 @@ TOOL_DICT = collections.OrderedDict([
         "module": sdb_viewer,
         "tool": sdb_viewer.view_sdb
     }),
+    (camera_stats.NAME,{
+        "type": "host",
+        "module": camera_stats,
+        "tool": camera_stats.camera_stats
+    }),
+    (sata_bench.NAME,{
+        "type": "host",
+        "module": sata_bench,
+        "tool": sata_bench.sata_bench
+    }),
     (init.NAME,{
         "type": "utility",
         "module": init,
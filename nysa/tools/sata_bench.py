@@ -0,0 +1,303 @@
+# Distributed under the MIT licesnse.
+#Copyright (c) 2015 Dave McCoy (dave.mccoy@cospandesign.com)
+
+#Permission is hereby granted, free of charge, to any person obtaining a copy of
+#this software and associated documentation files (the "Software"), to deal in
+#the Software without restriction, including without limitation the rights to
+#use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+#of the Software, and to permit persons to whom the Software is furnished to do
+#so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
+
+
+import sys
+import math
+import time
+import random
+from array import array as Array
+
+from nysa.host.platform_scanner import find_board
+from nysa.host.platform_scanner import PlatformScannerException
+from nysa.host.nysa import NysaCommError
+from nysa.host.driver.sata_driver import SATADriver
+from nysa.host.driver.sata_driver import SATABlockDevice
+from nysa.host.driver.sata_driver import SATAError
+from nysa.host.driver.sata_driver import SECTOR_SIZE
+from nysa.host.driver.sata_driver import MAX_COMMAND_SECTORS
+from nysa.host.driver.sata_driver import COSPANDESIGN_SATA_ID
+
+NAME = "sata-bench"
+SCRIPT_NAME = "nysa %s" % NAME
+
+__author__ = "dave.mccoy@cospandesign.com (Dave McCoy)"
+
+DESCRIPTION = "measure the throughput, IOPS and latency of the SATA core " \
+              "with sequential and random reads and writes"
+
+EPILOG = "\n" \
+         "Write patterns destroy the data on the drive, they only run on a\n" \
+         "board when --allow-write is given\n" \
+         "\n" \
+         "Use --sim to run against a drive in memory, this measures the host\n" \
+         "side (driver and block device) without a board\n" \
+         "\n" \
+         "Examples:\n" \
+         "\tBenchmark the in memory drive with 8 and 64 sector blocks\n" \
+         "\t\t%s --sim -b 8 64\n" \
+         "\n" \
+         "\tRandom reads through a 4096 sector cache\n" \
+         "\t\t%s -p randread -c 4096\n" % (SCRIPT_NAME, SCRIPT_NAME)
+
+PATTERNS = ["seqread", "seqwrite", "randread", "randwrite"]
+PERCENTILES = [50, 90, 99]
+
+def setup_parser(parser):
+    parser.description = DESCRIPTION
+    parser.epilog = EPILOG
+    parser.add_argument("name",
+                        type=str,
+                        nargs='?',
+                        default="any",
+                        help="Specify a board to use, if there is only one board attached leave blank (ignoring SIM)")
+
+    parser.add_argument("-s", "--serial",
+                        type=str,
+                        nargs=1,
+                        help="Specify the serial number or unique ID of the board")
+
+    parser.add_argument("-u", "--urn",
+                        type=str,
+                        nargs=1,
+                        help="URN of the SATA core if the board has more than one")
+
+    parser.add_argument("--sim",
+                        action="store_true",
+                        help="Use a hard drive in memory instead of a board")
+
+    parser.add_argument("-p", "--pattern",
+                        type=str,
+                        nargs='+',
+                        choices=PATTERNS,
+                        default=PATTERNS,
+                        help="Access patterns to run (default all)")
+
+    parser.add_argument("-b", "--block",
+                        type=int,
+                        nargs='+',
+                        default=[8],
+                        help="Sectors in each request (default 8)")
+
+    parser.add_argument("-n", "--count",
+                        type=int,
+                        default=256,
+                        help="Number of requests in each run (default 256)")
+
+    parser.add_argument("-c", "--cache",
+                        type=int,
+                        default=0,
+                        help="Go through a block device with a cache of this many sectors (default 0: no block device)")
+
+    parser.add_argument("--start",
+                        type=int,
+                        default=0,
+                        help="First sector used by the benchmark (default 0)")
+
+    parser.add_argument("--region",
+                        type=int,
+                        default=0x10000,
+                        help="Number of sectors used by the benchmark (default 0x10000)")
+
+    parser.add_argument("--allow-write",
+                        action="store_true",
+                        help="Allow the write patterns to run on a board")
+
+    return parser
+
+def create_sim_board(sector_count):
+    """
+    Create a behavioral board with a SATA core and an in memory hard drive
+
+    Args:
+        sector_count (Long): size of the hard drive in sectors
+
+    Returns:
+        (BehavioralNysa): board, the SATA core is '/top/peripheral/sata'
+    """
+    from nysa.host.sim.behavioral_host import BehavioralNysa
+    from nysa.host.sim.behavioral_host import SATAModel
+    from nysa.host.sim.behavioral_host import create_som
+
+    s = create_som([("sata", "storage manager", 0x400, COSPANDESIGN_SATA_ID)])
+    return BehavioralNysa(som = s, models = {"sata": SATAModel(sector_count)})
+
+def percentile(values, percent):
+    """
+    Returns the nearest rank percentile of the values
+
+    Args:
+        values (List of floats): sorted values
+        percent (Integer): 0 - 100
+
+    Returns:
+        (Float): value, 0 if there are no values
+    """
+    if len(values) == 0:
+        return 0.0
+    rank = int(math.ceil(percent / 100.0 * len(values))) - 1
+    return values[max(0, min(rank, len(values) - 1))]
+
+def run_benchmark(read, write, pattern, block, count, start, region, flush = None, seed = 0):
+    """
+    Run one access pattern
+
+    The drive works on one command at a time so the requests are issued one
+    after the other, the latency of a request is the time of its command
+
+    Args:
+        read (Function): read(lba, sectors) returns the data
+        write (Function): write(lba, data)
+        pattern (String): one of PATTERNS
+        block (Integer): sectors in each request
+        count (Integer): number of requests
+        start (Long): first sector used
+        region (Long): number of sectors used
+        flush (Function): called after the last request, inside the timed
+            region, so data a cache holds back is counted once it is on the
+            drive
+        seed (Integer): seed of the random patterns
+
+    Returns (Dictionary):
+        bytes: bytes transferred
+        elapsed: seconds
+        mbps: megabytes (10^6) per second
+        iops: requests per second
+        latencies: sorted list of the latency of each request in seconds
+    """
+    if block > region:
+        raise SATAError("Block (%d sectors) is larger than the region (%d sectors)" % (block, region))
+    blocks = region / block
+    if pattern.startswith("rand"):
+        r = random.Random(seed)
+        lbas = [start + (r.randrange(blocks) * block) for i in range(count)]
+    else:
+        lbas = [start + ((i % blocks) * block) for i in range(count)]
+    is_write = pattern.endswith("write")
+    data = Array('B', [i & 0xFF for i in range(block * SECTOR_SIZE)])
+
+    latencies = []
+    begin = time.time()
+    for lba in lbas:
+        issue = time.time()
+        if is_write:
+            write(lba, data)
+        else:
+            read(lba, block)
+        latencies.append(time.time() - issue)
+    if flush is not None:
+        flush()
+    elapsed = time.time() - begin
+
+    latencies.sort()
+    total = len(latencies) * block * SECTOR_SIZE
+    if elapsed == 0:
+        elapsed = 1e-9
+    return {"bytes": total,
+            "elapsed": elapsed,
+            "mbps": total / elapsed / 1000000.0,
+            "iops": len(latencies) / elapsed,
+            "latencies": latencies}
+
+def format_result(pattern, block, result):
+    line = "%-10s %8.1f %10.3f %10.1f" % (pattern,
+                                         block * SECTOR_SIZE / 1024.0,
+                                         result["mbps"],
+                                         result["iops"])
+    for p in PERCENTILES:
+        line += " %9.3f" % (percentile(result["latencies"], p) * 1000)
+    line += " %9.3f" % (result["latencies"][-1] * 1000 if result["latencies"] else 0)
+    return line
+
+def sata_bench(args, status):
+    s = status
+    for block in args.block:
+        if (block <= 0) or (block > MAX_COMMAND_SECTORS):
+            if s: s.Error("Block size must be between 1 and 0x%X sectors: %d" % (MAX_COMMAND_SECTORS, block))
+            sys.exit(1)
+
+    patterns = args.pattern
+    if not args.sim and not args.allow_write:
+        writes = [p for p in patterns if p.endswith("write")]
+        if len(writes) > 0:
+            if s: s.Warning("Skipping %s, write patterns destroy data on the drive, use --allow-write" % ", ".join(writes))
+        patterns = [p for p in patterns if not p.endswith("write")]
+
+    if args.sim:
+        board = create_sim_board(args.start + args.region)
+    else:
+        name = args.name
+        if name == "any":
+            name = None
+        serial = None
+        if args.serial is not None:
+            serial = args.serial[0]
+        try:
+            board = find_board(name, serial, status)
+        except PlatformScannerException as ex:
+            if s: s.Error("%s" % str(ex))
+            sys.exit(1)
+
+    try:
+        board.read_sdb()
+        if args.urn is not None:
+            urn = args.urn[0]
+        else:
+            urns = board.find_device(SATADriver)
+            if len(urns) == 0:
+                if s: s.Error("Board does not have a SATA core")
+                sys.exit(1)
+            urn = urns[0]
+
+        sata = SATADriver(board, urn)
+        block_device = None
+        if args.cache > 0:
+            block_device = SATABlockDevice(sata,
+                                           cache_sectors = args.cache,
+                                           readahead = min(256, args.cache - 1))
+            read = block_device.read_blocks
+            def write(lba, data):
+                block_device.write_blocks(lba, data)
+            flush = block_device.flush
+        else:
+            read = sata.read_sectors
+            write = sata.write_sectors
+            flush = None
+
+        print "SATA: %s%s" % (urn, " (in memory drive)" if args.sim else "")
+        print "%-10s %8s %10s %10s %9s %9s %9s %9s" % ("Pattern", "KB", "MB/s", "IOPS",
+                                                       "p50 ms", "p90 ms", "p99 ms", "max ms")
+        for pattern in patterns:
+            for block in args.block:
+                if block_device is not None:
+                    block_device.invalidate()
+                    block_device.reset_statistics()
+                result = run_benchmark(read, write, pattern, block,
+                                       args.count, args.start, args.region, flush)
+                print format_result(pattern, block, result)
+                if block_device is not None:
+                    stats = block_device.get_statistics()
+                    print "%-10s hits: %d misses: %d read commands: %d write commands: %d" % \
+                            ("", stats["hits"], stats["misses"],
+                             stats["read_commands"], stats["write_commands"])
+    except (NysaCommError, SATAError) as e:
+        print "Error: %s" % str(e)
+        sys.exit(1)
@@ -1,4 +1,8 @@
 import os
+from array import array as Array
+
+from nysa.host.nysa import Nysa
+from nysa.common.status import Status
 
 
 def save_file(filename, content):
@@ -6,3 +10,28 @@ def save_file(filename, content):
     f = open(fpath, "w")
     f.write(content)
     f.close()
+
+class MemoryNysa(Nysa):
+    """A Nysa board that is a flat array of 32-bit registers"""
+
+    def __init__(self):
+        s = Status()
+        s.set_level("fatal")
+        super(MemoryNysa, self).__init__(s)
+        self.registers = {}
+        self.log = []
+
+    def read(self, address, length = 1, disable_auto_inc = False):
+        self.log.append(("read", address, length))
+        data = Array('B')
+        for i in range(length):
+            a = address if disable_auto_inc else address + i
+            value = self.registers.get(a, 0)
+            data.extend([(value >> 24) & 0xFF, (value >> 16) & 0xFF, (value >> 8) & 0xFF, value & 0xFF])
+        return data
+
+    def write(self, address, data, disable_auto_inc = False):
+        self.log.append(("write", address, len(data) / 4))
+        for i in range(0, len(data), 4):
+            a = address if disable_auto_inc else address + (i / 4)
+            self.registers[a] = (data[i] << 24) | (data[i + 1] << 16) | (data[i + 2] << 8) | data[i + 3]
@@ -0,0 +1,88 @@
+#!/usr/bin/python
+
+import unittest
+import sys
+import os
+import threading
+from array import array as Array
+
+sys.path.append(os.path.join(os.path.dirname(__file__),
+                             os.pardir,
+                             os.pardir))
+
+from nysa.host.async_nysa import AsyncNysa
+from nysa.host.sim.behavioral_host import BehavioralNysa
+from nysa.host.sim.behavioral_host import create_som
+from nysa.host.sim.behavioral_host import GPIOModel
+from nysa.host.driver.gpio import GPIO
+
+class Test (unittest.TestCase):
+    """Unit test for the non blocking front end"""
+
+    def setUp(self):
+        self.model = GPIOModel()
+        self.n = BehavioralNysa(som = create_som([("gpio1", "gpio", 8)], [("mem1", 0x1000)]),
+                                models = {"gpio1": self.model})
+        self.gpio = GPIO(self.n, "/top/peripheral/gpio1")
+        self.a = AsyncNysa(self.n)
+        self.a.start()
+
+    def tearDown(self):
+        self.a.stop()
+        self.n.stop_interrupt_dispatcher()
+
+    def test_memory(self):
+        data = Array('B', range(16))
+        w = self.a.write_memory(0x10, data)
+        r = self.a.read_memory(0x10, 4)
+        self.assertEqual(w.get_result(1), None)
+        self.assertEqual(r.get_result(1), data)
+
+    def test_order_and_callback(self):
+        threads = []
+        def record(request):
+            threads.append(threading.current_thread())
+        for i in range(8):
+            self.a.write_register(self.gpio.base_addr + 1, i, callback = record)
+        r = self.a.read_register(self.gpio.base_addr + 1, callback = record)
+        self.assertEqual(r.get_result(1), 7)
+        self.assertEqual(len(threads), 9)
+        self.assertEqual(set(threads), set([self.a.thread]))
+
+    def test_driver(self):
+        gpio = self.a.wrap(self.gpio)
+        self.assertEqual(gpio.peripheral_index, self.gpio.peripheral_index)
+        gpio.set_port_direction(0x0F).get_result(1)
+        gpio.set_port_raw(0xFF).get_result(1)
+        self.assertEqual(self.model.get_outputs(), 0x0F)
+        self.assertRaises(Exception, gpio.set_interrupt_enable().get_result, 1)
+
+    def test_interrupt(self):
+        gpio = self.a.wrap(self.gpio)
+        gpio.set_interrupt_enable(0x01).get_result(1)
+        gpio.set_interrupt_edge(0x01).get_result(1)
+        index = self.gpio.peripheral_index
+        self.assertEqual(self.a.wait_for_interrupt(index, 0.01).get_result(1), None)
+        threads = threading.active_count()
+        r = self.a.wait_for_interrupt(index, 2)
+        r2 = self.a.wait_for_interrupt(index + 1, 0.05)
+        #Interrupts are read by the I/O thread, not by a thread of their own
+        self.assertEqual(threading.active_count(), threads)
+        self.assertTrue(self.n.interrupt_dispatcher is None)
+        self.assertEqual(r2.get_result(1), None)
+        self.model.set_inputs(0x01)
+        self.assertTrue(r.get_result(3) is not None)
+        self.assertEqual(self.a.waiters, [])
+
+    def test_stop_with_waiter(self):
+        r = self.a.wait_for_interrupt(self.gpio.peripheral_index, 10)
+        self.a.stop()
+        self.assertTrue(r.is_done())
+        self.assertEqual(r.get_result(), None)
+
+    def test_stopped(self):
+        self.a.stop()
+        self.assertRaises(Exception, self.a.read_register, 0)
+
+if __name__ == "__main__":
+    unittest.main()
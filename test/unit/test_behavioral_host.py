@@ -0,0 +1,115 @@
+#!/usr/bin/python
+
+import unittest
+import sys
+import os
+from array import array as Array
+
+sys.path.append(os.path.join(os.path.dirname(__file__),
+                             os.pardir,
+                             os.pardir))
+
+from nysa.host.sim.behavioral_host import BehavioralNysa
+from nysa.host.sim.behavioral_host import create_som
+from nysa.host.sim.behavioral_host import GPIOModel
+from nysa.host.sim.behavioral_host import UARTModel
+from nysa.host.sim.behavioral_host import DMAReaderModel
+from nysa.host.sim.behavioral_host import DMAWriterModel
+from nysa.host.driver.gpio import GPIO
+from nysa.host.driver import uart
+from nysa.host.driver import driver
+
+class DMADevice(driver.Driver):
+    def __del__(self):
+        pass
+
+class Test (unittest.TestCase):
+    """Unit test for the behavioral board"""
+
+    def setUp(self):
+        self.gpio = GPIOModel()
+        self.uart = UARTModel()
+        s = create_som([("gpio1", "gpio", 8),
+                        ("uart1", "uart", 8),
+                        ("reader", None, 8),
+                        ("writer", None, 8)],
+                       [("mem1", 0x10000)])
+        self.n = BehavioralNysa(som = s,
+                                models = {"gpio1": self.gpio,
+                                          "/top/peripheral/uart1": self.uart})
+
+    def test_sdb(self):
+        self.assertEqual(self.n.get_device_address("/top/peripheral/gpio1"), 0x01000000)
+        self.assertEqual(self.n.nsm.get_address_of_memory_bus(), 0x0100000000)
+        self.assertEqual(self.n.get_model("gpio1"), self.gpio)
+        self.assertRaises(Exception, self.n.get_model, "bill")
+
+    def test_gpio(self):
+        g = GPIO(self.n, "/top/peripheral/gpio1")
+        calls = []
+        g.register_interrupt_callback(lambda: calls.append(1))
+        g.set_port_direction(0x0F)
+        g.set_port_raw(0xFF)
+        self.assertEqual(self.gpio.get_outputs(), 0x0F)
+        self.gpio.set_inputs(0x30)
+        self.assertEqual(g.get_port_raw(), 0x3F)
+
+        g.set_interrupt_enable(0x10)
+        g.set_interrupt_edge(0x10)
+        self.gpio.set_inputs(0x00)
+        self.assertEqual(calls, [])
+        self.gpio.set_inputs(0x10)
+        g.read_register(0)
+        self.assertEqual(calls, [1])
+        self.assertTrue(g.wait_for_interrupts(0))
+        self.assertEqual(g.get_interrupts(), 0x10)
+        self.assertEqual(g.get_interrupts(), 0x00)
+
+    def test_uart(self):
+        u = DMADevice(self.n, "/top/peripheral/uart1", False)
+        u.write(uart.WRITE_DATA, Array('B', [0x00, 0x03, 0x41, 0x42, 0x43]))
+        self.assertEqual(self.uart.transmitted, bytearray("ABC"))
+        self.uart.receive("hello")
+        self.assertEqual(u.read_register(uart.READ_COUNT), 5)
+        u.write_register(uart.READ_COUNT, 5)
+        self.assertEqual(u.read(uart.READ_DATA, 2)[0:5].tostring(), "hello")
+        self.assertEqual(u.read_register(uart.READ_COUNT), 0)
+
+    def test_memory(self):
+        data = Array('B', range(16))
+        self.n.write_memory(0x100, data)
+        self.assertEqual(self.n.read_memory(0x100, 4), data)
+        self.assertEqual(self.n.read_memory(0x200, 1), Array('B', [0, 0, 0, 0]))
+        self.assertRaises(Exception, self.n.read_memory, 0x10000, 1)
+
+    def test_dma_writer(self):
+        self.n.set_model("writer", DMAWriterModel())
+        d = DMADevice(self.n, "/top/peripheral/writer", False)
+        dma = driver.DMAWriteController(d, 0x0000, 0x1000, 0x20, 1, 2, 3, 4, 5)
+        data = Array('B', [i & 0xFF for i in range(0x50)])
+        dma.write(data)
+        self.assertEqual(self.n.get_model("writer").received, data)
+
+    def test_dma_reader(self):
+        blocks = [Array('B', [i] * 16) for i in range(3)]
+        reader = DMAReaderModel(source = lambda length: blocks.pop(0) if blocks else None)
+        self.n.set_model("reader", reader)
+        d = DMADevice(self.n, "/top/peripheral/reader", False)
+        dma = driver.DMAReadController(d, 0x0000, 0x1000, 4, 1, 2, 3, 4, 5, timeout = 0)
+        self.assertEqual(dma.read(anticipate = True), Array('B'))
+        self.assertEqual(dma.read(anticipate = True), Array('B', [0] * 16))
+        self.assertEqual(dma.read(anticipate = True), Array('B', [1] * 16))
+        self.assertEqual(dma.read(anticipate = True), Array('B', [2] * 16))
+        self.assertEqual(dma.read(anticipate = True), Array('B'))
+        blocks.append(Array('B', [3] * 16))
+        self.assertEqual(reader.fill(), 1)
+        self.assertEqual(dma.read(), Array('B', [3] * 16))
+
+    def test_reset(self):
+        g = GPIO(self.n, "/top/peripheral/gpio1")
+        g.set_port_direction(0x0F)
+        self.n.reset()
+        self.assertEqual(g.get_port_direction(), 0)
+
+if __name__ == "__main__":
+    unittest.main()
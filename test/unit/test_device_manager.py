@@ -0,0 +1,53 @@
+#!/usr/bin/python
+
+import unittest
+import sys
+import os
+import json
+import shutil
+import tempfile
+
+sys.path.append(os.path.join(os.path.dirname(__file__),
+                             os.pardir,
+                             os.pardir))
+
+from nysa.cbuilder import device_manager
+
+class Test (unittest.TestCase):
+    """Unit test for the device registry"""
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.filename = os.path.join(self.path, "devices.json")
+        self.original = device_manager.LOCAL_DEVICE_LIST
+        device_manager.LOCAL_DEVICE_LIST = self.filename
+        self.write_devices({"GPIO": {"ID": "0x02"}, "UART": {"ID": "0x03"}}, 1000)
+
+    def tearDown(self):
+        device_manager.LOCAL_DEVICE_LIST = self.original
+        shutil.rmtree(self.path)
+
+    def write_devices(self, devices, mtime):
+        f = open(self.filename, "w")
+        json.dump({"devices": devices}, f)
+        f.close()
+        os.utime(self.filename, (mtime, mtime))
+
+    def test_lookups(self):
+        self.assertEqual(device_manager.get_device_id_from_name(" gpio "), 2)
+        self.assertEqual(device_manager.get_device_name_from_id(3), "UART")
+        self.assertEqual(device_manager.get_device_name_from_id(9), "Unknown Device")
+        self.assertRaises(Exception, device_manager.get_device_id_from_name, "bill")
+        self.assertEqual(device_manager.get_device_type(1), "UART")
+
+    def test_reload_on_change(self):
+        self.assertEqual(device_manager.get_device_name_from_id(4), "Unknown Device")
+        self.write_devices({"GPIO": {"ID": "0x02"}, "SPI": {"ID": "0x04"}}, 2000)
+        self.assertEqual(device_manager.get_device_name_from_id(4), "SPI")
+
+    def test_device_list_is_a_copy(self):
+        device_manager.get_device_list()[0]["name"] = "bill"
+        self.assertEqual(device_manager.get_device_list()[0]["name"], "GPIO")
+
+if __name__ == "__main__":
+    unittest.main()
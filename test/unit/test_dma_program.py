@@ -0,0 +1,109 @@
+#!/usr/bin/python
+
+import unittest
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__),
+                             os.pardir,
+                             os.pardir))
+
+from nysa.host.sim.behavioral_host import BehavioralNysa
+from nysa.host.sim.behavioral_host import create_som
+from nysa.host.sim.behavioral_host import RegisterModel
+from nysa.host.driver import dma
+
+def double_buffer():
+    p = dma.DMAProgram()
+    p.add_transfer(0x10, 0x1000, 0x80, name = "in0", next = "in1", ingress = "out0")
+    p.add_transfer(0x10, 0x2000, 0x80, name = "in1", next = "in0", ingress = "out1")
+    p.add_transfer(0x1000, 0x100000020, 0x80, name = "out0", next = "out1", egress = "in0")
+    p.add_transfer(0x2000, 0x100000020, 0x80, name = "out1", next = "out0", egress = "in1")
+    p.add_channel(0, "in0", 2)
+    p.add_channel(1, "out0", 1)
+    return p
+
+class Test (unittest.TestCase):
+    """Unit test for the DMA program builder"""
+
+    def setUp(self):
+        self.model = RegisterModel()
+        s = create_som([("dma", "dma", 0x100, dma.COSPAN_DESIGN_DMA_MODULE)])
+        self.n = BehavioralNysa(som = s, models = {"dma": self.model})
+        self.model.write_register(dma.CHANNEL_COUNT, 2)
+        self.model.write_register(dma.SINK_COUNT, 3)
+        self.dma = dma.DMA(self.n, "/top/peripheral/dma")
+        self.dma.setup()
+
+    def test_compile(self):
+        c = double_buffer().compile(start = 2)
+        self.assertEqual([slot for slot, words in c["instructions"]], [2, 3, 4, 5])
+        slot, words = c["instructions"][2]
+        self.assertEqual(words[0:5], [0x1000, 0, 0x20, 1, 0x80])
+        control = words[5]
+        self.assertEqual((control >> dma.BIT_INST_CMD_NEXT_BOT) & 0xF, 5)
+        self.assertTrue(control & (1 << dma.BIT_INST_CMD_CONTINUE))
+        self.assertTrue(control & (1 << dma.BIT_INST_CMD_BOND_EGRESS))
+        self.assertFalse(control & (1 << dma.BIT_INST_CMD_BOND_INGRESS))
+        self.assertEqual((control >> dma.BIT_INST_CMD_BOND_ADDR_OUT_BOT) & 0xF, 2)
+        self.assertEqual(c["channels"][1], (4, 1, True, False))
+
+    def test_compile_errors(self):
+        p = dma.DMAProgram(instruction_count = 2)
+        p.add_transfer(0, 0, 1, name = "a", next = "b")
+        self.assertRaises(Exception, p.compile)
+        self.assertRaises(Exception, p.add_transfer, 0, 0, 1, name = "a")
+        p.add_transfer(0, 0, 1, name = "b")
+        p.compile()
+        self.assertRaises(Exception, p.compile, 1)
+        p.add_transfer(0, 0, 1)
+        self.assertRaises(Exception, p.compile)
+
+    def test_load_program(self):
+        batches = []
+        process_batch = self.n.process_batch
+        def count_batch(transactions):
+            batches.append(len(transactions))
+            return process_batch(transactions)
+        self.n.process_batch = count_batch
+
+        self.assertEqual(self.dma.load_program(double_buffer()), [0, 1, 2, 3])
+        self.assertEqual(len(batches), 1)
+
+        self.assertEqual(self.dma.get_instruction_source_address(2), 0x1000)
+        self.assertEqual(self.dma.get_instruction_dest_address(3), 0x100000020)
+        self.assertEqual(self.dma.get_instruction_data_count(1), 0x80)
+        self.assertTrue(self.dma.is_instruction_continue(0))
+        self.assertTrue(self.dma.is_ingress_bond(1))
+        self.assertEqual(self.dma.get_instruction_ingress(1), 3)
+        self.assertEqual(self.dma.get_instruction_egress(3), 1)
+        self.assertEqual(self.dma.get_channel_sink_addr(0), 2)
+        self.assertEqual(self.dma.get_channel_instruction_pointer(1), 2)
+        self.assertTrue(self.dma.is_source_address_increment(1))
+        self.assertFalse(self.dma.is_channel_enable(0))
+
+    def test_load_program_range(self):
+        p = dma.DMAProgram()
+        p.add_transfer(0, 0, 1)
+        p.add_channel(2, 0, 0)
+        self.assertRaises(Exception, self.dma.load_program, p)
+        #Only the slots the program uses are checked against the core
+        p = dma.DMAProgram(instruction_count = dma.INSTRUCTION_COUNT + 4)
+        p.add_transfer(0, 0, 1)
+        p.add_transfer(0, 0, 1)
+        self.assertEqual(self.dma.load_program(p), [0, 1])
+        self.assertRaises(Exception, self.dma.load_program, p, dma.INSTRUCTION_COUNT - 1)
+
+    def test_load_program_overlap(self):
+        self.assertEqual(self.dma.load_program(double_buffer()), [0, 1, 2, 3])
+        p = dma.DMAProgram()
+        p.add_transfer(0, 0, 1)
+        p.add_transfer(0, 0, 1)
+        self.assertRaises(dma.DMAError, self.dma.load_program, p, 3)
+        self.assertEqual(self.dma.instruction_used, [0, 1, 2, 3])
+        self.assertEqual(self.dma.load_program(p, 4), [4, 5])
+        self.dma.release_program([0, 1, 2, 3])
+        self.assertEqual(self.dma.load_program(p), [0, 1])
+
+if __name__ == "__main__":
+    unittest.main()
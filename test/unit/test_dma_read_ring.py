@@ -0,0 +1,92 @@
+#!/usr/bin/python
+
+import unittest
+import sys
+import os
+import threading
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__),
+                             os.pardir,
+                             os.pardir))
+
+from nysa.host.driver.driver import DMAReadRing
+from nysa.host.driver.driver import NysaDMAException
+from nysa.host.driver.driver import DMA_RING_DROP_OLDEST
+from nysa.host.driver.driver import DMA_RING_DROP_NEWEST
+from nysa.host.driver.driver import DMA_RING_BLOCK
+from nysa.host.driver.driver import DMAReadStatistics
+
+class Test (unittest.TestCase):
+    """Unit test for the DMA read ring"""
+
+    def test_blocks_are_read_in_order(self):
+        ring = DMAReadRing(4)
+        for i in range(3):
+            ring.put([i])
+        self.assertEqual(ring.get(), (0, [0]))
+        self.assertEqual(ring.get(), (1, [1]))
+        self.assertEqual(ring.get(), (2, [2]))
+        self.assertEqual(ring.get(), (None, None))
+        self.assertEqual(ring.get_overrun_count(), 0)
+
+    def test_drop_oldest(self):
+        ring = DMAReadRing(2, DMA_RING_DROP_OLDEST)
+        for i in range(3):
+            ring.put([i])
+        self.assertEqual(ring.get_overrun_count(), 1)
+        self.assertEqual(ring.get(), (1, [1]))
+        self.assertEqual(ring.get(), (2, [2]))
+
+    def test_drop_newest(self):
+        ring = DMAReadRing(2, DMA_RING_DROP_NEWEST)
+        for i in range(3):
+            ring.put([i])
+        self.assertEqual(ring.get_overrun_count(), 1)
+        self.assertEqual(ring.get(), (0, [0]))
+        self.assertEqual(ring.get(), (1, [1]))
+        self.assertEqual(ring.get(), (None, None))
+
+    def test_block_waits_for_consumer(self):
+        ring = DMAReadRing(1, DMA_RING_BLOCK)
+        ring.put([0])
+        t = threading.Thread(target = ring.put, args = ([1],))
+        t.start()
+        self.assertEqual(ring.get(), (0, [0]))
+        self.assertEqual(ring.get(block = True, timeout = 1), (1, [1]))
+        t.join()
+        self.assertEqual(ring.get_overrun_count(), 0)
+
+    def test_close_releases_producer(self):
+        ring = DMAReadRing(1, DMA_RING_BLOCK)
+        ring.put([0])
+        t = threading.Thread(target = ring.put, args = ([1],))
+        t.start()
+        ring.close()
+        t.join()
+        self.assertEqual(ring.get_overrun_count(), 1)
+
+    def test_bad_depth(self):
+        self.assertRaises(NysaDMAException, DMAReadRing, 0)
+
+    def test_statistics(self):
+        stats = DMAReadStatistics(history = 2)
+        self.assertEqual(stats.get()["blocks"], 0)
+        stats.interrupt()
+        interrupt_time = stats.interrupt_time
+        stats.interrupt()
+        self.assertEqual(stats.interrupt_time, interrupt_time)
+        stats.add_block(interrupt_time + 0.5, interrupt_time + 1.0)
+        #No interrupt, the latency is the time of the read
+        stats.add_block(interrupt_time + 2.0, interrupt_time + 2.25)
+        stats.add_block(interrupt_time + 3.0, interrupt_time + 3.25)
+        d = stats.get()
+        self.assertEqual(d["blocks"], 3)
+        self.assertAlmostEqual(d["rate"], 2 / 2.25)
+        self.assertAlmostEqual(d["read_memory_time"], 1.0)
+        self.assertEqual(d["latencies"], [0.25, 0.25])
+        self.assertAlmostEqual(d["latency_max"], 0.25)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+#!/usr/bin/python
+
+import unittest
+import sys
+import os
+from array import array as Array
+
+sys.path.append(os.path.join(os.path.dirname(__file__),
+                             os.pardir,
+                             os.pardir))
+
+from nysa.host.driver.driver import DMAWriteController
+
+class FakeDevice(object):
+    """A core that always has both of its memory blocks free"""
+
+    def __init__(self):
+        self.memory = []
+        self.registers = {}
+
+    def read_register(self, address):
+        return 0x06
+
+    def write_register(self, address, value):
+        self.registers[address] = value
+
+    def write_memory(self, address, data):
+        self.memory.append((address, data))
+
+class Test (unittest.TestCase):
+    """Unit test for the DMA write controller"""
+
+    def setUp(self):
+        self.device = FakeDevice()
+        self.dma = DMAWriteController(device     = self.device,
+                                      mem_base0  = 0x0000,
+                                      mem_base1  = 0x1000,
+                                      size       = 16,
+                                      reg_status = 0,
+                                      reg_base0  = 1,
+                                      reg_size0  = 2,
+                                      reg_base1  = 3,
+                                      reg_size1  = 4)
+
+    def test_write_is_split_between_blocks(self):
+        buf = Array('B', range(40))
+        self.dma.write(buf)
+        self.assertEqual([m[0] for m in self.device.memory], [0x0000, 0x1000, 0x0000])
+        data = Array('B')
+        for m in self.device.memory:
+            data.extend(m[1])
+        self.assertEqual(data, buf)
+        self.assertEqual(self.device.registers[2], 2)
+        self.assertEqual(self.device.registers[4], 4)
+
+if __name__ == "__main__":
+    unittest.main()
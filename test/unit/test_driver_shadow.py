@@ -0,0 +1,70 @@
+#!/usr/bin/python
+
+import unittest
+import sys
+import os
+from array import array as Array
+
+sys.path.append(os.path.join(os.path.dirname(__file__),
+                             os.pardir,
+                             os.pardir))
+
+from nysa.host.driver import driver
+
+sys.path.append(os.path.join(os.path.dirname(__file__),
+                             os.pardir))
+from tutils import MemoryNysa
+
+CONTROL = 0
+GO_BIT = 0
+
+class DeviceNysa(MemoryNysa):
+    """A Nysa board with a single device at 0x100"""
+
+    def get_peripheral_device_index(self, urn):
+        return 1
+
+    def get_device_address(self, urn):
+        return 0x100
+
+class ShadowDriver(driver.Driver):
+    SHADOW_REGISTERS = {CONTROL: (1 << GO_BIT)}
+
+    def __del__(self):
+        pass
+
+class Test (unittest.TestCase):
+    """Unit test for the driver shadow registers"""
+
+    def setUp(self):
+        self.n = DeviceNysa()
+        self.n.registers[0x100] = 0x10
+        self.d = ShadowDriver(self.n, "/top/shadow", False)
+
+    def test_bit_operations_read_once(self):
+        self.d.set_register_bit(CONTROL, 1)
+        self.d.set_register_bit(CONTROL, 2)
+        self.d.clear_register_bit(CONTROL, 4)
+        self.assertEqual(self.n.registers[0x100], 0x06)
+        self.assertEqual([l[0] for l in self.n.log], ["read", "write", "write", "write"])
+
+    def test_volatile_bits_are_not_kept(self):
+        self.d.set_register_bit(CONTROL, GO_BIT)
+        self.assertEqual(self.n.registers[0x100], 0x11)
+        self.d.write_register_bit_range(CONTROL, 7, 5, 0x5)
+        self.assertEqual(self.n.registers[0x100], 0xB0)
+
+    def test_write_invalidates_shadow(self):
+        self.d.set_register_bit(CONTROL, 1)
+        self.d.write(CONTROL, Array('B', [0, 0, 0, 0x80]))
+        self.d.set_register_bit(CONTROL, 0)
+        self.assertEqual(self.n.registers[0x100], 0x81)
+
+    def test_disabled_shadow_reads_every_time(self):
+        self.d.enable_shadow_registers(False)
+        self.d.set_register_bit(CONTROL, 1)
+        self.d.set_register_bit(CONTROL, 2)
+        self.assertEqual([l[0] for l in self.n.log], ["read", "write", "read", "write"])
+
+if __name__ == "__main__":
+    unittest.main()
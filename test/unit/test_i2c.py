@@ -0,0 +1,80 @@
+#!/usr/bin/python
+
+import unittest
+import sys
+import os
+from array import array as Array
+
+sys.path.append(os.path.join(os.path.dirname(__file__),
+                             os.pardir,
+                             os.pardir))
+
+from nysa.host.driver import i2c
+from nysa.host.sim.behavioral_host import BehavioralNysa
+from nysa.host.sim.behavioral_host import create_som
+from nysa.host.sim.behavioral_host import RegisterModel
+
+class I2CModel(RegisterModel):
+    """Every command is acknowledged right away with an interrupt"""
+
+    def write_register(self, offset, value):
+        super(I2CModel, self).write_register(offset, value)
+        if offset == i2c.CONTROL:
+            #Reset and speed bits clear themselves
+            self.registers[offset] &= ~((1 << i2c.CONTROL_RESET) |
+                                        (1 << i2c.CONTROL_SET_100KHZ) |
+                                        (1 << i2c.CONTROL_SET_400KHZ))
+        if offset == i2c.COMMAND:
+            self.interrupt()
+
+def create_i2c():
+    s = create_som([("i2c1", "i2c", 8)])
+    return BehavioralNysa(som = s, models = {"i2c1": I2CModel()})
+
+class Test (unittest.TestCase):
+    """Unit test for the I2C driver transactions"""
+
+    def setUp(self):
+        self.n = create_i2c()
+        self.i2c = i2c.I2C(self.n, "/top/peripheral/i2c1")
+        self.log = []
+        read = self.n.read
+        write = self.n.write
+        base = self.i2c.base_addr
+
+        def log_read(address, length = 1, disable_auto_inc = False):
+            self.log.append(("read", address - base, length))
+            return read(address, length, disable_auto_inc)
+
+        def log_write(address, data, disable_auto_inc = False):
+            self.log.append(("write", address - base, len(data) / 4))
+            return write(address, data, disable_auto_inc)
+
+        self.n.read = log_read
+        self.n.write = log_write
+
+    def test_write_start(self):
+        self.i2c.write_to_i2c(0x10, Array('B', [0x01]))
+        #The control register comes from the shadow copy
+        self.assertEqual(self.log[:3], [("write", i2c.CONTROL, 1),
+                                        ("write", i2c.TRANSMIT, 1),
+                                        ("write", i2c.COMMAND, 1)])
+        self.assertFalse(("read", i2c.CONTROL, 1) in self.log)
+
+        #Interrupts are already enabled, the start is only two writes
+        self.log = []
+        self.i2c.write_to_i2c(0x10, Array('B', [0x01]))
+        self.assertEqual(self.log[:2], [("write", i2c.TRANSMIT, 1),
+                                        ("write", i2c.COMMAND, 1)])
+        self.assertEqual(len([l for l in self.log if l[1] == i2c.CONTROL]), 0)
+
+    def test_write_start_without_shadow(self):
+        self.i2c.enable_shadow_registers(False)
+        self.i2c.write_to_i2c(0x10, Array('B', [0x01]))
+        #Without the shadow copy the control register is read from the board
+        self.assertEqual(self.log[:2], [("read", i2c.CONTROL, 1),
+                                        ("read", i2c.CONTROL, 1)])
+        self.assertTrue(self.n.get_model("i2c1").registers[i2c.CONTROL] & (1 << i2c.CONTROL_INTERRUPT_EN))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+#!/usr/bin/python
+
+import unittest
+import sys
+import os
+import shutil
+import struct
+import tempfile
+import wave
+from array import array as Array
+
+sys.path.append(os.path.join(os.path.dirname(__file__),
+                             os.pardir,
+                             os.pardir))
+
+from nysa.host.driver import i2s
+from nysa.host.sim.behavioral_host import BehavioralNysa
+from nysa.host.sim.behavioral_host import create_som
+from nysa.host.sim.behavioral_host import DMAWriterModel
+
+def create_i2s(writer):
+    s = create_som([("i2s1", None, 8)], [("mem1", 0x01000000)])
+    n = BehavioralNysa(som = s, models = {"i2s1": writer})
+    return i2s.I2S(n, "/top/peripheral/i2s1")
+
+def words(data):
+    return list(struct.unpack(">%dI" % (len(data) / 4), data.tostring()))
+
+class Test (unittest.TestCase):
+    """Unit test for the I2S audio player"""
+
+    def setUp(self):
+        self.np = i2s.np
+
+    def tearDown(self):
+        i2s.np = self.np
+
+    def check_pack(self):
+        pcm = struct.pack("<4h", 1, -1, 0x7FFF, -0x8000)
+        self.assertEqual(words(i2s.pack_samples(pcm, 2, 2)),
+                         [0x000100, 0x80FFFF00, 0x7FFF00, 0x80800000])
+        pcm = "\x01\x00\x80" + "\xff\xff\x7f"
+        self.assertEqual(words(i2s.pack_samples(pcm, 3, 1)),
+                         [0x800001, 0x80800001, 0x7FFFFF, 0x807FFFFF])
+        self.assertEqual(words(i2s.pack_samples("\x80\x00", 1, 2)),
+                         [0x000000, 0x80800000])
+        self.assertEqual(words(i2s.pack_samples(struct.pack("<2i", 0x100, -0x100), 4, 2)),
+                         [0x000001, 0x80FFFFFF])
+        self.assertEqual(len(i2s.pack_samples("", 2, 2)), 0)
+
+    def test_pack_samples(self):
+        i2s.np = None
+        self.check_pack()
+
+    @unittest.skipIf(i2s.np is None, "NumPy is not installed")
+    def test_pack_samples_array(self):
+        self.check_pack()
+
+    def test_play_wav(self):
+        path = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(path, "test.wav")
+            w = wave.open(filename, "wb")
+            w.setnchannels(2)
+            w.setsampwidth(2)
+            w.setframerate(44100)
+            w.writeframes(struct.pack("<50h", *range(50)))
+            w.close()
+
+            writer = DMAWriterModel(reg_status = i2s.STATUS,
+                                    reg_base0 = i2s.MEM_0_BASE,
+                                    reg_size0 = i2s.MEM_0_SIZE,
+                                    reg_base1 = i2s.MEM_1_BASE,
+                                    reg_size1 = i2s.MEM_1_SIZE,
+                                    empty0 = i2s.STATUS_MEM_0_EMPTY,
+                                    empty1 = i2s.STATUS_MEM_1_EMPTY)
+            d = create_i2s(writer)
+            d.wdma.set_size(32)
+            player = d.play_wav(filename, set_sample_rate = False)
+            player.join(2)
+            self.assertIsNone(player.error)
+            self.assertFalse(player.is_playing())
+            self.assertEqual(player.blocks, 7)
+            expected = []
+            for i in range(0, 50, 2):
+                expected.extend([i << 8, (i + 1) << 8 | 0x80000000])
+            self.assertEqual(words(writer.received), expected)
+        finally:
+            shutil.rmtree(path)
+
+if __name__ == "__main__":
+    unittest.main()
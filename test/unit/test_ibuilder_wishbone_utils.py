@@ -6,12 +6,12 @@ import os
 import json
 
 sys.path.append(os.path.join(os.path.dirname(__file__),
+                             os.pardir,
                              os.pardir))
-from tutils import save_file
 
 sys.path.append(os.path.join(os.path.dirname(__file__),
-                             os.pardir,
                              os.pardir))
+from tutils import save_file
 
 from nysa.ibuilder.lib import wishbone_utils as wu
 from nysa.ibuilder.lib.wishbone_utils import WishboneTopGenerator
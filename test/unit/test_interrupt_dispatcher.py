@@ -0,0 +1,74 @@
+#!/usr/bin/python
+
+import unittest
+import sys
+import os
+import threading
+
+sys.path.append(os.path.join(os.path.dirname(__file__),
+                             os.pardir,
+                             os.pardir))
+
+from nysa.host.sim.behavioral_host import BehavioralNysa
+from nysa.host.sim.behavioral_host import create_som
+from nysa.host.sim.behavioral_host import GPIOModel
+from nysa.host.driver.gpio import GPIO
+
+class Test (unittest.TestCase):
+    """Unit test for the interrupt dispatcher"""
+
+    def setUp(self):
+        self.models = [GPIOModel(), GPIOModel()]
+        s = create_som([("gpio1", "gpio", 8), ("gpio2", "gpio", 8)])
+        self.n = BehavioralNysa(som = s,
+                                models = {"gpio1": self.models[0],
+                                          "gpio2": self.models[1]})
+        self.gpios = [GPIO(self.n, "/top/peripheral/gpio1"),
+                      GPIO(self.n, "/top/peripheral/gpio2")]
+        for g in self.gpios:
+            g.set_interrupt_enable(0x01)
+            g.set_interrupt_edge(0x01)
+        self.dispatcher = self.n.start_interrupt_dispatcher(poll_time = 0.01)
+
+    def tearDown(self):
+        self.n.stop_interrupt_dispatcher()
+
+    def toggle(self, i):
+        self.models[i].set_inputs(0x01)
+        self.models[i].set_inputs(0x00)
+
+    def test_concurrent_waits(self):
+        results = [None, None]
+        def wait(i):
+            results[i] = self.gpios[i].wait_for_interrupts(2)
+        threads = [threading.Thread(target = wait, args = (i,)) for i in range(2)]
+        for t in threads:
+            t.start()
+        self.toggle(1)
+        threads[1].join()
+        self.assertTrue(results[1])
+        self.assertTrue(threads[0].is_alive())
+        self.toggle(0)
+        threads[0].join()
+        self.assertTrue(results[0])
+
+    def test_not_lost(self):
+        index = self.gpios[0].peripheral_index
+        self.toggle(0)
+        event = self.dispatcher.get_event(index)
+        self.assertTrue(event.wait(1))
+        self.assertFalse(self.gpios[1].wait_for_interrupts(0))
+        timestamp = self.dispatcher.get_last_interrupt_time(index)
+        self.assertEqual(self.dispatcher.wait(index, 0), timestamp)
+        self.assertFalse(event.is_set())
+        self.assertEqual(self.dispatcher.wait(index, 0), None)
+        self.assertEqual(self.dispatcher.get_interrupt_count(index), 1)
+
+    def test_stop(self):
+        self.n.stop_interrupt_dispatcher()
+        self.assertFalse(self.dispatcher.is_running())
+        self.toggle(0)
+        self.assertTrue(self.gpios[0].wait_for_interrupts(0))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,175 @@
+#!/usr/bin/python
+
+import unittest
+import sys
+import os
+from array import array as Array
+
+sys.path.append(os.path.join(os.path.dirname(__file__),
+                             os.pardir,
+                             os.pardir))
+
+from nysa.host.sim.behavioral_host import BehavioralNysa
+from nysa.host.sim.behavioral_host import create_som
+from nysa.host.sim.behavioral_host import DMAWriterModel
+from nysa.host.driver import lcd_framebuffer
+from nysa.host.driver.lcd_framebuffer import LCDFramebuffer
+from nysa.host.driver.lcd_framebuffer import rgb565
+from nysa.host.driver import lcd_SSD1963
+from nysa.host.driver import lcd_ST7781R
+
+def create_lcd_som(lcd_type = lcd_SSD1963.LCD_SSD1963):
+    return create_som([("lcd", "LCD", 8, lcd_type)], [("mem1", 0x200000)])
+
+class SSD1963Model(DMAWriterModel):
+    """Records the commands and the pixels sent to the LCD"""
+
+    def __init__(self):
+        super(SSD1963Model, self).__init__(sink = self.pixels_received,
+                                           reg_status = lcd_SSD1963.STATUS,
+                                           reg_base0 = lcd_SSD1963.MEM_0_BASE,
+                                           reg_size0 = lcd_SSD1963.MEM_0_SIZE,
+                                           reg_base1 = lcd_SSD1963.MEM_1_BASE,
+                                           reg_size1 = lcd_SSD1963.MEM_1_SIZE,
+                                           empty0 = lcd_SSD1963.STATUS_MEMORY_0_EMPTY,
+                                           empty1 = lcd_SSD1963.STATUS_MEMORY_1_EMPTY)
+
+    def reset(self):
+        super(SSD1963Model, self).reset()
+        self.commands = []
+        self.writes = []
+
+    def pixels_received(self, data):
+        self.writes.append(data)
+
+    def write_register(self, offset, value):
+        write = 1 << lcd_SSD1963.CONTROL_COMMAND_WRITE
+        if offset == lcd_SSD1963.CONTROL and value & write:
+            #The write strobe clears itself
+            value &= ~write
+            data = self.registers.get(lcd_SSD1963.COMMAND_DATA, 0)
+            if value & (1 << lcd_SSD1963.CONTROL_COMMAND_PARAMETER):
+                self.commands[-1][1].append(data)
+            else:
+                self.commands.append((data, []))
+        super(SSD1963Model, self).write_register(offset, value)
+
+@unittest.skipIf(lcd_framebuffer.np is None, "NumPy is not installed")
+class Test (unittest.TestCase):
+    """Unit test for the LCD framebuffer"""
+
+    def setUp(self):
+        self.model = SSD1963Model()
+        self.n = BehavioralNysa(som = create_lcd_som(), models = {"lcd": self.model})
+        self.lcd = lcd_SSD1963.LCDSSD1963(self.n, "/top/peripheral/lcd")
+        self.fb = LCDFramebuffer(self.lcd)
+
+    def test_rgb565(self):
+        self.assertEqual(rgb565(0xFF, 0xFF, 0xFF), 0xFFFF)
+        self.assertEqual(rgb565(0xFF, 0x00, 0x00), 0xF800)
+        self.assertEqual(rgb565(0x00, 0xFF, 0x00), 0x07E0)
+        self.assertEqual(rgb565(0x00, 0x00, 0xFF), 0x001F)
+
+    def test_dirty_rects(self):
+        self.fb.fill(0x1234, 10, 10, 4, 4)
+        #Close enough to be sent together
+        self.fb.set_pixel(16, 12, 0x1234)
+        self.assertEqual(self.fb.get_dirty_rects(), [(10, 10, 7, 4)])
+        #Far away
+        self.fb.fill(0x1234, 400, 200, 8, 8)
+        self.assertEqual(len(self.fb.get_dirty_rects()), 2)
+        #Clipped to the screen
+        self.fb.fill(0x1234, -5, 270, 10, 10)
+        self.assertTrue((0, 270, 5, 2) in self.fb.get_dirty_rects())
+        self.fb.fill(0x1234, 1000, 1000, 10, 10)
+        self.assertEqual(len(self.fb.get_dirty_rects()), 3)
+
+    def test_max_rects(self):
+        self.fb.max_rects = 2
+        self.fb.set_pixel(0, 0, 1)
+        self.fb.set_pixel(200, 100, 1)
+        self.fb.set_pixel(400, 200, 1)
+        self.assertEqual(self.fb.get_dirty_rects(), [(0, 0, 401, 201)])
+
+    def test_flush(self):
+        self.fb.fill(rgb565(0xFF, 0x00, 0x00), 100, 50, 3, 2)
+        self.fb.set_pixel(101, 51, rgb565(0x00, 0x00, 0xFF))
+        self.assertEqual(self.fb.flush(), 6)
+        self.assertEqual(self.fb.get_dirty_rects(), [])
+
+        #The window goes back to the whole screen after the rectangle
+        self.assertEqual(self.model.commands,
+                         [(lcd_SSD1963.MEM_ADR_SET_COLUMN_ADR, [0x00, 100, 0x00, 102]),
+                          (lcd_SSD1963.MEM_ADR_SET_PAGE_ADR, [0x00, 50, 0x00, 51]),
+                          (lcd_SSD1963.MEM_ADR_SET_COLUMN_ADR, [0x00, 0x00, 0x01, 0xDF]),
+                          (lcd_SSD1963.MEM_ADR_SET_PAGE_ADR, [0x00, 0x00, 0x01, 0x0F])])
+        self.assertEqual(self.model.read_register(lcd_SSD1963.PIXEL_COUNT), 480 * 272)
+        red = [0x00, 0xFF, 0x00, 0x00]
+        blue = [0x00, 0x00, 0x00, 0xFF]
+        self.assertEqual(self.model.writes, [Array('B', red * 3 + red + blue + red)])
+
+        #Nothing left to send
+        self.assertEqual(self.fb.flush(), 0)
+        self.assertEqual(len(self.model.writes), 1)
+        self.assertEqual(len(self.model.commands), 4)
+
+        #A full frame leaves the window as it is
+        self.model.commands = []
+        self.fb.invalidate()
+        self.assertEqual(self.fb.flush(), 480 * 272)
+        self.assertEqual(len(self.model.commands), 2)
+
+    def test_blit(self):
+        image = lcd_framebuffer.np.zeros((4, 4, 3), dtype = lcd_framebuffer.np.uint8)
+        image[:, :, 1] = 0xFF
+        self.fb.blit(image, 478, 270)
+        self.assertEqual(self.fb.get_dirty_rects(), [(478, 270, 2, 2)])
+        self.assertEqual(self.fb.get_pixels()[271, 479], 0x07E0)
+        self.assertEqual(self.fb.flush(), 4)
+        self.assertEqual(self.model.writes, [Array('B', [0x00, 0x00, 0xFF, 0x00] * 4)])
+
+    def test_window(self):
+        self.assertRaises(Exception, self.lcd.set_window, 470, 0, 20, 1)
+        self.assertRaises(Exception, self.lcd.set_window, 0, 0, 0, 1)
+
+class TestST7781R (unittest.TestCase):
+    """Unit test for the ST7781R address window"""
+
+    def setUp(self):
+        model = DMAWriterModel(reg_status = lcd_ST7781R.REG_STATUS,
+                               reg_base0 = lcd_ST7781R.REG_MEM_0_BASE,
+                               reg_size0 = lcd_ST7781R.REG_MEM_0_SIZE,
+                               reg_base1 = lcd_ST7781R.REG_MEM_1_BASE,
+                               reg_size1 = lcd_ST7781R.REG_MEM_1_SIZE,
+                               empty0 = lcd_ST7781R.STATUS_MEMORY_0_EMPTY,
+                               empty1 = lcd_ST7781R.STATUS_MEMORY_1_EMPTY)
+        self.model = model
+        self.n = BehavioralNysa(som = create_lcd_som(lcd_ST7781R.LCD_ST7781R),
+                                models = {"lcd": model})
+        self.lcd = lcd_ST7781R.LCDST7781R(self.n, "/top/peripheral/lcd")
+        self.commands = []
+        self.lcd.write_command = lambda address, parameters: \
+                self.commands.append((address, list(parameters)))
+
+    def test_window(self):
+        #Columns past the 240 pixel horizontal GRAM range
+        self.lcd.set_window(250, 10, 60, 20)
+        self.assertEqual(self.commands,
+                         [(0x50, [0x00, 10]),
+                          (0x51, [0x00, 29]),
+                          (0x52, [0x00, 250]),
+                          (0x53, [0x01, 0x35]),
+                          (0x20, [0x00, 10]),
+                          (0x21, [0x00, 250])])
+        self.assertEqual(self.model.read_register(lcd_ST7781R.REG_PIXEL_COUNT), 60 * 20)
+
+    def test_full_frame(self):
+        self.lcd.set_window(0, 0, lcd_ST7781R.LCD_WIDTH, lcd_ST7781R.LCD_HEIGHT)
+        self.assertEqual(self.commands[:4],
+                         [(0x50, [0x00, 0x00]),
+                          (0x51, [0x00, 0xDB]),
+                          (0x52, [0x00, 0x00]),
+                          (0x53, [0x01, 0x3F])])
+
+if __name__ == "__main__":
+    unittest.main()
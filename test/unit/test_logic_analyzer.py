@@ -4,7 +4,9 @@ import unittest
 import json
 import sys
 import os
+import time
 import collections
+from StringIO import StringIO
 from array import array as Array
 
 sys.path.append(os.path.join(os.path.dirname(__file__),
@@ -13,6 +15,39 @@ sys.path.append(os.path.join(os.path.dirname(__file__),
 
 
 from nysa.host.driver import logic_analyzer
+from nysa.host.driver import driver
+from nysa.host.sim.behavioral_host import BehavioralNysa
+from nysa.host.sim.behavioral_host import create_som
+from nysa.host.sim.behavioral_host import RegisterModel
+
+class LogicAnalyzerModel(RegisterModel):
+    """Finishes a capture from 'captures' every time it is restarted"""
+
+    def __init__(self, captures):
+        super(LogicAnalyzerModel, self).__init__()
+        self.captures = captures
+        self.data = []
+        self.registers[logic_analyzer.DATA_COUNT] = len(captures[0])
+
+    def write_register(self, offset, value):
+        if offset == logic_analyzer.CONTROL and (value & (1 << logic_analyzer.CONTROL_RESTART_LA)):
+            value &= ~(1 << logic_analyzer.CONTROL_RESTART_LA)
+            self.registers[logic_analyzer.STATUS] = 0
+            if len(self.captures) > 0:
+                self.data = self.captures.pop(0)
+                self.registers[logic_analyzer.STATUS] = 1 << logic_analyzer.STATUS_FINISHED
+                self.interrupt()
+        self.registers[offset] = value
+
+    def read_register(self, offset):
+        if offset == logic_analyzer.READ_DATA:
+            return self.data.pop(0)
+        return self.registers.get(offset, 0)
+
+def create_analyzer(captures):
+    s = create_som([("la1", None, 0x10)])
+    n = BehavioralNysa(som = s, models = {"la1": LogicAnalyzerModel(captures)})
+    return logic_analyzer.LogicAnalyzer(n, "/top/peripheral/la1")
 
 class Test (unittest.TestCase):
     """Unit test SDB Tree"""
@@ -34,6 +69,74 @@ class Test (unittest.TestCase):
         f.write(buf)
         f.close()
 
+    def test_decode_capture(self):
+        raw = Array('B', [0x00, 0x00, 0x00, 0x02,
+                          0x80, 0x00, 0x00, 0x03,
+                          0x00, 0x00, 0x00, 0x00,
+                          0x00, 0x00, 0x00, 0x01])
+        data = logic_analyzer.decode_capture(raw, 2)
+        self.assertEqual(list(data), [0, 1, 2, 0x80000003])
+        self.assertEqual(list(logic_analyzer.decode_capture(raw, 0)), [2, 0x80000003, 0, 1])
+        self.assertEqual(list(logic_analyzer.get_channel(data, 1)), [0, 0, 1, 1])
+
+    @unittest.skipIf(logic_analyzer.np is None, "NumPy is not installed")
+    def test_decode_capture_array(self):
+        raw = Array('B', [0x00, 0x00, 0x00, 0x02,
+                          0x80, 0x00, 0x00, 0x03,
+                          0x00, 0x00, 0x00, 0x00,
+                          0x00, 0x00, 0x00, 0x01])
+        data = logic_analyzer.decode_capture_array(raw, 2)
+        self.assertEqual(list(data), [0, 1, 2, 0x80000003])
+        self.assertEqual(list(logic_analyzer.get_channel(data, 31)), [0, 0, 0, 1])
+        channels = logic_analyzer.get_channels(data, 2)
+        self.assertEqual(channels.tolist(), [[0, 1, 0, 1], [0, 0, 1, 1]])
+
+    def test_vcd_writer_changes_only(self):
+        f = StringIO()
+        vcd = logic_analyzer.VCDWriter(f, count = 2, clock_count = 100000000)
+        vcd.write_capture(Array('L', [0, 0, 1, 1, 3]))
+        vcd.write_capture(Array('L', [3, 2]), gap = 5)
+        vcd.close()
+        body = f.getvalue().split("$enddefinitions\n$end\n")[1]
+        self.assertEqual(body, "$comment capture 0 $end\n"
+                               "#0\n$dumpvars\n0!\n0\"\n$end\n"
+                               "#20\n1!\n"
+                               "#40\n1\"\n"
+                               "$comment capture 1 $end\n"
+                               "#110\n0!\n"
+                               "#120\n")
+
+    def test_vcd_writer_clock(self):
+        f = StringIO()
+        vcd = logic_analyzer.VCDWriter(f, count = 1, clock_count = 100000000, add_clock = True)
+        vcd.write_capture(Array('L', [1, 1]))
+        body = f.getvalue().split("$enddefinitions\n$end\n")[1]
+        self.assertEqual(body, "$comment capture 0 $end\n"
+                               "#0\n$dumpvars\n1!\n1\"\n$end\n#5\n0!\n"
+                               "#10\n1!\n#15\n0!\n")
+
+    def test_acquire(self):
+        la = create_analyzer([[i, i + 1] for i in range(3)])
+        captures = list(la.acquire(count = 3, timeout = 2))
+        self.assertEqual([list(c.data) for c in captures], [[0, 1], [1, 2], [2, 3]])
+        self.assertEqual([c.sequence for c in captures], [0, 1, 2])
+        self.assertFalse(la.is_interrupts_enabled())
+
+    def test_acquire_drops_when_full(self):
+        la = create_analyzer([[i] for i in range(5)])
+        acquisition = logic_analyzer.LogicAnalyzerAcquisition(la, 2,
+                                                              driver.DMA_RING_DROP_OLDEST,
+                                                              logic_analyzer.decode_capture)
+        acquisition.start()
+        end = time.time() + 2
+        while acquisition.ring.get_overrun_count() < 3 and time.time() < end:
+            time.sleep(0.01)
+        captures = [acquisition.get(0), acquisition.get(0)]
+        acquisition.stop()
+        self.assertEqual([list(c.data) for c in captures], [[3], [4]])
+        self.assertEqual([c.sequence for c in captures], [3, 4])
+        self.assertEqual(captures[-1].dropped, 3)
+
 
 if __name__ == "__main__":
     unittest.main()
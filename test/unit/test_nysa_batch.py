@@ -0,0 +1,68 @@
+#!/usr/bin/python
+
+import unittest
+import sys
+import os
+from array import array as Array
+
+sys.path.append(os.path.join(os.path.dirname(__file__),
+                             os.pardir,
+                             os.pardir))
+
+sys.path.append(os.path.join(os.path.dirname(__file__),
+                             os.pardir))
+from tutils import MemoryNysa
+
+class Test (unittest.TestCase):
+    """Unit test for Nysa batch transactions"""
+
+    def setUp(self):
+        self.n = MemoryNysa()
+
+    def test_consecutive_writes_are_merged(self):
+        with self.n.batch() as b:
+            b.write_register(0x10, 0x01)
+            b.write_register(0x11, 0x02)
+            b.write_register(0x12, 0x03)
+        self.assertEqual(self.n.log, [("write", 0x10, 3)])
+        self.assertEqual(self.n.registers[0x12], 0x03)
+
+    def test_order_is_preserved(self):
+        with self.n.batch() as b:
+            b.write_register(0x12, 0x03)
+            b.write_register(0x10, 0x01)
+        self.assertEqual(self.n.log, [("write", 0x12, 1), ("write", 0x10, 1)])
+
+    def test_reads_are_merged_and_split(self):
+        self.n.registers[0x20] = 0x1234
+        self.n.registers[0x21] = 0x5678
+        self.n.registers[0x22] = 0x9ABC
+        with self.n.batch() as b:
+            r0 = b.read_register(0x20)
+            r1 = b.read(0x21, 2)
+        self.assertEqual(self.n.log, [("read", 0x20, 3)])
+        self.assertEqual(b.results[r0], 0x1234)
+        self.assertEqual(b.results[r1], Array('B', [0x00, 0x00, 0x56, 0x78, 0x00, 0x00, 0x9A, 0xBC]))
+
+    def test_bit_operations_use_batch_values(self):
+        self.n.registers[0x00] = 0xF0
+        with self.n.batch() as b:
+            b.set_register_bit(0x00, 0)
+            b.clear_register_bit(0x00, 4)
+            b.write_register_bit_range(0x00, 11, 8, 0xA)
+        #Only the first bit operation needs to read the register
+        self.assertEqual(self.n.log[0], ("read", 0x00, 1))
+        self.assertEqual(len([l for l in self.n.log if l[0] == "read"]), 1)
+        self.assertEqual(self.n.registers[0x00], 0xAE1)
+
+    def test_exception_discards_batch(self):
+        try:
+            with self.n.batch() as b:
+                b.write_register(0x00, 0x01)
+                raise ValueError("abort")
+        except ValueError:
+            pass
+        self.assertEqual(self.n.log, [])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+#!/usr/bin/python
+
+import unittest
+import sys
+import os
+from array import array as Array
+
+sys.path.append(os.path.join(os.path.dirname(__file__),
+                             os.pardir,
+                             os.pardir))
+
+from nysa.host.sim.behavioral_host import BehavioralNysa
+from nysa.host.sim.behavioral_host import create_som
+from nysa.host.sim.behavioral_host import DMAModel
+from nysa.host.driver import dma
+
+def create_copy_som(with_dma = True):
+    peripherals = []
+    if with_dma:
+        peripherals.append(("dma", "dma", 0x100, dma.COSPAN_DESIGN_DMA_MODULE))
+    return create_som(peripherals, [("mem1", 0x10000)])
+
+def words(values):
+    data = Array('B')
+    for v in values:
+        data.extend([(v >> 24) & 0xFF, (v >> 16) & 0xFF, (v >> 8) & 0xFF, v & 0xFF])
+    return data
+
+class Test (unittest.TestCase):
+    """Unit test for copy and gather"""
+
+    def setUp(self):
+        self.model = DMAModel()
+        self.n = BehavioralNysa(som = create_copy_som(), models = {"dma": self.model})
+        self.n.write_memory(0x000, words(range(0x100)))
+        self.dma = dma.DMA(self.n, self.n.find_device(dma.DMA)[0])
+        self.dma.setup()
+        self.n.set_copy_dma(self.dma)
+
+    def test_copy(self):
+        self.n.copy(0x010, 0x400, 0x20)
+        self.assertEqual(self.n.read_memory(0x400, 0x20), words(range(0x10, 0x30)))
+        self.assertEqual(self.model.transfers, 1)
+
+    def test_gather(self):
+        sources = [(i * 0x10, 2) for i in range(10)]
+        self.n.gather(sources, 0x800)
+        expected = []
+        for i in range(10):
+            expected.extend([i * 0x10, i * 0x10 + 1])
+        self.assertEqual(self.n.read_memory(0x800, 20), words(expected))
+        #More blocks than instructions, the program runs twice
+        self.assertEqual(self.model.transfers, 10)
+
+    def test_gather_merge(self):
+        self.n.gather([(0x00, 4), (0x04, 4), (0x20, 0), (0x08, 4)], 0x800)
+        self.assertEqual(self.n.read_memory(0x800, 12), words(range(12)))
+        self.assertEqual(self.model.transfers, 1)
+
+    def test_shared_slots(self):
+        #Another user of the core holds the first six instructions
+        p = dma.DMAProgram()
+        for i in range(6):
+            p.add_transfer(0x1000 + i, 0x2000 + i, 1, next = (i + 1) % 6)
+        used = self.dma.load_program(p)
+        program = [self.model.read_register(dma.INST_BASE + (dma.INST_OFFSET * i) + dma.INST_SRC_ADDR_LOW)
+                   for i in used]
+
+        sources = [(i * 0x10, 2) for i in range(5)]
+        self.n.gather(sources, 0x800)
+        expected = []
+        for i in range(5):
+            expected.extend([i * 0x10, i * 0x10 + 1])
+        self.assertEqual(self.n.read_memory(0x800, 10), words(expected))
+        #Only two slots are free
+        self.assertEqual(self.model.transfers, 5)
+        self.assertEqual(program,
+                         [self.model.read_register(dma.INST_BASE + (dma.INST_OFFSET * i) + dma.INST_SRC_ADDR_LOW)
+                          for i in used])
+        #The slots of the copy are given back
+        self.assertEqual(self.dma.instructions_available, [6, 7])
+
+        for i in range(2):
+            self.dma.instructions_available.remove(6 + i)
+        self.assertRaises(dma.DMAError, self.n.copy, 0x10, 0x400, 4)
+
+    def test_overlap(self):
+        self.n.copy(0x00, 0x02, 8)
+        self.assertEqual(self.n.read_memory(0x00, 10), words([0, 1] + range(8)))
+        self.assertEqual(self.model.transfers, 0)
+
+    def test_host_copy(self):
+        #The DMA core is only used when it is selected
+        n = BehavioralNysa(som = create_copy_som(), models = {"dma": DMAModel()})
+        n.write_memory(0x000, words(range(0x10)))
+        n.copy(0x00, 0x100, 0x10)
+        self.assertEqual(n.read_memory(0x100, 0x10), words(range(0x10)))
+        self.assertEqual(n.get_model("dma").transfers, 0)
+
+        n = BehavioralNysa(som = create_copy_som(with_dma = False))
+        n.write_memory(0x000, words(range(0x10)))
+        n.gather([(0x08, 8), (0x00, 8)], 0x100)
+        self.assertEqual(n.read_memory(0x100, 16), words(range(8, 16) + range(8)))
+
+        self.n.set_copy_dma(None)
+        self.n.copy(0x010, 0x400, 0x10)
+        self.assertEqual(self.n.read_memory(0x400, 0x10), words(range(0x10, 0x20)))
+        self.assertEqual(self.model.transfers, 0)
+
+if __name__ == "__main__":
+    unittest.main()
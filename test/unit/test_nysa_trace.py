@@ -0,0 +1,108 @@
+#!/usr/bin/python
+
+import unittest
+import sys
+import os
+import json
+import tempfile
+from array import array as Array
+
+sys.path.append(os.path.join(os.path.dirname(__file__),
+                             os.pardir,
+                             os.pardir))
+
+from nysa.host.nysa_trace import NysaTracer
+from nysa.host.sim.behavioral_host import BehavioralNysa
+from nysa.host.sim.behavioral_host import create_som
+from nysa.host.sim.behavioral_host import GPIOModel
+from nysa.host.driver.gpio import GPIO
+
+class Test (unittest.TestCase):
+    """Unit test for the transaction tracer"""
+
+    def setUp(self):
+        self.n = BehavioralNysa(som = create_som([("gpio1", "gpio", 8)], [("mem1", 0x1000)]),
+                                models = {"gpio1": GPIOModel()})
+        self.gpio = GPIO(self.n, "/top/peripheral/gpio1")
+        self.tracer = NysaTracer(self.n, capacity = 8)
+
+    def tearDown(self):
+        self.tracer.stop()
+
+    def test_records(self):
+        self.tracer.start()
+        self.gpio.set_port_direction(0x0F)
+        self.n.write_memory(0x10, Array('B', range(16)))
+        self.n.read_memory(0x10, 4)
+        records = self.tracer.get_records()
+        self.assertEqual([(r[2], r[4]) for r in records],
+                         [("write", 1), ("write", 4), ("read", 4)])
+        self.assertEqual(self.tracer.find_device(records[0][3]),
+                         ("/top/peripheral/gpio1", 1))
+        self.assertEqual(self.tracer.find_device(records[1][3]),
+                         ("/top/memory/mem1", 0x10))
+
+        stats = self.tracer.get_device_statistics()
+        self.assertEqual(stats["/top/memory/mem1"]["count"], 2)
+        self.assertEqual(stats["/top/memory/mem1"]["words"], 8)
+        self.assertEqual(sum(stats["/top/memory/mem1"]["histogram"]), 2)
+        self.assertEqual(stats["/top/peripheral/gpio1"]["registers"].keys(), [1])
+
+    def test_ring(self):
+        self.tracer.start()
+        for i in range(10):
+            self.gpio.get_port_raw()
+        self.assertEqual(len(self.tracer.get_records()), 8)
+        self.assertEqual(self.tracer.get_dropped_count(), 2)
+        self.tracer.clear()
+        self.assertEqual(self.tracer.get_records(), [])
+
+    def test_stop(self):
+        read = self.n.read
+        self.tracer.start()
+        self.assertRaises(Exception, NysaTracer(self.n).start)
+        self.tracer.stop()
+        self.assertEqual(self.n.read, read)
+        self.gpio.get_port_raw()
+        self.assertEqual(self.tracer.get_records(), [])
+        self.tracer.stop()
+        self.assertEqual(self.n.read, read)
+
+    def test_stop_under_wrapper(self):
+        #Something else wraps the board after the tracer started
+        self.tracer.start()
+        trace_read = self.n.read
+        reads = []
+        def read(address, length = 1, disable_auto_inc = False):
+            reads.append(address)
+            return trace_read(address, length, disable_auto_inc)
+        self.n.read = read
+        self.tracer.stop()
+        self.assertEqual(self.n.read, read)
+        self.gpio.get_port_raw()
+        self.assertEqual(len(reads), 1)
+        self.assertEqual(self.tracer.get_records(), [])
+        self.tracer.start()
+        self.gpio.get_port_raw()
+        self.assertEqual(len(reads), 2)
+        self.assertEqual(len(self.tracer.get_records()), 1)
+
+    def test_chrome_trace(self):
+        self.tracer.start()
+        self.gpio.get_port_raw()
+        self.tracer.stop()
+        f, path = tempfile.mkstemp(suffix = ".json")
+        os.close(f)
+        try:
+            self.tracer.export_chrome_trace(path)
+            trace = json.load(open(path))
+        finally:
+            os.remove(path)
+        self.assertEqual(len(trace["traceEvents"]), 1)
+        event = trace["traceEvents"][0]
+        self.assertEqual(event["ph"], "X")
+        self.assertEqual(event["args"]["urn"], "/top/peripheral/gpio1")
+        self.assertEqual(event["name"], "read /top/peripheral/gpio1")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+#!/usr/bin/python
+
+import unittest
+import sys
+import os
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__),
+                             os.pardir,
+                             os.pardir))
+
+from nysa.host.platform_scanner import scan_platforms
+
+class FakePlatform(object):
+    delay = 0
+    boards = {"0": "board"}
+
+    def __init__(self, status = None):
+        pass
+
+    def scan(self):
+        time.sleep(self.delay)
+        return self.boards
+
+class SlowPlatform(FakePlatform):
+    delay = 0.5
+
+class BrokenPlatform(FakePlatform):
+    def scan(self):
+        raise IOError("usb error")
+
+class Test (unittest.TestCase):
+    """Unit test for the parallel platform scan"""
+
+    def test_sim_is_last(self):
+        scans = scan_platforms({"sim": FakePlatform, "alpha": FakePlatform})
+        self.assertEqual([scan[0] for scan in scans], ["alpha", "sim"])
+        self.assertEqual(scans[0][2], {"0": "board"})
+
+    def test_scans_run_together(self):
+        start = time.time()
+        scans = scan_platforms({"a": SlowPlatform, "b": SlowPlatform, "c": SlowPlatform})
+        self.assertLess(time.time() - start, 1.0)
+        self.assertEqual(len(scans), 3)
+
+    def test_timeout(self):
+        scans = scan_platforms({"slow": SlowPlatform, "fast": FakePlatform}, timeout = 0.1)
+        result = dict([(scan[0], scan[2]) for scan in scans])
+        self.assertEqual(result["slow"], {})
+        self.assertEqual(result["fast"], {"0": "board"})
+
+    def test_scan_error_is_raised(self):
+        self.assertRaises(IOError, scan_platforms, {"broken": BrokenPlatform})
+
+if __name__ == "__main__":
+    unittest.main()
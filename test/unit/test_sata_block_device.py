@@ -0,0 +1,122 @@
+#!/usr/bin/python
+
+import unittest
+import sys
+import os
+from array import array as Array
+
+sys.path.append(os.path.join(os.path.dirname(__file__),
+                             os.pardir,
+                             os.pardir))
+
+from nysa.host.driver.sata_driver import SATABlockDevice
+from nysa.host.driver.sata_driver import SECTOR_SIZE
+
+class FakeDrive(object):
+    """Drive in memory that records the commands"""
+
+    def __init__(self, sectors):
+        self.data = Array('B', [0] * (sectors * SECTOR_SIZE))
+        self.commands = []
+
+    def read_sectors(self, lba, count):
+        self.commands.append(("read", lba, count))
+        return self.data[lba * SECTOR_SIZE:(lba + count) * SECTOR_SIZE]
+
+    def write_sectors(self, lba, data):
+        self.commands.append(("write", lba, len(data) / SECTOR_SIZE))
+        self.data[lba * SECTOR_SIZE:lba * SECTOR_SIZE + len(data)] = data
+
+def sector(value, count = 1):
+    return Array('B', [value & 0xFF] * (SECTOR_SIZE * count))
+
+class Test (unittest.TestCase):
+    """Unit test for the SATA block device"""
+
+    def setUp(self):
+        self.drive = FakeDrive(256)
+        for i in range(256):
+            self.drive.data[i * SECTOR_SIZE: (i + 1) * SECTOR_SIZE] = sector(i)
+        self.dev = SATABlockDevice(self.drive, cache_sectors = 32, readahead = 8, sector_count = 256)
+
+    def test_read(self):
+        self.assertEqual(self.dev.read_blocks(10, 2), sector(10) + sector(11))
+        self.assertEqual(self.drive.commands, [("read", 10, 2)])
+        #Cached
+        self.assertEqual(self.dev.read_blocks(11, 1), sector(11))
+        self.assertEqual(len(self.drive.commands), 1)
+        self.assertEqual(self.dev.get_statistics()["hits"], 1)
+        self.assertRaises(Exception, self.dev.read_blocks, 255, 2)
+
+    def test_readahead(self):
+        self.dev.read_blocks(0, 4)
+        self.dev.read_blocks(4, 4)
+        self.assertEqual(self.drive.commands, [("read", 0, 4), ("read", 4, 12)])
+        #Already read ahead and more than half of it is left
+        self.assertEqual(self.dev.read_blocks(8, 4), sector(8) + sector(9) + sector(10) + sector(11))
+        self.assertEqual(len(self.drive.commands), 2)
+        #The next window starts after the last one
+        self.dev.read_blocks(12, 4)
+        self.assertEqual(self.drive.commands[2:], [("read", 16, 8)])
+        #Stops at the end of the drive
+        self.dev.read_blocks(250, 2)
+        self.dev.read_blocks(252, 2)
+        self.assertEqual(self.drive.commands[-1], ("read", 252, 4))
+
+    def test_lru(self):
+        self.dev.readahead = 0
+        self.dev.read_blocks(0, 1)
+        self.dev.read_blocks(100, 31)
+        self.dev.read_blocks(0, 1)
+        self.dev.read_blocks(200, 1)
+        #Sector 0 was used recently, 100 was pushed out
+        self.assertEqual(self.dev.read_blocks(0, 1), sector(0))
+        self.assertEqual(len(self.drive.commands), 3)
+        self.dev.read_blocks(100, 1)
+        self.assertEqual(self.drive.commands[-1], ("read", 100, 1))
+        self.assertTrue(self.dev.get_statistics()["cached"] <= 32)
+
+    def test_write_coalescing(self):
+        self.dev.write_blocks(20, sector(0xAA))
+        self.dev.write_blocks(22, sector(0xCC))
+        self.dev.write_blocks(21, sector(0xBB))
+        self.dev.write_blocks(40, sector(0xDD))
+        self.assertEqual(self.drive.commands, [])
+        #Reads see the dirty data
+        self.assertEqual(self.dev.read_blocks(21, 1), sector(0xBB))
+        self.dev.flush()
+        self.assertEqual(self.drive.commands, [("write", 20, 3), ("write", 40, 1)])
+        self.assertEqual(self.drive.data[20 * SECTOR_SIZE:23 * SECTOR_SIZE],
+                         sector(0xAA) + sector(0xBB) + sector(0xCC))
+        self.dev.flush()
+        self.assertEqual(len(self.drive.commands), 2)
+
+    def test_dirty_not_overwritten_by_read(self):
+        self.dev.write_blocks(51, sector(0xEE))
+        self.assertEqual(self.dev.read_blocks(50, 3), sector(50) + sector(0xEE) + sector(52))
+
+    def test_split(self):
+        self.dev = SATABlockDevice(self.drive, cache_sectors = 64, readahead = 0, max_command_sectors = 16)
+        self.dev.write_blocks(0, sector(1, 40))
+        self.dev.flush()
+        self.assertEqual(self.drive.commands, [("write", 0, 16), ("write", 16, 16), ("write", 32, 8)])
+        self.dev.invalidate()
+        self.assertEqual(self.dev.read_blocks(100, 40), self.drive.data[100 * SECTOR_SIZE:140 * SECTOR_SIZE])
+        self.assertEqual(self.drive.commands[3:], [("read", 100, 16), ("read", 116, 16), ("read", 132, 8)])
+
+    def test_large_read(self):
+        #Larger than the cache
+        self.dev.write_blocks(70, sector(0x11))
+        data = self.dev.read_blocks(60, 64)
+        self.assertEqual(data[0:SECTOR_SIZE], sector(60))
+        self.assertEqual(data[10 * SECTOR_SIZE:11 * SECTOR_SIZE], sector(0x11))
+
+    def test_eviction_writes_dirty(self):
+        self.dev.readahead = 0
+        self.dev.write_blocks(0, sector(0x55, 4))
+        self.dev.read_blocks(100, 30)
+        self.assertEqual(self.drive.commands[-1], ("write", 0, 4))
+        self.assertEqual(self.dev.read_blocks(0, 1), sector(0x55))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+#!/usr/bin/python
+
+import unittest
+import sys
+import os
+from array import array as Array
+
+sys.path.append(os.path.join(os.path.dirname(__file__),
+                             os.pardir,
+                             os.pardir))
+
+from nysa.host.driver.sata_driver import SATADriver
+from nysa.host.driver.sata_driver import SECTOR_SIZE
+from nysa.host.driver import sata_driver
+from nysa.tools import sata_bench
+
+class Test (unittest.TestCase):
+    """Unit test for the SATA driver on the in memory hard drive"""
+
+    def setUp(self):
+        self.n = sata_bench.create_sim_board(0x100)
+        self.n.read_sdb()
+        self.model = self.n.get_model("sata")
+        self.sata = SATADriver(self.n, self.n.find_device(SATADriver)[0])
+
+    def test_read_write_sectors(self):
+        data = Array('B', [i & 0xFF for i in range(10 * SECTOR_SIZE)])
+        self.sata.write_sectors(0x20, data)
+        #The local buffer holds 4 sectors
+        self.assertEqual(self.model.commands, 3)
+        self.assertEqual(self.sata.read_sectors(0x20, 10), data)
+        self.assertEqual(self.sata.read_sectors(0x30, 1), Array('B', [0] * SECTOR_SIZE))
+        self.assertRaises(Exception, self.sata.write_sectors, 0x20, Array('B', [0] * 100))
+
+    def test_command_setup_writes(self):
+        writes = []
+        write = self.n.write
+        base = self.sata.base_addr
+        def log_write(address, data, disable_auto_inc = False):
+            writes.append((address - base, len(data) / 4))
+            return write(address, data, disable_auto_inc)
+        self.n.write = log_write
+
+        self.sata.hard_drive_read(0x20, 1)
+        #Sector count and the address go out together, the command is last
+        self.assertEqual(writes, [(sata_driver.HARD_DRIVE_FEATURES, 1),
+                                  (sata_driver.HARD_DRIVE_SECTOR_COUNT, 3),
+                                  (sata_driver.HARD_DRIVE_COMMAND, 1)])
+        self.sata.wait_for_hard_drive()
+
+    def test_drive_error(self):
+        self.assertRaises(Exception, self.sata.read_sectors, 0xFF, 2)
+        self.assertTrue(self.sata.is_hard_drive_error())
+
+    def test_identify(self):
+        self.assertEqual(self.sata.get_hard_drive_max_native_lba(), 0xFF)
+        self.sata.identify_hard_drive()
+        self.assertEqual(self.sata.get_config().max_user_sectors(), 0x100)
+
+    def test_benchmark(self):
+        result = sata_bench.run_benchmark(self.sata.read_sectors,
+                                          self.sata.write_sectors,
+                                          "randwrite", 4, 16, 0, 0x100)
+        self.assertEqual(len(result["latencies"]), 16)
+        self.assertEqual(result["bytes"], 16 * 4 * SECTOR_SIZE)
+        self.assertEqual(self.model.commands, 16)
+
+        #Cached writes are only on the drive once the flush in the timed
+        #region is done
+        block_device = sata_driver.SATABlockDevice(self.sata, cache_sectors = 0x100, readahead = 0x40)
+        result = sata_bench.run_benchmark(block_device.read_blocks,
+                                          block_device.write_blocks,
+                                          "seqwrite", 4, 16, 0, 0x40,
+                                          flush = block_device.flush)
+        self.assertEqual(block_device.get_statistics()["write_commands"], 1)
+        self.assertEqual(self.sata.read_sectors(0, 4), Array('B', [i & 0xFF for i in range(4 * SECTOR_SIZE)]))
+        self.assertEqual(sata_bench.percentile([1, 2, 3, 4], 50), 2)
+        self.assertEqual(sata_bench.percentile([1, 2, 3, 4], 99), 4)
+        self.assertEqual(sata_bench.percentile([], 50), 0)
+
+if __name__ == "__main__":
+    unittest.main()
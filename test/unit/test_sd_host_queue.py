@@ -0,0 +1,123 @@
+#!/usr/bin/python
+
+import unittest
+import sys
+import os
+import threading
+from array import array as Array
+
+sys.path.append(os.path.join(os.path.dirname(__file__),
+                             os.pardir,
+                             os.pardir))
+
+from nysa.host.driver.sd_host_driver import SDHostRequestQueue
+
+class FakeSDHost(object):
+    """SD host with a card in memory, the data of a read arrives on another thread"""
+
+    def __init__(self, size = 0x10000):
+        self.card = Array('B', [i & 0xFF for i in range(size)])
+        self.block_sizes = [512] * 8
+        self.transfers = []
+        self.async_mode = False
+        self.callback = None
+        self.fail = False
+        self.delays = []
+
+    def get_block_size(self, function_id):
+        return self.block_sizes[function_id]
+
+    def set_block_size(self, function_id, block_size):
+        self.block_sizes[function_id] = block_size
+
+    def enable_async_dma_reader(self, enable):
+        self.async_mode = enable
+
+    def set_async_dma_reader_callback(self, callback):
+        self.callback = callback
+
+    def rw_block(self, write_flag, function_id, address, data, byte_count, fifo_mode):
+        if self.fail:
+            raise Exception("Card error")
+        if write_flag:
+            self.transfers.append(("write", function_id, address, len(data) / self.block_sizes[function_id]))
+            self.card[address:address + len(data)] = Array('B', data)
+            return
+        self.transfers.append(("read", function_id, address, byte_count / self.block_sizes[function_id]))
+        #The DMA reader hands over whole blocks of its own size
+        data = self.card[address:address + byte_count] + Array('B', [0] * 16)
+        delay = 0.01
+        if len(self.delays) > 0:
+            delay = self.delays.pop(0)
+        threading.Timer(delay, self.callback, [data]).start()
+
+class Test (unittest.TestCase):
+    """Unit test for the SD host request queue"""
+
+    def setUp(self):
+        self.sd = FakeSDHost()
+        self.q = SDHostRequestQueue(self.sd, max_blocks = 4)
+
+    def tearDown(self):
+        self.q.stop()
+
+    def test_merge_reads(self):
+        #Queue before the worker runs so the requests are merged
+        requests = [self.q.read_blocks(1, 0x200 * i, 1) for i in range(3)]
+        done = []
+        requests.append(self.q.read_blocks(1, 0x1000, 1, callback = lambda r: done.append(r)))
+        self.q.start()
+        self.assertTrue(self.q.wait_for_idle(2))
+        self.assertEqual(self.sd.transfers, [("read", 1, 0x000, 3), ("read", 1, 0x1000, 1)])
+        for i in range(3):
+            self.assertEqual(requests[i].get_data(), self.sd.card[0x200 * i:0x200 * (i + 1)])
+        self.assertEqual(done, [requests[3]])
+        self.assertTrue(self.sd.async_mode)
+
+    def test_split_writes(self):
+        data = Array('B', [0xA5] * (6 * 512))
+        r = self.q.write_blocks(1, 0x400, data)
+        r2 = self.q.write_blocks(1, 0x400 + (6 * 512), Array('B', [0x5A] * 512))
+        #A read between the writes is not merged with them
+        r3 = self.q.read_blocks(1, 0x400, 1)
+        self.q.start()
+        self.assertTrue(r.wait(2))
+        self.assertTrue(r3.wait(2))
+        self.assertEqual(self.sd.transfers, [("write", 1, 0x400, 4),
+                                             ("write", 1, 0x400 + (4 * 512), 3),
+                                             ("read", 1, 0x400, 1)])
+        self.assertEqual(r3.get_data(), Array('B', [0xA5] * 512))
+        self.assertEqual(self.q.get_statistics()["requests"], 3)
+        self.assertRaises(Exception, self.q.write_blocks, 1, 0, Array('B', [0] * 100))
+
+    def test_block_size(self):
+        self.q.set_block_size(2, 64)
+        r = self.q.read_blocks(2, 0x40, 2)
+        self.q.start()
+        self.assertTrue(r.wait(2))
+        self.assertEqual(r.get_data(), self.sd.card[0x40:0xC0])
+        self.assertEqual(self.sd.transfers, [("read", 2, 0x40, 2)])
+
+    def test_error(self):
+        self.sd.fail = True
+        r = self.q.write_blocks(1, 0, Array('B', [0] * 512))
+        self.q.start()
+        self.assertTrue(r.wait(2))
+        self.assertRaises(Exception, r.get_data)
+        self.assertTrue(self.q.wait_for_idle(2))
+
+    def test_late_read(self):
+        self.q.timeout = 0.1
+        #The data of the first read arrives after its timeout, while the
+        #second read is in flight
+        self.sd.delays = [0.15, 0.05]
+        r = self.q.read_blocks(1, 0x000, 1)
+        r2 = self.q.read_blocks(1, 0x1000, 1)
+        self.q.start()
+        self.assertTrue(r.wait(2))
+        self.assertRaises(Exception, r.get_data)
+        self.assertTrue(r2.wait(2))
+        self.assertEqual(r2.get_data(), self.sd.card[0x1000:0x1200])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+#!/usr/bin/python
+
+import unittest
+import sys
+import os
+import shutil
+import tempfile
+from array import array as Array
+
+sys.path.append(os.path.join(os.path.dirname(__file__),
+                             os.pardir,
+                             os.pardir))
+
+from nysa.host.nysa import Nysa
+from nysa.host.sdb_cache import SDBCache
+from nysa.cbuilder import sdb_component as sdbc
+from nysa.cbuilder import sdb_object_model as som
+from nysa.cbuilder.som_rom_generator import generate_rom_image
+from nysa.common.status import Status
+
+class RomNysa(Nysa):
+    """A board that only contains an SDB ROM at address 0"""
+
+    def __init__(self, rom):
+        s = Status()
+        s.set_level("fatal")
+        super(RomNysa, self).__init__(s)
+        self.rom = rom
+        self.reads = 0
+
+    def get_sdb_base_address(self):
+        return 0
+
+    def read(self, address, length = 1, disable_auto_inc = False):
+        self.reads += 1
+        return self.rom[address * 4: (address + length) * 4]
+
+def create_rom(device_name = "device 1", commit_id = 1):
+    s = som.SOM()
+    s.initialize_root()
+    peripheral = s.insert_bus()
+    peripheral.set_name("peripheral")
+    memory = s.insert_bus()
+    memory.set_name("memory")
+    s.insert_component(peripheral, sdbc.create_device_record(name = device_name, size = 0x100))
+    s.insert_component(peripheral, sdbc.create_device_record(name = "device 2", size = 0x100))
+    s.insert_component(memory, sdbc.create_device_record(name = "memory 1", size = 0x10000))
+    s.insert_component(s.get_root(), sdbc.create_synthesis_record("image", commit_id, "xilinx", 14.7, "user"))
+    return generate_rom_image(s)
+
+class Test (unittest.TestCase):
+    """Unit test for the SDB cache"""
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def read_sdb(self, rom):
+        n = RomNysa(rom)
+        n.nsm.cache = SDBCache(self.path)
+        n.set_sdb_cache_id("board_0")
+        data = n.read_sdb()
+        return n, data
+
+    def test_reconnect_uses_cache(self):
+        rom = create_rom()
+        n1, data1 = self.read_sdb(rom)
+        n2, data2 = self.read_sdb(rom)
+        self.assertEqual(data1, data2)
+        self.assertEqual(n2.reads, 1)
+        self.assertTrue(n2.get_sdb_read_statistics()["cached"])
+        self.assertGreater(n1.reads, 1)
+        self.assertEqual(sorted(n1.get_all_urns()), sorted(n2.get_all_urns()))
+        self.assertEqual(n1.get_device_address("/top/memory/memory 1"),
+                         n2.get_device_address("/top/memory/memory 1"))
+
+    def test_changed_image_is_read_again(self):
+        self.read_sdb(create_rom())
+        #A new image has a new synthesis record
+        n, data = self.read_sdb(create_rom("device 3", commit_id = 2))
+        self.assertGreater(n.reads, 1)
+        self.assertIn("/top/peripheral/device 3", n.get_all_urns())
+
+    def test_one_burst_per_bus(self):
+        n = RomNysa(create_rom())
+        data = n.read_sdb()
+        #Interconnect and table of the top, peripheral and memory buses
+        self.assertEqual(n.reads, 6)
+        self.assertEqual(data, n.rom)
+        stats = n.get_sdb_read_statistics()
+        self.assertEqual(stats["reads"], 6)
+        self.assertEqual(stats["records"], len(n.rom) / 64)
+        self.assertFalse(stats["cached"])
+
+    def test_cache_disabled(self):
+        self.read_sdb(create_rom())
+        n, data = self.read_sdb(create_rom())
+        n.reads = 0
+        n.read_sdb(use_cache = False)
+        self.assertGreater(n.reads, 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+#!/usr/bin/python
+
+import unittest
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__),
+                             os.pardir,
+                             os.pardir))
+
+from test_sdb_cache import RomNysa
+from test_sdb_cache import create_rom
+
+class Test (unittest.TestCase):
+    """Unit test for the SDB lookup tables"""
+
+    def setUp(self):
+        self.n = RomNysa(create_rom())
+        self.n.read_sdb()
+        self.nsm = self.n.nsm
+
+    def test_get_component_from_urn(self):
+        c = self.nsm.get_component_from_urn("/top/memory/memory 1")
+        self.assertEqual(c.get_name(), "memory 1")
+        self.assertEqual(self.nsm.get_component_from_urn("/"), self.nsm.som.get_root())
+        self.assertIsNone(self.nsm.get_component_from_urn("/top/memory/bill"))
+        self.assertRaises(Exception, self.nsm.get_component_from_urn, "bill")
+
+    def test_all_urns(self):
+        urns = self.nsm.get_all_components_as_urns()
+        self.assertEqual(len(urns), 6)
+        self.assertIn("/top/peripheral", urns)
+        devices = self.nsm.get_all_devices_as_urns()
+        self.assertEqual(sorted(devices), ["/top/memory/memory 1",
+                                           "/top/peripheral/device 1",
+                                           "/top/peripheral/device 2"])
+
+    def test_find_device_from_address(self):
+        self.assertEqual(self.nsm.find_device_from_address(0x200), "/top/memory")
+        self.assertEqual(self.n.find_urn_from_address(0x110), "/top/peripheral/device 2")
+        self.assertEqual(self.n.find_urn_from_address(0x10, "/top/memory"), "/top/memory/memory 1")
+        self.assertIsNone(self.n.find_urn_from_address(0x400))
+
+    def test_find_device_in_second_bus(self):
+        c = self.nsm.get_component_from_urn("/top/memory/memory 1").get_component()
+        self.assertEqual(self.nsm.find_device_from_abi(0, c.get_abi_version_major_as_int(), None),
+                         self.nsm.find_device_from_abi(0, c.get_abi_version_major_as_int(), c.get_abi_version_minor_as_int()))
+
+    def test_find_urn_from_abi(self):
+        c = self.nsm.get_component_from_urn("/top/peripheral/device 1").get_component()
+        urns = self.nsm.find_urn_from_abi(0, c.get_abi_version_major_as_int())
+        self.assertIn("/top/peripheral/device 1", urns)
+        self.assertNotIn("/top/peripheral", urns)
+
+    def test_index_is_rebuilt_after_read(self):
+        index = self.nsm.get_index()
+        self.assertIs(index, self.nsm.get_index())
+        self.n.read_sdb()
+        self.assertIsNot(index, self.nsm.get_index())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+#!/usr/bin/python
+
+import unittest
+import sys
+import os
+from array import array as Array
+
+sys.path.append(os.path.join(os.path.dirname(__file__),
+                             os.pardir,
+                             os.pardir))
+
+from nysa.host.driver import sf_camera
+from nysa.host.driver.driver import DMAReadRing
+from nysa.host.driver.driver import DMA_RING_DROP_OLDEST
+from nysa.host.driver.driver import DMA_RING_BLOCK
+
+class FakeCamera(object):
+    """The asynchronous reader interface of SFCamera"""
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.ring = DMAReadRing(2)
+        self.running = False
+
+    def get_width(self):
+        return self.width
+
+    def get_height(self):
+        return self.height
+
+    def start_async_reader(self, callback, ring_depth = None, ring_policy = DMA_RING_DROP_OLDEST):
+        if ring_depth is not None:
+            self.ring = DMAReadRing(ring_depth, ring_policy)
+        self.running = True
+
+    def stop_async_reader(self):
+        self.running = False
+
+    def read_async_image(self, block = False, timeout = None):
+        return self.ring.get(block, timeout)
+
+    def get_dropped_image_count(self):
+        return self.ring.get_overrun_count()
+
+@unittest.skipIf(sf_camera.np is None, "NumPy is not installed")
+class Test (unittest.TestCase):
+    """Unit test for the camera frame pipeline"""
+
+    def test_decode_rgb565(self):
+        raw = Array('B', [0xF8, 0x00, 0x07, 0xE0, 0x00, 0x1F, 0xFF, 0xFF])
+        image = sf_camera.decode_rgb565(raw, 2, 2)
+        self.assertEqual(image.tolist(), [[[255, 0, 0], [0, 255, 0]],
+                                          [[0, 0, 255], [255, 255, 255]]])
+
+    def test_decode_ycbcr422(self):
+        raw = Array('B', [128, 16, 128, 235])
+        image = sf_camera.decode_ycbcr422(raw, 2, 1)
+        self.assertEqual(image.tolist(), [[[16, 16, 16], [235, 235, 235]]])
+
+    def test_pipeline_reuses_buffers(self):
+        camera = FakeCamera(2, 1)
+        pipeline = sf_camera.SFCameraPipeline(camera, depth = 2)
+        buffers = [id(f.data) for f in list(pipeline.pool.queue)]
+        pipeline.start()
+        camera.ring.put(Array('B', [0xF8, 0x00, 0xF8, 0x00]))
+        frame = pipeline.get_frame(timeout = 1)
+        self.assertEqual(frame.data.tolist(), [[[255, 0, 0], [255, 0, 0]]])
+        self.assertIn(id(frame.data), buffers)
+        frame.release()
+
+        camera.ring.put(Array('B', [0x00, 0x1F, 0x00, 0x1F]))
+        camera.ring.put(Array('B', [0x07, 0xE0, 0x07, 0xE0]))
+        frames = [pipeline.get_frame(timeout = 1), pipeline.get_frame(timeout = 1)]
+        self.assertEqual([f.sequence for f in frames], [1, 2])
+
+        #Every buffer is held, the next image is dropped
+        camera.ring.put(Array('B', [0x00, 0x00, 0x00, 0x00]))
+        self.assertIsNone(pipeline.get_frame(timeout = 0.3))
+        self.assertEqual(pipeline.get_dropped_frame_count(), 1)
+        pipeline.stop()
+        self.assertFalse(camera.running)
+
+    def test_pipeline_ring(self):
+        camera = FakeCamera(2, 1)
+        pipeline = sf_camera.SFCameraPipeline(camera, ring_depth = 5, ring_policy = DMA_RING_BLOCK)
+        pipeline.start()
+        self.assertEqual(camera.ring.depth, 5)
+        self.assertEqual(camera.ring.policy, DMA_RING_BLOCK)
+        pipeline.stop()
+
+if __name__ == "__main__":
+    unittest.main()